@@ -0,0 +1,253 @@
+# benchmarks/bench_sbs.py
+"""
+Benchmark del pipeline de la SBS sin red ni GCS reales.
+
+Sirve libros sintéticos desde un servidor HTTP local (con latencia y 404 configurables),
+sustituye GCS por un almacén en memoria o en disco y mide, para varios tamaños de carga,
+el tiempo, el rendimiento y el pico de memoria de cada etapa:
+
+    python benchmarks/bench_sbs.py --periods 3,12,36 --latency 0.02 --not-found-rate 0.05
+
+Por defecto los libros se generan en el formato .xls antiguo del portal, con xlwt (se instala
+con requirements-dev.txt); `--format xlsx` genera libros .xlsx. Para comparar los lectores de
+Excel, procesando los mismos archivos con cada lector y comprobando que el resultado coincide:
+
+    python benchmarks/bench_sbs.py --periods 12 --excel-backends pandas,xlrd,calamine
+"""
+
+import sys
+import json
+import time
+import argparse
+import importlib.util
+import tracemalloc
+import pandas as pd
+from pathlib import Path
+from contextlib import contextmanager
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks.sbs_fixtures import SyntheticSBSServer
+from src import main_sbs as pipeline
+from src.modules.run_metrics import reset_metrics
+from src.modules.object_storage import ObjectStorage, build_storage
+from src.modules.excel_workbook import check_backend, set_default_backend
+
+BUCKET_NAME = 'benchmark'
+
+
+@contextmanager
+def measure(results: list[dict], stage: str, periods: int, trace_memory: bool = True, backend: str | None = None):
+    """
+    Mide el tiempo y el pico de memoria (tracemalloc) del bloque. El bloque puede completar el
+    diccionario devuelto con 'items' (archivos o filas) y 'bytes' para calcular el rendimiento.
+    """
+    record = {
+        'periods': periods, 'stage': stage, 'backend': backend, 'items': 0, 'bytes': 0,
+        'opened_by': None, 'fallbacks': None, 'matches': None,
+    }
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        record['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1e6 if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+        record['items_per_s'] = record['items'] / record['seconds'] if record['seconds'] > 0 else 0.0
+        record['mb_per_s'] = record['bytes'] / 1e6 / record['seconds'] if record['seconds'] > 0 else 0.0
+        results.append(record)
+
+
+def plan_last_periods(base_url: str, periods: int, processors=pipeline.DEFAULT_PROCESSORS) -> dict[str, str]:
+    """
+    Devuelve las URLs de los reportes que usan los `processors` en los últimos `periods` meses ya cerrados.
+    """
+    urls = {
+        file_name: url
+        for _, _, batch in pipeline.plan_backfill_batches({}, base_url=base_url, processors=processors)
+        for file_name, url in batch.items()
+    }
+    dates = sorted({file_name.split('_')[-1] for file_name in urls})[-periods:]
+    return {file_name: url for file_name, url in urls.items() if file_name.split('_')[-1] in dates}
+
+
+def seed_history(gcs_manager: ObjectStorage, sbs_eeff: pd.DataFrame, sbs_tc: pd.DataFrame, history_years: int):
+    """
+    Sube a GCS un histórico sintético de `history_years` años, replicando las filas de un mes
+    procesado en fechas anteriores, para medir la fusión y la carga sobre un dataset realista.
+    """
+    first_date = int(sbs_eeff['DATE'].min())
+    template_eeff = sbs_eeff[sbs_eeff['DATE'] == first_date]
+    template_tc = sbs_tc[sbs_tc['DATE'] == first_date] if not sbs_tc.empty else sbs_tc
+    first_year = first_date // 100 - history_years
+    dates = [year * 100 + month for year in range(first_year, first_date // 100) for month in range(1, 13)]
+    history_eeff = pd.concat([template_eeff.assign(DATE=date, PERIODO=date // 100) for date in dates], ignore_index=True)
+    history_tc = pd.concat([template_tc.assign(DATE=date, PERIODO=date // 100) for date in dates], ignore_index=True)
+    gcs_manager.upload_df_as_csv(history_eeff, BUCKET_NAME, 'SBS_EEFF_PROCESSED.csv')
+    gcs_manager.upload_df_as_csv(history_tc, BUCKET_NAME, 'SBS_TC_PROCESSED.csv')
+
+
+def run(periods: int, args: argparse.Namespace, results: list[dict]) -> dict:
+    """
+    Ejecuta las etapas del pipeline para los últimos `periods` meses.
+
+    Returns:
+        El resumen de las métricas internas del pipeline (ver `RunMetrics.snapshot`).
+    """
+    logger = pipeline.get_logger('sbs')
+    metrics = reset_metrics('sbs')
+    metrics.set_info(periods=periods)
+    server = SyntheticSBSServer(
+        latency=args.latency, not_found_rate=args.not_found_rate, entities=args.entities, file_format=args.format
+    )
+    with server as base_url:
+        urls = plan_last_periods(base_url, periods, args.processors)
+        server.preload(urls.values())
+
+        with measure(results, 'download_dataset', periods, args.trace_memory) as record:
+            files_in_memory = pipeline.download_dataset(None, urls=urls, base_url=base_url, max_workers=args.max_workers)
+            record['items'] = len(files_in_memory)
+            record['bytes'] = sum(len(file.getvalue()) for file in files_in_memory.values())
+
+    # Cada lector procesa los mismos archivos; el primero sirve de referencia para los demás.
+    # Un resultado con archivos que el lector no pudo abrir (repliegue a pandas) no cuenta como coincidencia.
+    reference = None
+    for backend in args.excel_backends.split(','):
+        set_default_backend(backend)
+        workbooks = pipeline.open_workbooks(files_in_memory)
+        with measure(results, 'process_dataset_eeff', periods, args.trace_memory, backend) as record_eeff:
+            sbs_eeff = pipeline.process_dataset_eeff(
+                workbooks, pipeline.FINANCIAL_INCOME_TERMS, pipeline.SERVICE_INCOME_TERMS, pipeline.NET_RESULT_TERMS,
+                logger, workers=args.workers
+            )
+            record_eeff['items'] = sum('EEFF' in key for key in workbooks)
+        with measure(results, 'process_dataset_tc', periods, args.trace_memory, backend) as record_tc:
+            sbs_tc = pipeline.process_dataset_tc(workbooks, pipeline.TC_TERMS, logger, workers=args.workers)
+            record_tc['items'] = sum('Banca_Multiple_EEFF' in key for key in workbooks)
+        sbs_ratios, record_ratios = None, None
+        if 'ratios' in args.processors:
+            with measure(results, 'process_dataset_ratios', periods, args.trace_memory, backend) as record_ratios:
+                sbs_ratios = pipeline.process_dataset_ratios(workbooks, logger, workers=args.workers)
+                record_ratios['items'] = sum('Ratios' in key for key in workbooks)
+        record_readers(record_eeff, workbooks, 'EEFF', backend)
+        record_readers(record_tc, workbooks, 'Banca_Multiple_EEFF', backend)
+        if record_ratios is not None:
+            record_readers(record_ratios, workbooks, 'Ratios', backend)
+        if reference is None:
+            reference = sbs_eeff, sbs_tc, sbs_ratios
+        for record, result, expected in [
+            (record_eeff, sbs_eeff, reference[0]), (record_tc, sbs_tc, reference[1]), (record_ratios, sbs_ratios, reference[2])
+        ]:
+            if record is None:
+                continue
+            if record['fallbacks']:
+                record['matches'] = False
+            elif result is not expected:
+                record['matches'] = same_frames(result, expected)
+    sbs_eeff, sbs_tc, _ = reference
+
+    gcs_manager = build_storage('local', args.gcs_root) if args.gcs_root else build_storage('memory')
+    seed_history(gcs_manager, sbs_eeff, sbs_tc, args.history_years)
+    gcs_manager.bytes_written = 0
+    with measure(results, 'uploads', periods, args.trace_memory) as record:
+        sbs_eeff_processed, sbs_tc_processed = pipeline.load_processed_datasets(
+            None, gcs_manager, BUCKET_NAME, 'SBS_EEFF_PROCESSED.csv', 'SBS_TC_PROCESSED.csv', logger
+        )
+        uploads = {}
+        sbs_eeff_processed = pipeline.merge_and_upload_eeff(
+            sbs_eeff, sbs_eeff_processed, gcs_manager, BUCKET_NAME, 'SBS_EEFF_PROCESSED.csv', logger, uploads=uploads
+        )
+        pipeline.merge_and_upload_tc(sbs_tc, sbs_tc_processed, gcs_manager, BUCKET_NAME, 'SBS_TC_PROCESSED.csv', logger, uploads=uploads)
+        pipeline.commit_uploads(uploads, gcs_manager, BUCKET_NAME, logger)
+        record['items'] = len(sbs_eeff_processed)
+        record['bytes'] = gcs_manager.bytes_written
+    return metrics.snapshot()
+
+
+def record_readers(record: dict, workbooks: dict, name_files: str, backend: str):
+    """
+    Anota en `record` los lectores que realmente abrieron los libros de la etapa (`ExcelWorkbook.backend`)
+    y cuántos se abrieron con otro lector distinto de `backend` (repliegue a pandas).
+
+    Con varios procesos los libros se abren en los procesos hijos; aquí se abren de nuevo para
+    consultar el lector, fuera del tiempo medido.
+
+    Args:
+        record: Registro de la etapa devuelto por `measure`.
+        workbooks: Diccionario {nombre_archivo: ExcelWorkbook} procesado en la etapa.
+        name_files: Fragmento del nombre que identifica los archivos de la etapa (ej: 'EEFF').
+        backend: Lector pedido para la etapa.
+    """
+    readers = [workbook.backend for key, workbook in workbooks.items() if name_files in key and workbook.error is None]
+    record['opened_by'] = ','.join(sorted(set(readers))) or None
+    record['fallbacks'] = sum(reader != backend for reader in readers)
+
+
+def same_frames(df: pd.DataFrame, expected: pd.DataFrame) -> bool:
+    """
+    Indica si dos resultados del procesamiento tienen las mismas filas, columnas y valores.
+    """
+    try:
+        pd.testing.assert_frame_equal(df, expected)
+        return True
+    except AssertionError:
+        return False
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline de la SBS con datos sintéticos.")
+    parser.add_argument('--periods', default='3,12,36', help="Meses a descargar y procesar, separados por comas.")
+    parser.add_argument('--history-years', type=int, default=20, help="Años de histórico sintético en GCS para la etapa de carga.")
+    parser.add_argument('--latency', type=float, default=0.02, help="Latencia (s) de cada respuesta del servidor local.")
+    parser.add_argument('--not-found-rate', type=float, default=0.05, help="Fracción de URLs que responden 404.")
+    parser.add_argument('--entities', type=int, default=12, help="Entidades por reporte sintético.")
+    parser.add_argument('--max-workers', type=int, default=8, help="Hilos de descarga.")
+    parser.add_argument('--workers', type=int, default=1, help="Procesos para procesar los archivos Excel.")
+    parser.add_argument('--processors', default=','.join(pipeline.DEFAULT_PROCESSORS),
+                        help="Procesadores habilitados, separados por comas (con 'ratios' se descargan y procesan también los Ratios).")
+    parser.add_argument('--format', choices=['xls', 'xlsx'], default='xls',
+                        help="Formato de los libros sintéticos: 'xls' (por defecto, como los del portal; requiere xlwt, "
+                             "ver requirements-dev.txt) o 'xlsx'.")
+    parser.add_argument('--excel-backends', default='pandas',
+                        help="Lectores de Excel a comparar, separados por comas (ej: pandas,xlrd,calamine).")
+    parser.add_argument('--gcs-root', default=None, help="Carpeta del almacén local que sustituye a GCS (por defecto, en memoria).")
+    parser.add_argument('--no-memory', dest='trace_memory', action='store_false',
+                        help="No mide el pico de memoria (tracemalloc añade sobrecarga a los tiempos).")
+    parser.add_argument('--output', default=None, help="Ruta de un archivo JSON donde guardar los resultados.")
+    args = parser.parse_args(argv)
+    args.processors = args.processors.split(',')
+    if args.format == 'xls' and importlib.util.find_spec('xlwt') is None:
+        parser.error("--format xls requiere xlwt (pip install -r requirements-dev.txt) o use --format xlsx.")
+    if 'xlrd' in args.excel_backends.split(',') and args.format != 'xls':
+        parser.error("El lector 'xlrd' solo abre libros .xls: use --format xls para compararlo.")
+    for backend in args.excel_backends.split(','):
+        try:
+            check_backend(backend)
+        except (ValueError, ImportError) as e:
+            parser.error(str(e))
+    return args
+
+
+def main(args: argparse.Namespace | None = None) -> pd.DataFrame:
+    args = args if args is not None else parse_args([])
+    results, run_metrics = [], []
+    for periods in [int(value) for value in args.periods.split(',')]:
+        run_metrics.append(run(periods, args, results))
+    report = pd.DataFrame(results)[[
+        'periods', 'stage', 'backend', 'opened_by', 'fallbacks', 'items', 'seconds', 'items_per_s', 'mb_per_s',
+        'peak_mb', 'matches',
+    ]]
+    report = report.astype({'fallbacks': 'Int64'})
+    print(report.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    if args.output:
+        output = {'stages': results, 'metrics': run_metrics}
+        Path(args.output).write_text(json.dumps(output, indent=2, ensure_ascii=False), encoding='utf-8')
+    return report
+
+
+if __name__ == "__main__":
+    main(parse_args())
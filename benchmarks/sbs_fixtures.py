@@ -0,0 +1,233 @@
+# benchmarks/sbs_fixtures.py
+
+import io
+import re
+import sys
+import time
+import random
+import hashlib
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from openpyxl import Workbook
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.modules.sbs_data_fetcher import URLS_TEMPLATES
+
+# Nombres de entidades con las notas al pie y marcas que aparecen en los reportes reales
+ENTITY_NAMES = [
+    "B. BBVA Perú 1/", "B. de Crédito del Perú²", "B. Interbank (3)", "Scotiabank Perú*",
+    "B. Pichincha 2/", "B. Interamericano de Finanzas", "Mibanco ³", "B. GNB (4)",
+    "B. Falabella Perú", "B. Ripley 5/", "B. Santander Perú", "Alfin Banco", "B. ICBC ⁶",
+    "Bank of China", "B. BCI Perú", "Citibank Perú 7/"
+]
+CURRENCIES = ["MN", "ME", "TOTAL"]
+MONTHS = {
+    'Enero': 1, 'Febrero': 2, 'Marzo': 3, 'Abril': 4, 'Mayo': 5, 'Junio': 6,
+    'Julio': 7, 'Agosto': 8, 'Setiembre': 9, 'Octubre': 10, 'Noviembre': 11, 'Diciembre': 12
+}
+RATIO_SECTIONS = {
+    "SOLVENCIA": ["Ratio de Capital Global (%)", "Pasivo Total / Capital Social y Reservas (N° de veces)"],
+    "CALIDAD DE ACTIVOS": ["Créditos Atrasados / Créditos Directos (%)", "Provisiones / Créditos Atrasados (%)"],
+    "EFICIENCIA Y GESTIÓN": ["Gastos de Administración Anualizados / Activo Productivo Promedio (%)"],
+    "RENTABILIDAD": ["Utilidad Neta Anualizada / Patrimonio Promedio (%)", "Utilidad Neta Anualizada / Activo Promedio (%)"],
+    "LIQUIDEZ": ["Ratio de Liquidez MN (%)", "Ratio de Liquidez ME (%)"],
+}
+RATIO_CODES = {code for name, code in URLS_TEMPLATES.items() if name.endswith('_Ratios')}
+URL_PATTERN = re.compile(r'^/(\d{4})/(\w+)/([A-Z]+-\d{4})-[a-z]{2}\d{4}\.XLS$')
+
+
+def make_workbook(code: str, year: int, month: int, entities: int = 12, file_format: str = 'xlsx') -> bytes:
+    """
+    Genera un libro sintético con la forma de un reporte de la SBS.
+
+    - Los reportes de Banca Múltiple (B-2201) tienen una hoja índice con la celda
+      'Tipo de Cambio Contable' y el estado de resultados en la hoja 2.
+    - Los demás reportes (C-1101, SC-000x, ...) tienen una sola hoja, de modo que el
+      procesamiento debe retroceder de la hoja 2 a la hoja 1.
+    - Las cooperativas usan 'UTILIDAD ( PÉRDIDA ) NETA' en lugar de 'RESULTADO NETO DEL EJERCICIO'.
+    - Los nombres de entidad llevan notas al pie y hay columnas de sucursales y de totales.
+    - Los reportes de ratios (B-2401, C-1301, ...) solo tienen una tabla de indicadores por
+      entidad, agrupados en secciones y con algunos valores no disponibles ('n.d.').
+
+    Con `file_format='xls'` el libro se genera en el formato .xls antiguo del portal (requiere xlwt,
+    incluido en requirements-dev.txt).
+    """
+    rnd = random.Random(f"{code}-{year}-{month}")
+    sheets: list[tuple[str, dict]] = []
+    cells: dict[tuple[int, int], object] = {}
+    if code in RATIO_CODES:
+        cells[1, 1] = "Indicadores Financieros"
+        names = rnd.sample(ENTITY_NAMES, min(entities, len(ENTITY_NAMES))) + ["TOTAL SISTEMA"]
+        for col, name in enumerate(names, start=2):
+            cells[3, col] = name
+        row = 4
+        for section, ratios in RATIO_SECTIONS.items():
+            cells[row, 1] = section
+            row += 1
+            for ratio in ratios:
+                cells[row, 1] = ratio
+                for col in range(2, len(names) + 2):
+                    cells[row, col] = round(rnd.uniform(0, 100), 2) if rnd.random() > 0.02 else "n.d."
+                row += 1
+        return _to_bytes([("Ratios", cells)], file_format)
+
+    if code == 'B-2201':
+        index_cells = {
+            (1, 2): "Superintendencia de Banca, Seguros y AFP",
+            (4, 2): "Tipo de Cambio Contable",
+            (4, 3): round(rnd.uniform(3.2, 3.9), 3),
+        }
+        sheets.append(("Indice", index_cells))
+        sheets.append(("Estado de Resultados", cells))
+    else:
+        sheets.append(("Sheet", cells))
+
+    cells[1, 1] = "Estado de Ganancias y Pérdidas"
+    cells[3, 1] = "(en miles de soles)"
+    names = rnd.sample(ENTITY_NAMES, min(entities, len(ENTITY_NAMES))) + ["Sucursal Lima", "TOTAL SISTEMA"]
+    col = 2
+    for name in names:
+        cells[5, col] = name
+        for offset, currency in enumerate(CURRENCIES):
+            cells[6, col + offset] = currency
+        col += len(CURRENCIES)
+    net_result = "UTILIDAD ( PÉRDIDA ) NETA" if code.startswith('SC-') else "RESULTADO NETO DEL EJERCICIO"
+    rows = [
+        "INGRESOS FINANCIEROS", "Disponible", "Fondos Interbancarios", "Inversiones", "Créditos Directos",
+        "GASTOS FINANCIEROS", "MARGEN FINANCIERO BRUTO", "INGRESOS POR SERVICIOS FINANCIEROS",
+        "GASTOS POR SERVICIOS FINANCIEROS", "GASTOS DE ADMINISTRACIÓN", "Impuesto a la Renta", net_result
+    ]
+    for offset, label in enumerate(rows):
+        cells[7 + offset, 1] = label
+        for value_col in range(2, col):
+            cells[7 + offset, value_col] = round(rnd.uniform(-1000, 100000), 2)
+    return _to_bytes(sheets, file_format)
+
+
+def _to_bytes(sheets: list[tuple[str, dict]], file_format: str) -> bytes:
+    """
+    Escribe las hojas [(título, {(fila, columna): valor})] (posiciones 1-based) como .xlsx o .xls.
+    """
+    buffer = io.BytesIO()
+    if file_format == 'xls':
+        try:
+            import xlwt
+        except ImportError as e:
+            raise ImportError(
+                "Los libros .xls sintéticos requieren xlwt (pip install -r requirements-dev.txt).") from e
+        workbook = xlwt.Workbook()
+        for title, cells in sheets:
+            sheet = workbook.add_sheet(title)
+            for (row, col), value in cells.items():
+                sheet.write(row - 1, col - 1, value)
+    else:
+        workbook = Workbook()
+        workbook.remove(workbook.active)
+        for title, cells in sheets:
+            sheet = workbook.create_sheet(title)
+            for (row, col), value in cells.items():
+                sheet.cell(row=row, column=col, value=value)
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+class SyntheticSBSServer:
+    """
+    Servidor HTTP local que imita el portal de la SBS con libros sintéticos.
+
+    Responde en las mismas rutas que el portal ('/{año}/{Mes}/{código}-{mes}{año}.XLS'),
+    con una latencia fija por petición, una fracción determinista de 404 y validación
+    condicional por ETag (304). Se usa como `base_url` de `download_dataset`.
+    """
+    def __init__(self, latency: float = 0.0, not_found_rate: float = 0.0, entities: int = 12,
+                 file_format: str = 'xlsx'):
+        """
+        Args:
+            latency: Segundos de espera antes de cada respuesta.
+            not_found_rate: Fracción (0-1) de URLs que responden 404.
+            entities: Número de entidades por reporte.
+            file_format: Formato de los libros servidos ('xlsx' o 'xls').
+        """
+        self.latency = latency
+        self.not_found_rate = not_found_rate
+        self.entities = entities
+        self.file_format = file_format
+        self.requests = 0
+        self._cache: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    def _content(self, path: str) -> bytes | None:
+        match = URL_PATTERN.match(path)
+        if match is None:
+            return None
+        digest = int(hashlib.sha256(path.encode('utf-8')).hexdigest()[:8], 16)
+        if digest / 0xFFFFFFFF < self.not_found_rate:
+            return None
+        content = self._cache.get(path)
+        if content is None:
+            year, month_long, code = match.groups()
+            content = make_workbook(code, int(year), MONTHS[month_long], self.entities, self.file_format)
+            with self._lock:
+                content = self._cache.setdefault(path, content)
+        return content
+
+    def preload(self, urls) -> int:
+        """
+        Genera de antemano los libros de `urls`, para que su construcción no cuente en las mediciones.
+
+        Returns:
+            El número de libros disponibles (las URLs restantes responderán 404).
+        """
+        return sum(self._content(urlparse(url).path) is not None for url in urls)
+
+    def start(self) -> str:
+        """
+        Arranca el servidor en un puerto libre y devuelve su URL base.
+        """
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with fixture._lock:
+                    fixture.requests += 1
+                time.sleep(fixture.latency)
+                content = fixture._content(self.path)
+                if content is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = '"' + hashlib.sha256(content).hexdigest()[:16] + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> str:
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,123 +1,1076 @@
 # src/main_sbs.py
 
+import io
+import os
 import sys
+import json
+import argparse
 import pandas as pd
 from pathlib import Path
+from datetime import datetime
+from itertools import islice
+from contextlib import contextmanager, nullcontext
 
 if __name__ == "__main__":
     project_root = Path(__file__).parent.parent
     sys.path.insert(0, str(project_root))
 
-from modules.sbs_data_fetcher import download_dataset
-from modules.sbs_data_processing import process_dataset_eeff, process_dataset_tc
-from modules.gcs_manager import GCSManager
-from utils import get_logger
+# Se importa por el paquete `src`, igual que en los módulos, para compartir el estado de cada
+# módulo (ej: las métricas de la ejecución) en lugar de cargarlos dos veces con nombres distintos
+from src.modules.sbs_data_fetcher import download_dataset, iter_dataset, plan_backfill_batches, build_windows, shard_batches, SHARD_STRATEGIES
+from src.modules.sbs_data_processing import open_workbooks, process_dataset_eeff, process_dataset_tc, process_dataset_ratios, process_stages_in_pool, eeff_stage, tc_stage, RATIOS_STAGE, EEFF_COLUMNS, TC_COLUMNS, RATIOS_COLUMNS, EEFF_DTYPES, TC_DTYPES, RATIOS_DTYPES, EEFF_KEY, TC_KEY, RATIOS_KEY, ANALYZED_KEY
+from src.modules.object_storage import ObjectStorage, STORAGE_BACKENDS, OBJECT_CACHE_DIR, build_storage
+from src.modules.parquet_store import ParquetDatasetStore
+from src.modules.probe_ledger import ProbeLedger
+from src.modules.raw_cache import RawWorkbookCache
+from src.modules.layout_templates import LayoutTemplateCache
+from src.modules.entity_names import EntityNameCache
+from src.modules.coverage_manifest import CoverageManifest
+from src.modules.upsert_table import UpsertTable
+from src.modules.compact_schema import concat_frames, memory_mb
+from src.modules.run_metrics import RunMetrics, get_metrics
+from src.modules.stage_profiler import get_profiler
+from src.modules.excel_workbook import BACKENDS, check_backend, default_backend, set_default_backend
+from src.modules.report_registry import PROCESSORS, DEFAULT_PROCESSORS, RATIOS_COVERAGE_SUFFIX
+from src.utils import get_logger
 
 
-def download_base_datasets(gcs_manager: GCSManager, bucket_name: str, path_eeff: str, path_tc: str, logger) -> tuple[pd.DataFrame | None, pd.DataFrame | None]:
+# Términos que identifican las filas de cada dato en los reportes
+FINANCIAL_INCOME_TERMS = "INGRESOS FINANCIEROS"
+SERVICE_INCOME_TERMS = "INGRESOS POR SERVICIOS FINANCIEROS"
+NET_RESULT_TERMS = [
+    "RESULTADO NETO DEL EJERCICIO",
+    "UTILIDAD ( PÉRDIDA ) NETA",
+    "UTILIDAD (PÉRDIDA) NETA"
+]
+TC_TERMS = "TIPO DE CAMBIO"
+# Archivo local (una línea JSON por ejecución) con las métricas de cada ejecución
+METRICS_FILE = 'sbs_metrics.jsonl'
+# Etapas que se pueden perfilar con --profile
+PROFILE_STAGES = [
+    'load_state', 'bootstrap_coverage', 'download', 'process', 'process_pool', 'process_eeff', 'process_tc', 'download_base',
+    'merge_eeff', 'upload_eeff', 'update_analyzed', 'merge_tc', 'upload_tc', 'process_ratios', 'merge_ratios',
+    'upload_ratios', 'upload', 'save_shard', 'load_shards'
+]
+# Prefijo en GCS de los resultados parciales de las ejecuciones por particiones (--shard)
+SHARDS_PREFIX = 'SBS_SHARDS'
+
+
+@contextmanager
+def stage(name: str):
+    """Mide una etapa del proceso (métricas 'stage.{name}') y, si se pidió con --profile, la perfila."""
+    with get_metrics('sbs').span(f"stage.{name}"), get_profiler('sbs').stage(name):
+        yield
+
+
+def download_base_datasets(gcs_manager: ObjectStorage, bucket_name: str, path_eeff: str, path_tc: str, logger) -> tuple[pd.DataFrame | None, pd.DataFrame | None]:
     """Descarga los datasets base de EEFF y TC desde GCS."""
     logger.info(f"🔄 Descargando datasets base desde el bucket '{bucket_name}'...")
-    sbs_eeff_processed = gcs_manager.download_csv_as_df(bucket_name, path_eeff)
-    sbs_tc_processed = gcs_manager.download_csv_as_df(bucket_name, path_tc)
+    with stage('download_base'):
+        sbs_eeff_processed = gcs_manager.download_csv_as_df(bucket_name, path_eeff, dtype=EEFF_DTYPES)
+        sbs_tc_processed = gcs_manager.download_csv_as_df(bucket_name, path_tc, dtype=TC_DTYPES)
     return sbs_eeff_processed, sbs_tc_processed
 
 
-def process_and_upload_eeff(files_in_memory: dict, sbs_eeff_processed: pd.DataFrame, gcs_manager: GCSManager, bucket_name: str, path_file_eeff: str, logger) -> pd.DataFrame:
-    """Procesa, concatena y sube los datos de EEFF."""
-    FINANCIAL_INCOME_TERMS = "INGRESOS FINANCIEROS"
-    SERVICE_INCOME_TERMS = "INGRESOS POR SERVICIOS FINANCIEROS"
-    NET_RESULT_TERMS = [
-        "RESULTADO NETO DEL EJERCICIO",
-        "UTILIDAD ( PÉRDIDA ) NETA",
-        "UTILIDAD (PÉRDIDA) NETA"
-    ]
+def upload_csv(df: pd.DataFrame, gcs_manager: ObjectStorage, bucket_name: str, path: str, uploads: dict[str, pd.DataFrame] | None, stage_name: str | None = None) -> bool:
+    """Sube `df` como CSV (midiendo la etapa `stage_name`, si se indica) o, con `uploads`, lo deja pendiente para `commit_uploads` y lo da por subido."""
+    if uploads is not None:
+        uploads[path] = df
+        return True
+    with stage(stage_name) if stage_name else nullcontext():
+        return gcs_manager.upload_df_as_csv(df, bucket_name, path)
 
-    sbs_eeff_actualyzed = process_dataset_eeff(
-        files_in_memory, FINANCIAL_INCOME_TERMS,
-        SERVICE_INCOME_TERMS, NET_RESULT_TERMS,
-        logger
-    )
+
+def commit_uploads(uploads: dict[str, pd.DataFrame], gcs_manager: ObjectStorage, bucket_name: str, logger) -> bool:
+    """
+    Sube en paralelo los CSV pendientes y los confirma juntos: si alguno falla, no se reemplaza ninguno.
+    
+    Returns:
+        True si no había nada pendiente o si todos los archivos se confirmaron.
+    """
+    if not uploads:
+        return True
+    logger.info(f"📤 Subiendo {len(uploads)} archivos CSV: {', '.join(uploads)}...")
+    with stage('upload'):
+        return gcs_manager.upload_dfs_as_csv(uploads, bucket_name)
+
+
+def uses_eeff_files(processors) -> bool:
+    """Indica si algún procesador habilitado produce los datasets de EEFF o TC (y necesita su histórico)."""
+    return 'eeff' in processors or 'tc' in processors
+
+
+def load_processed_datasets(stores: dict[str, ParquetDatasetStore] | None, gcs_manager: ObjectStorage, bucket_name: str, path_eeff: str, path_tc: str, logger) -> tuple[pd.DataFrame, pd.DataFrame | None]:
+    """Descarga los datasets base sobre los que se fusionan los datos nuevos (en modo Parquet no hacen falta)."""
+    if stores is not None:
+        # En modo Parquet solo se escriben particiones nuevas: no hace falta descargar el histórico
+        return pd.DataFrame(), None
+    sbs_eeff_processed, sbs_tc_processed = download_base_datasets(gcs_manager, bucket_name, path_eeff, path_tc, logger)
+
+    # Si el archivo base no existe, se asume que es la primera ejecución.
+    if sbs_eeff_processed is None or sbs_eeff_processed.empty:
+        logger.warning(f"⚠️ No se encontró el archivo base '{path_eeff}' o está vacío. Se creará uno nuevo con los datos descargados.")
+        sbs_eeff_processed = pd.DataFrame() # Se crea un DF vacío para que el flujo continúe
+
+    # Si el archivo de TC no existe, se asume que es la primera ejecución.
+    if sbs_tc_processed is None:
+        logger.warning(f"⚠️ No se encontró el archivo base '{path_tc}'. Se creará uno nuevo si se encuentran datos de TC.")
+        sbs_tc_processed = pd.DataFrame() # Se crea un DF vacío para que el flujo continúe
+    logger.info(
+        f"📏 Datasets base en memoria: EEFF {len(sbs_eeff_processed)} filas ({memory_mb(sbs_eeff_processed):.1f} MB), "
+        f"TC {len(sbs_tc_processed)} filas ({memory_mb(sbs_tc_processed):.2f} MB).")
+    return sbs_eeff_processed, sbs_tc_processed
+
+
+def build_parquet_stores(gcs_manager: ObjectStorage, bucket_name: str) -> dict[str, ParquetDatasetStore]:
+    """Crea los datasets Parquet particionados de EEFF (por TIPO y DATE), TC (por DATE), EEFF analizado (por PERIODO) y Ratios (por TIPO y DATE)."""
+    return {
+        'eeff': ParquetDatasetStore(gcs_manager, bucket_name, 'SBS_EEFF', ['TIPO', 'DATE'], EEFF_COLUMNS, dtypes=EEFF_DTYPES),
+        'tc': ParquetDatasetStore(gcs_manager, bucket_name, 'SBS_TC', ['DATE'], TC_COLUMNS, dtypes=TC_DTYPES),
+        'analyzed': ParquetDatasetStore(gcs_manager, bucket_name, 'SBS_EEFF_ANALYZED', ['PERIODO'], EEFF_COLUMNS, dtypes=EEFF_DTYPES),
+        'ratios': ParquetDatasetStore(gcs_manager, bucket_name, 'SBS_RATIOS', ['TIPO', 'DATE'], RATIOS_COLUMNS, dtypes=RATIOS_DTYPES),
+    }
+
+
+def load_parquet_coverage(stores: dict[str, ParquetDatasetStore], gcs_manager: ObjectStorage, bucket_name: str, path_eeff: str, path_tc: str, logger) -> pd.DataFrame:
+    """
+    Devuelve los pares (TIPO, DATE) ya guardados en Parquet, listando solo las particiones.
+    
+    Si el dataset Parquet aún no existe pero sí los CSV históricos, primero los migra a particiones.
+    """
+    coverage = stores['eeff'].partitions()
+    if coverage.empty:
+        sbs_eeff_processed, sbs_tc_processed = download_base_datasets(gcs_manager, bucket_name, path_eeff, path_tc, logger)
+        if sbs_eeff_processed is not None and not sbs_eeff_processed.empty:
+            logger.info("🔁 Migrando los CSV históricos al dataset Parquet particionado...")
+            stores['eeff'].write_partitions(sbs_eeff_processed)
+            stores['tc'].write_partitions(sbs_tc_processed)
+            update_parquet_analyzed(stores, sbs_eeff_processed, logger)
+            coverage = stores['eeff'].partitions()
+    return coverage
+
+
+def update_parquet_analyzed(stores: dict[str, ParquetDatasetStore], sbs_eeff_batch: pd.DataFrame, logger):
+    """
+    Aplica un lote de EEFF a la vista analizada y reescribe solo las particiones anuales que toca.
+    
+    Solo se leen las particiones analizadas de los años del lote (una fila por entidad y moneda);
+    si alguna no existe todavía, se construye a partir de las particiones de EEFF de ese año.
+    """
+    years = set(sbs_eeff_batch['PERIODO'])
+    sbs_eeff_analyzed = stores['analyzed'].read(where=lambda partition: partition['PERIODO'] in years)
+    missing_years = years - set(sbs_eeff_analyzed['PERIODO'])
+    analyzed_table = UpsertTable(sbs_eeff_analyzed, ANALYZED_KEY, EEFF_COLUMNS, partition_cols=['PERIODO'])
+    if missing_years:
+        analyzed_table.upsert_latest(stores['eeff'].read(where=lambda partition: partition['DATE'] // 100 in missing_years))
+    counts = analyzed_table.upsert_latest(sbs_eeff_batch)
+    if not counts['inserted'] and not counts['updated'] and not missing_years:
+        return
+    logger.info(f"💾 Guardando dataset de EEFF analizado para los años {sorted(years)}...")
+    stores['analyzed'].write_partitions(analyzed_table.to_frame())
+
+
+def update_csv_analyzed(sbs_eeff_processed: pd.DataFrame, sbs_eeff_batch: pd.DataFrame, gcs_manager: ObjectStorage, bucket_name: str, path_analyzed: str, logger, uploads: dict[str, pd.DataFrame] | None = None):
+    """
+    Aplica un lote de EEFF a la vista analizada (última fila por PERIODO, ENTIDAD y MONEDA) y la sube.
+    
+    Parte del archivo analizado existente, de modo que solo se recalculan los grupos que toca el
+    lote (se indexan solo los años del lote). Si el archivo no existe, se construye una vez a partir
+    del dataset procesado completo. Con `uploads`, el archivo queda pendiente de `commit_uploads` en
+    lugar de subirse.
+    
+    A diferencia del modo Parquet (`update_parquet_analyzed`), que reescribe solo las particiones de
+    los años afectados, aquí la vista es un único objeto CSV: cuando cambia, se lee y se sube completa.
+    Su tamaño es una fila por año, entidad y moneda, no el del histórico mensual.
+    """
+    sbs_eeff_analyzed = gcs_manager.download_csv_as_df(bucket_name, path_analyzed, dtype=EEFF_DTYPES)
+    analyzed_table = UpsertTable(sbs_eeff_analyzed, ANALYZED_KEY, EEFF_COLUMNS, partition_cols=['PERIODO'])
+    if sbs_eeff_analyzed is None or sbs_eeff_analyzed.empty:
+        logger.info(f"🧮 No existe '{path_analyzed}'. Se construye a partir del dataset de EEFF completo...")
+        analyzed_table.upsert_latest(sbs_eeff_processed)
+    else:
+        counts = analyzed_table.upsert_latest(sbs_eeff_batch)
+        if not counts['inserted'] and not counts['updated']:
+            logger.info("✅ El dataset de EEFF analizado no cambia. No se vuelve a subir.")
+            return
+    logger.info(f"💾 Guardando dataset de EEFF analizado en '{path_analyzed}'...")
+    upload_csv(analyzed_table.to_frame(), gcs_manager, bucket_name, path_analyzed, uploads)
+
+
+def export_csv_artifacts(stores: dict[str, ParquetDatasetStore], gcs_manager: ObjectStorage, bucket_name: str, path_eeff: str, path_tc: str, logger, path_ratios: str | None = None):
+    """Genera los CSV completos (artefactos derivados) a partir del dataset Parquet. Con `path_ratios`, también el de Ratios."""
+    logger.info("📤 Exportando los datasets Parquet a CSV...")
+    uploads = {path_eeff: stores['eeff'].read(), path_tc: stores['tc'].read(), 'SBS_EEFF_ANALYZED.csv': stores['analyzed'].read()}
+    if path_ratios is not None:
+        uploads[path_ratios] = stores['ratios'].read()
+    commit_uploads(uploads, gcs_manager, bucket_name, logger)
+
+
+def load_probe_ledger(gcs_manager: ObjectStorage, bucket_name: str, path_ledger: str) -> ProbeLedger:
+    """Carga el registro de sondeos desde GCS o, si no existe allí, desde la copia local."""
+    ledger_bytes = gcs_manager.download_bytes(bucket_name, path_ledger)
+    return ProbeLedger(data=ledger_bytes)
+
+
+def save_probe_ledger(ledger: ProbeLedger, gcs_manager: ObjectStorage, bucket_name: str, path_ledger: str):
+    """Guarda el registro de sondeos en disco y lo sube a GCS."""
+    ledger.save()
+    gcs_manager.upload_bytes(ledger.to_bytes(), bucket_name, path_ledger, content_type='application/json')
+
+
+def load_coverage_manifest(gcs_manager: ObjectStorage, bucket_name: str, path_coverage: str) -> CoverageManifest:
+    """Carga el manifiesto de cobertura desde GCS o, si no existe allí, desde la copia local."""
+    coverage_bytes = gcs_manager.download_bytes(bucket_name, path_coverage)
+    return CoverageManifest(path=Path('.cache') / Path(path_coverage).name, data=coverage_bytes)
+
+
+def save_coverage_manifest(manifest: CoverageManifest, gcs_manager: ObjectStorage, bucket_name: str, path_coverage: str):
+    """Guarda el manifiesto de cobertura en disco y lo sube a GCS."""
+    manifest.save()
+    gcs_manager.upload_bytes(manifest.to_bytes(), bucket_name, path_coverage, content_type='application/json')
+
+
+def bootstrap_coverage_manifest(manifest: CoverageManifest, stores: dict[str, ParquetDatasetStore] | None, gcs_manager: ObjectStorage, bucket_name: str, path_eeff: str, path_tc: str, logger, path_ratios: str | None = None):
+    """
+    Reconstruye un manifiesto vacío a partir del dataset: las particiones Parquet o el CSV leído por partes.
+    
+    Con `path_ratios` (si el procesador de Ratios está habilitado), añade también la cobertura del dataset de Ratios.
+    """
+    logger.info("🧭 Manifiesto de cobertura vacío. Se reconstruye a partir del dataset de EEFF...")
+    if stores is not None:
+        manifest.add_frame(load_parquet_coverage(stores, gcs_manager, bucket_name, path_eeff, path_tc, logger))
+        if path_ratios is not None:
+            manifest.add_frame(stores['ratios'].partitions(), suffix=RATIOS_COVERAGE_SUFFIX)
+    else:
+        for chunk in gcs_manager.iter_csv_chunks(bucket_name, path_eeff, usecols=['TIPO', 'DATE'], dtype=EEFF_DTYPES):
+            manifest.add_frame(chunk)
+        if path_ratios is not None:
+            for chunk in gcs_manager.iter_csv_chunks(bucket_name, path_ratios, usecols=['TIPO', 'DATE'], dtype=RATIOS_DTYPES):
+                manifest.add_frame(chunk, suffix=RATIOS_COVERAGE_SUFFIX)
+
+
+def load_layout_cache(gcs_manager: ObjectStorage, bucket_name: str, path_templates: str) -> LayoutTemplateCache:
+    """Carga las plantillas de diseño desde GCS o, si no existen allí, desde la copia local."""
+    templates_bytes = gcs_manager.download_bytes(bucket_name, path_templates)
+    return LayoutTemplateCache(data=templates_bytes)
+
+
+def save_layout_cache(layout_cache: LayoutTemplateCache, gcs_manager: ObjectStorage, bucket_name: str, path_templates: str):
+    """Registra la tasa de aciertos, guarda las plantillas en disco y las sube a GCS."""
+    layout_cache.log_stats()
+    layout_cache.save()
+    gcs_manager.upload_bytes(layout_cache.to_bytes(), bucket_name, path_templates, content_type='application/json')
+
+
+def load_entity_names(gcs_manager: ObjectStorage, bucket_name: str, path_entities: str) -> EntityNameCache:
+    """Carga el diccionario de nombres de entidad desde GCS o, si no existe allí, desde la copia local."""
+    entities_bytes = gcs_manager.download_bytes(bucket_name, path_entities)
+    return EntityNameCache(data=entities_bytes)
+
+
+def save_entity_names(entity_names: EntityNameCache, gcs_manager: ObjectStorage, bucket_name: str, path_entities: str):
+    """Registra los aciertos del diccionario de entidades, lo guarda en disco y lo sube a GCS."""
+    entity_names.log_stats()
+    entity_names.save()
+    gcs_manager.upload_bytes(entity_names.to_bytes(), bucket_name, path_entities, content_type='application/json')
+
+
+def process_batches(batches, ledger: ProbeLedger | None, layout_cache: LayoutTemplateCache | None, workers: int, logger, entity_names: EntityNameCache | None = None, processors=DEFAULT_PROCESSORS) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, int]:
+    """
+    Procesa los archivos descargados, lote a lote, y acumula solo los resultados de los procesadores habilitados.
+    
+    Cada lote es un diccionario {nombre: BytesIO}. Sus libros se decodifican una sola vez, se
+    comparten entre las etapas de EEFF, TC y Ratios y se liberan antes de pasar al siguiente lote, de
+    modo que en memoria solo conviven los archivos de un lote y las filas ya extraídas. Con
+    `workers` > 1, cada archivo se procesa para todas las etapas en una sola tarea del pool (ver
+    `process_stages_in_pool`), así el libro tampoco se decodifica más de una vez por proceso.
+    
+    Returns:
+        Una tupla (filas nuevas de EEFF, filas nuevas de TC, filas nuevas de Ratios, número de archivos procesados).
+    """
+    eeff_parts, tc_parts, ratios_parts, files_count = [], [], [], 0
+    for batch_number, files_in_memory in enumerate(batches, start=1):
+        if not files_in_memory:
+            continue
+        files_count += len(files_in_memory)
+        logger.info(f"📦 Lote {batch_number}: {len(files_in_memory)} archivos ({files_count} en total).")
+        # Cada libro se decodifica una sola vez y se comparte entre las etapas de EEFF y TC
+        workbooks = open_workbooks(files_in_memory)
+        precomputed = {}
+        if workers > 1 and len(workbooks) > 1:
+            stages = {
+                'eeff': eeff_stage(FINANCIAL_INCOME_TERMS, SERVICE_INCOME_TERMS, NET_RESULT_TERMS),
+                'tc': tc_stage(TC_TERMS), 'ratios': RATIOS_STAGE
+            }
+            with stage('process_pool'):
+                precomputed = process_stages_in_pool(
+                    workbooks, {kind: spec for kind, spec in stages.items() if kind in processors}, workers, layout_cache
+                )
+        if 'eeff' in processors:
+            with stage('process_eeff'):
+                eeff_parts.append(process_dataset_eeff(
+                    workbooks, FINANCIAL_INCOME_TERMS, SERVICE_INCOME_TERMS, NET_RESULT_TERMS,
+                    logger, ledger=ledger, layout_cache=layout_cache, workers=workers, entity_names=entity_names,
+                    precomputed=precomputed.get('eeff')
+                ))
+        if 'tc' in processors:
+            with stage('process_tc'):
+                tc_parts.append(process_dataset_tc(
+                    workbooks, TC_TERMS, logger, layout_cache=layout_cache, workers=workers, precomputed=precomputed.get('tc')
+                ))
+        if 'ratios' in processors:
+            with stage('process_ratios'):
+                ratios_parts.append(process_dataset_ratios(
+                    workbooks, logger, ledger=ledger, workers=workers, entity_names=entity_names,
+                    precomputed=precomputed.get('ratios')
+                ))
+        for workbook in workbooks.values():
+            workbook.close()
+    # La concatenación une las categorías de cada lote, así el resultado conserva el esquema compacto
+    sbs_eeff_actualyzed = concat_frames(eeff_parts, EEFF_DTYPES)
+    sbs_tc_actualyzed = concat_frames(tc_parts, TC_DTYPES)
+    sbs_ratios_actualyzed = concat_frames(ratios_parts, RATIOS_DTYPES)
+    return sbs_eeff_actualyzed, sbs_tc_actualyzed, sbs_ratios_actualyzed, files_count
+
+
+def merge_and_upload_eeff(sbs_eeff_actualyzed: pd.DataFrame, sbs_eeff_processed: pd.DataFrame, gcs_manager: ObjectStorage, bucket_name: str, path_file_eeff: str, logger, stores: dict[str, ParquetDatasetStore] | None = None, manifest: CoverageManifest | None = None, uploads: dict[str, pd.DataFrame] | None = None) -> pd.DataFrame:
+    """
+    Fusiona (upsert por TIPO, DATE, ENTIDAD y MONEDA) y sube los datos nuevos de EEFF. Con `stores`, solo escribe las particiones Parquet nuevas.
+    
+    Si la subida es correcta, los periodos nuevos se añaden al manifiesto de cobertura. Con `uploads`,
+    los CSV quedan pendientes de `commit_uploads` y el manifiesto solo debe guardarse si esta los confirma.
+    """
+    metrics = get_metrics('sbs')
+    if not sbs_eeff_actualyzed.empty and stores is not None:
+        # Cada partición (TIPO, DATE) se reescribe completa, lo que equivale a un upsert por clave
+        sbs_eeff_actualyzed = sbs_eeff_actualyzed.drop_duplicates(EEFF_KEY, keep='last', ignore_index=True)
+        logger.info("💾 Guardando particiones nuevas del dataset de EEFF en 'SBS_EEFF/'...")
+        with stage('upload_eeff'):
+            written = stores['eeff'].write_partitions(sbs_eeff_actualyzed)
+        metrics.incr('eeff.partitions_written', written)
+        if manifest is not None and written == len(sbs_eeff_actualyzed[['TIPO', 'DATE']].drop_duplicates()):
+            manifest.add_frame(sbs_eeff_actualyzed)
+        with stage('update_analyzed'):
+            update_parquet_analyzed(stores, sbs_eeff_actualyzed, logger)
+        return sbs_eeff_processed
 
     if not sbs_eeff_actualyzed.empty:
-        sbs_eeff_processed = pd.concat(
-            [sbs_eeff_processed, sbs_eeff_actualyzed],
-            axis=0, ignore_index=True
-        )
+        # Upsert por clave: volver a procesar un mes reemplaza sus filas en lugar de duplicarlas
+        with stage('merge_eeff'):
+            eeff_table = UpsertTable(sbs_eeff_processed, EEFF_KEY, EEFF_COLUMNS, partition_cols=['TIPO', 'DATE'])
+            counts = eeff_table.upsert(sbs_eeff_actualyzed)
+            sbs_eeff_processed = eeff_table.to_frame()
+        for outcome, rows in counts.items():
+            metrics.incr(f"eeff.upsert_{outcome}", rows)
+        if not counts['inserted'] and not counts['updated']:
+            logger.info("✅ Los datos de EEFF procesados ya estaban en el dataset. No se vuelve a subir.")
+            if manifest is not None:
+                manifest.add_frame(sbs_eeff_actualyzed)
+            return sbs_eeff_processed
         logger.info(f"💾 Guardando dataset de EEFF procesado en '{path_file_eeff}'...")
-        gcs_manager.upload_df_as_csv(sbs_eeff_processed, bucket_name, path_file_eeff)
+        uploaded = upload_csv(sbs_eeff_processed, gcs_manager, bucket_name, path_file_eeff, uploads, 'upload_eeff')
+        if manifest is not None and uploaded:
+            manifest.add_frame(sbs_eeff_actualyzed)
 
-        sbs_eeff_analyzed = (
-            sbs_eeff_processed
-            .drop_duplicates(['PERIODO', 'ENTIDAD', 'MONEDA'], keep='last', ignore_index=True)
-        )
-        logger.info("💾 Guardando dataset de EEFF analizado en 'SBS_EEFF_ANALYZED.csv'...")
-        gcs_manager.upload_df_as_csv(sbs_eeff_analyzed, bucket_name, 'SBS_EEFF_ANALYZED.csv')
+        with stage('update_analyzed'):
+            update_csv_analyzed(sbs_eeff_processed, sbs_eeff_actualyzed, gcs_manager, bucket_name, 'SBS_EEFF_ANALYZED.csv', logger, uploads)
 
     return sbs_eeff_processed
 
 
-def process_and_upload_tc(files_in_memory: dict, sbs_tc_processed: pd.DataFrame | None, gcs_manager: GCSManager, bucket_name: str, path_file_tc: str, logger):
-    """Procesa, concatena y sube los datos de Tipo de Cambio."""
-    TC_TERMS = "TIPO DE CAMBIO"
-    sbs_tc_actualyzed = process_dataset_tc(files_in_memory, TC_TERMS, logger)
+def merge_and_upload_tc(sbs_tc_actualyzed: pd.DataFrame, sbs_tc_processed: pd.DataFrame | None, gcs_manager: ObjectStorage, bucket_name: str, path_file_tc: str, logger, stores: dict[str, ParquetDatasetStore] | None = None, uploads: dict[str, pd.DataFrame] | None = None) -> pd.DataFrame | None:
+    """Fusiona (upsert por DATE) y sube los datos nuevos de Tipo de Cambio. Con `stores`, solo escribe las particiones Parquet nuevas; con `uploads`, deja el CSV pendiente de `commit_uploads`."""
+    metrics = get_metrics('sbs')
+    if not sbs_tc_actualyzed.empty and stores is not None:
+        logger.info("💾 Guardando particiones nuevas del dataset de TC en 'SBS_TC/'...")
+        with stage('upload_tc'):
+            stores['tc'].write_partitions(sbs_tc_actualyzed.drop_duplicates(TC_KEY, keep='last', ignore_index=True))
+        return sbs_tc_processed
     
     if not sbs_tc_actualyzed.empty:
-        if sbs_tc_processed is not None and not sbs_tc_processed.empty:
-            sbs_tc_processed = pd.concat(
-                [sbs_tc_processed, sbs_tc_actualyzed],
-                axis=0, ignore_index=True
-            )
-        else:
-            sbs_tc_processed = sbs_tc_actualyzed
+        with stage('merge_tc'):
+            tc_table = UpsertTable(sbs_tc_processed, TC_KEY, TC_COLUMNS)
+            counts = tc_table.upsert(sbs_tc_actualyzed)
+            sbs_tc_processed = tc_table.to_frame()
+        for outcome, rows in counts.items():
+            metrics.incr(f"tc.upsert_{outcome}", rows)
+        if not counts['inserted'] and not counts['updated']:
+            logger.info("✅ Los datos de TC procesados ya estaban en el dataset. No se vuelve a subir.")
+            return sbs_tc_processed
             
         logger.info(f"💾 Guardando dataset de TC procesado en '{path_file_tc}'...")
-        gcs_manager.upload_df_as_csv(sbs_tc_processed, bucket_name, path_file_tc)
+        upload_csv(sbs_tc_processed, gcs_manager, bucket_name, path_file_tc, uploads, 'upload_tc')
+    
+    return sbs_tc_processed
+
+
+def merge_and_upload_ratios(sbs_ratios_actualyzed: pd.DataFrame, sbs_ratios_processed: pd.DataFrame | None, gcs_manager: ObjectStorage, bucket_name: str, path_file_ratios: str, logger, stores: dict[str, ParquetDatasetStore] | None = None, manifest: CoverageManifest | None = None, uploads: dict[str, pd.DataFrame] | None = None) -> pd.DataFrame | None:
+    """
+    Fusiona (upsert por TIPO, DATE, ENTIDAD e INDICADOR) y sube los datos nuevos de Ratios. Con `stores`, solo escribe las particiones Parquet nuevas.
+    
+    El dataset base se descarga aquí, solo si hay datos nuevos y no se recibió ya (`sbs_ratios_processed`).
+    Si la subida es correcta, los periodos nuevos se añaden al manifiesto de cobertura con su propia clave.
+    Con `uploads`, el CSV queda pendiente de `commit_uploads`, igual que en `merge_and_upload_eeff`.
+    """
+    if sbs_ratios_actualyzed.empty:
+        return sbs_ratios_processed
+    metrics = get_metrics('sbs')
+    sbs_ratios_actualyzed = sbs_ratios_actualyzed.drop_duplicates(RATIOS_KEY, keep='last', ignore_index=True)
+    if stores is not None:
+        logger.info("💾 Guardando particiones nuevas del dataset de Ratios en 'SBS_RATIOS/'...")
+        with stage('upload_ratios'):
+            written = stores['ratios'].write_partitions(sbs_ratios_actualyzed)
+        if manifest is not None and written == len(sbs_ratios_actualyzed[['TIPO', 'DATE']].drop_duplicates()):
+            manifest.add_frame(sbs_ratios_actualyzed, suffix=RATIOS_COVERAGE_SUFFIX)
+        return sbs_ratios_processed
+
+    if sbs_ratios_processed is None:
+        sbs_ratios_processed = gcs_manager.download_csv_as_df(bucket_name, path_file_ratios, dtype=RATIOS_DTYPES)
+    with stage('merge_ratios'):
+        ratios_table = UpsertTable(sbs_ratios_processed, RATIOS_KEY, RATIOS_COLUMNS, partition_cols=['TIPO', 'DATE'])
+        counts = ratios_table.upsert(sbs_ratios_actualyzed)
+        sbs_ratios_processed = ratios_table.to_frame()
+    for outcome, rows in counts.items():
+        metrics.incr(f"ratios.upsert_{outcome}", rows)
+    if not counts['inserted'] and not counts['updated']:
+        logger.info("✅ Los datos de Ratios procesados ya estaban en el dataset. No se vuelve a subir.")
+        uploaded = True
+    else:
+        logger.info(f"💾 Guardando dataset de Ratios procesado en '{path_file_ratios}'...")
+        uploaded = upload_csv(sbs_ratios_processed, gcs_manager, bucket_name, path_file_ratios, uploads, 'upload_ratios')
+    if manifest is not None and uploaded:
+        manifest.add_frame(sbs_ratios_actualyzed, suffix=RATIOS_COVERAGE_SUFFIX)
+    return sbs_ratios_processed
+
+
+def run_backfill(manifest: CoverageManifest, ledger: ProbeLedger, raw_cache: RawWorkbookCache, layout_cache: LayoutTemplateCache, stores: dict[str, ParquetDatasetStore] | None, gcs_manager: ObjectStorage, bucket_name: str, paths: dict[str, str], logger, offline: bool = False, workers: int = 1, max_batches: int = 0, entity_names: EntityNameCache | None = None, processors=DEFAULT_PROCESSORS, windows: dict[str, tuple[int | None, int | None]] | None = None, refresh: bool = False) -> bool:
+    """
+    Carga histórica por etapas: un lote por tipo de documento y año, en orden cronológico.
+    
+    Cada lote se descarga, procesa y sube antes de empezar el siguiente y, al terminar, se guardan
+    el manifiesto de cobertura, el registro de sondeos y las plantillas (punto de control). Si el
+    proceso se interrumpe, la siguiente ejecución retoma desde el primer lote no confirmado. En modo
+    CSV, los archivos de cada lote se confirman juntos; si no se pueden confirmar, la carga se detiene
+    sin guardar el punto de control.
+    
+    Args:
+        paths: Rutas en GCS de los archivos, con las claves 'eeff', 'tc', 'ledger', 'templates',
+            'coverage', 'ratios' y, si se usa `entity_names`, 'entities'.
+        max_batches: Máximo de lotes a procesar en esta ejecución (0 = todos), para repartir la carga
+            entre varias ejecuciones con tiempo limitado.
+        processors: Procesadores habilitados; los lotes solo incluyen los reportes que usan.
+        windows: Ventanas de fechas (ver `build_windows`); los lotes solo incluyen esos periodos.
+        refresh: Vuelve a cargar los periodos existentes dentro de las ventanas. Como esos periodos
+            siguen planificándose tras confirmarse, una carga con `refresh` no se retoma: se repite.
+    
+    Returns:
+        True si se confirmaron todos los lotes (o no había ninguno pendiente).
+    """
+    batches = plan_backfill_batches(manifest.coverage, processors=processors, windows=windows, refresh=refresh)
+    if max_batches:
+        batches = batches[:max_batches]
+    logger.info(f"--- 🧱 Carga histórica por lotes: {len(batches)} lotes pendientes ---")
+    if not batches:
+        return True
+    if uses_eeff_files(processors):
+        sbs_eeff_processed, sbs_tc_processed = load_processed_datasets(stores, gcs_manager, bucket_name, paths['eeff'], paths['tc'], logger)
+    else:
+        sbs_eeff_processed, sbs_tc_processed = pd.DataFrame(), None
+    sbs_ratios_processed = None
+    for number, (doc_type, year, urls) in enumerate(batches, start=1):
+        logger.info(f"--- 🧱 Lote {number}/{len(batches)}: {doc_type} {year} ({len(urls)} URLs) ---")
+        with stage('download'):
+            files_in_memory = download_dataset(None, urls=urls, ledger=ledger, raw_cache=raw_cache, offline=offline)
+        sbs_eeff_actualyzed, sbs_tc_actualyzed, sbs_ratios_actualyzed, files_count = process_batches(
+            [files_in_memory], ledger, layout_cache, workers, logger, entity_names, processors
+        )
+        uploads = {} if stores is None else None
+        if files_count:
+            sbs_eeff_processed = merge_and_upload_eeff(
+                sbs_eeff_actualyzed, sbs_eeff_processed, gcs_manager, bucket_name, paths['eeff'], logger,
+                stores=stores, manifest=manifest, uploads=uploads
+            )
+            sbs_tc_processed = merge_and_upload_tc(
+                sbs_tc_actualyzed, sbs_tc_processed, gcs_manager, bucket_name, paths['tc'], logger,
+                stores=stores, uploads=uploads
+            )
+            sbs_ratios_processed = merge_and_upload_ratios(
+                sbs_ratios_actualyzed, sbs_ratios_processed, gcs_manager, bucket_name, paths['ratios'], logger,
+                stores=stores, manifest=manifest, uploads=uploads
+            )
+        if not commit_uploads(uploads, gcs_manager, bucket_name, logger):
+            logger.error(f"❌ No se pudo confirmar el lote {doc_type} {year}. Se detiene la carga histórica; se reintentará en la siguiente ejecución.")
+            return False
+        # Punto de control: lo confirmado en este lote ya no se vuelve a planificar
+        save_probe_ledger(ledger, gcs_manager, bucket_name, paths['ledger'])
+        save_coverage_manifest(manifest, gcs_manager, bucket_name, paths['coverage'])
+        save_layout_cache(layout_cache, gcs_manager, bucket_name, paths['templates'])
+        if entity_names is not None:
+            save_entity_names(entity_names, gcs_manager, bucket_name, paths['entities'])
+        get_metrics('sbs').incr('backfill.batches')
+        logger.info(f"  ✅ Lote {doc_type} {year} confirmado.")
+    return True
 
 
-def main():
+def merge_and_commit(sbs_eeff_actualyzed: pd.DataFrame, sbs_tc_actualyzed: pd.DataFrame, sbs_ratios_actualyzed: pd.DataFrame, manifest: CoverageManifest, ledger: ProbeLedger, stores: dict[str, ParquetDatasetStore] | None, gcs_manager: ObjectStorage, bucket_name: str, paths: dict[str, str], logger, processors=DEFAULT_PROCESSORS, layout_cache: LayoutTemplateCache | None = None, entity_names: EntityNameCache | None = None) -> bool:
+    """
+    Fusiona las filas nuevas con los datasets base, las sube y guarda el estado compartido.
+    
+    En modo CSV, los archivos se suben al final en paralelo y se confirman todos o ninguno; el
+    manifiesto de cobertura solo se guarda si se confirmaron. El registro de sondeos se guarda
+    siempre y, si se indican, también las plantillas y el diccionario de entidades.
+    
+    Args:
+        paths: Rutas en GCS de los archivos, con las claves 'eeff', 'tc', 'ratios', 'ledger',
+            'coverage' y, si se usan `layout_cache` o `entity_names`, 'templates' y 'entities'.
+    
+    Returns:
+        True si los datasets se confirmaron.
+    """
+    # --- 4. Descarga de Datasets Base desde GCS ---
+    if uses_eeff_files(processors):
+        sbs_eeff_processed, sbs_tc_processed = load_processed_datasets(stores, gcs_manager, bucket_name, paths['eeff'], paths['tc'], logger)
+    else:
+        sbs_eeff_processed, sbs_tc_processed = pd.DataFrame(), None
+
+    # --- 5. Fusión y Carga de EEFF, TC y Ratios ---
+    uploads = {} if stores is None else None
+    merge_and_upload_eeff(
+        sbs_eeff_actualyzed, sbs_eeff_processed, gcs_manager, bucket_name, paths['eeff'], logger,
+        stores=stores, manifest=manifest, uploads=uploads
+    )
+    merge_and_upload_ratios(
+        sbs_ratios_actualyzed, None, gcs_manager, bucket_name, paths['ratios'], logger,
+        stores=stores, manifest=manifest, uploads=uploads
+    )
+    merge_and_upload_tc(sbs_tc_actualyzed, sbs_tc_processed, gcs_manager, bucket_name, paths['tc'], logger, stores=stores, uploads=uploads)
+    committed = commit_uploads(uploads, gcs_manager, bucket_name, logger)
+    save_probe_ledger(ledger, gcs_manager, bucket_name, paths['ledger'])
+    if committed:
+        save_coverage_manifest(manifest, gcs_manager, bucket_name, paths['coverage'])
+    else:
+        logger.error("❌ No se confirmaron los datasets en GCS. El manifiesto de cobertura no se actualiza; los periodos nuevos se volverán a procesar en la siguiente ejecución.")
+    if layout_cache is not None:
+        save_layout_cache(layout_cache, gcs_manager, bucket_name, paths['templates'])
+    if entity_names is not None:
+        save_entity_names(entity_names, gcs_manager, bucket_name, paths['entities'])
+    return committed
+
+
+def shard_path(run_id: str, index: int, count: int) -> str:
+    """Devuelve la carpeta en GCS de los resultados parciales de la partición `index` de `count` (ej: 'SBS_SHARDS/123/shard-000-of-004')."""
+    return f"{SHARDS_PREFIX}/{run_id}/shard-{index:03d}-of-{count:03d}"
+
+
+def save_shard_partial(frames: dict[str, pd.DataFrame], ledger: ProbeLedger, gcs_manager: ObjectStorage, bucket_name: str, prefix: str, info: dict, logger, layout_cache: LayoutTemplateCache | None = None, entity_names: EntityNameCache | None = None) -> bool:
+    """
+    Sube el resultado parcial de una partición: un Parquet por dataset no vacío, su registro de sondeos,
+    sus plantillas y su diccionario de entidades (si se indican) y, al final, 'shard.json' con `info` y
+    los archivos subidos.
+    
+    'shard.json' marca la partición como terminada: si falta, la fusión no la da por completa.
+    
+    Returns:
+        True si se subieron todos los archivos.
+    """
+    datasets = {}
+    with stage('save_shard'):
+        for name, df in frames.items():
+            if df.empty:
+                continue
+            buffer = io.BytesIO()
+            df.to_parquet(buffer, index=False)
+            path = f"{prefix}/{name}.parquet"
+            if not gcs_manager.upload_bytes(buffer.getvalue(), bucket_name, path, content_type='application/vnd.apache.parquet'):
+                return False
+            datasets[name] = path
+        if not gcs_manager.upload_bytes(ledger.to_bytes(), bucket_name, f"{prefix}/ledger.json", content_type='application/json'):
+            return False
+        state = {}
+        for name, cache in [('templates', layout_cache), ('entities', entity_names)]:
+            if cache is None:
+                continue
+            path = f"{prefix}/{name}.json"
+            if not gcs_manager.upload_bytes(cache.to_bytes(), bucket_name, path, content_type='application/json'):
+                return False
+            state[name] = path
+        marker = dict(info, datasets=datasets, state=state, created_at=datetime.now().isoformat(timespec='seconds'))
+        data = json.dumps(marker, ensure_ascii=False, indent=2).encode('utf-8')
+        if not gcs_manager.upload_bytes(data, bucket_name, f"{prefix}/shard.json", content_type='application/json'):
+            return False
+    logger.info(f"  💾 Resultado parcial guardado en '{prefix}' ({', '.join(datasets) or 'sin datos nuevos'}).")
+    return True
+
+
+def load_shard_partials(gcs_manager: ObjectStorage, bucket_name: str, run_id: str, logger) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, list[dict]]:
+    """
+    Lee los resultados parciales de todas las particiones de la ejecución `run_id`.
+    
+    Returns:
+        Una tupla (filas de EEFF, filas de TC, filas de Ratios, estado de cada partición). El estado es
+        un diccionario con su registro de sondeos ('ledger') y, si los guardó, sus plantillas
+        ('templates') y su diccionario de entidades ('entities'); si no, None.
+    
+    Raises:
+        RuntimeError: Si no hay particiones, si no coinciden en el plan o si falta alguna por terminar.
+    """
+    with stage('load_shards'):
+        names = gcs_manager.list_blobs(bucket_name, f"{SHARDS_PREFIX}/{run_id}/")
+        markers = []
+        for name in sorted(name for name in names if name.endswith('/shard.json')):
+            markers.append(json.loads(gcs_manager.download_bytes(bucket_name, name).decode('utf-8')))
+        if not markers:
+            raise RuntimeError(f"No hay particiones terminadas en '{SHARDS_PREFIX}/{run_id}/'.")
+        plans = {(marker['count'], marker['by'], marker['planned']) for marker in markers}
+        if len(plans) > 1:
+            raise RuntimeError(f"Las particiones de '{run_id}' no comparten el mismo plan: {sorted(plans)}.")
+        count = markers[0]['count']
+        missing = sorted(set(range(count)) - {marker['index'] for marker in markers})
+        if missing:
+            raise RuntimeError(f"Faltan {len(missing)} de {count} particiones de '{run_id}' por terminar: {missing}.")
+        parts = {'eeff': [], 'tc': [], 'ratios': []}
+        states = []
+        # Posición de cada lote en el plan, para que las filas se fusionen en el mismo orden que en una carga en serie
+        positions = {(doc_type, year): position for marker in markers for position, doc_type, year in marker['batches']}
+        for marker in markers:
+            for name, path in marker['datasets'].items():
+                parts[name].append(pd.read_parquet(io.BytesIO(gcs_manager.download_bytes(bucket_name, path))))
+            prefix = shard_path(run_id, marker['index'], count)
+            paths = marker.get('state', {})
+            states.append({
+                'ledger': ProbeLedger(data=gcs_manager.download_bytes(bucket_name, f"{prefix}/ledger.json")),
+                'templates': LayoutTemplateCache(data=gcs_manager.download_bytes(bucket_name, paths['templates'])) if 'templates' in paths else None,
+                'entities': EntityNameCache(data=gcs_manager.download_bytes(bucket_name, paths['entities'])) if 'entities' in paths else None,
+            })
+    logger.info(
+        f"🧩 {count} particiones de '{run_id}' leídas: {sum(marker['files'] for marker in markers)} archivos, "
+        f"{sum(len(marker['batches']) for marker in markers)} lotes.")
+    frames = [
+        sort_by_plan(concat_frames(parts[name], dtypes), positions)
+        for name, dtypes in [('eeff', EEFF_DTYPES), ('tc', TC_DTYPES), ('ratios', RATIOS_DTYPES)]
+    ]
+    return *frames, states
+
+
+def delete_shard_partials(gcs_manager: ObjectStorage, bucket_name: str, run_id: str, logger) -> bool:
+    """
+    Elimina los resultados parciales de la ejecución `run_id` una vez fusionados, para que una nueva
+    fusión con el mismo identificador no vuelva a aplicarlos.
+    
+    Los 'shard.json' se eliminan primero: si la limpieza queda a medias, las particiones ya no cuentan
+    como terminadas y una nueva fusión se rechaza en lugar de repetir datos antiguos.
+    
+    Returns:
+        True si se eliminaron todos los archivos.
+    """
+    names = gcs_manager.list_blobs(bucket_name, f"{SHARDS_PREFIX}/{run_id}/")
+    markers = [name for name in names if name.endswith('/shard.json')]
+    deleted = (
+        gcs_manager.delete_blobs(bucket_name, markers)
+        and gcs_manager.delete_blobs(bucket_name, [name for name in names if name not in markers])
+    )
+    if deleted:
+        logger.info(f"  🗑️ Resultados parciales de '{run_id}' eliminados ({len(names)} archivos).")
+    else:
+        logger.warning(f"⚠️ No se pudieron eliminar los resultados parciales de '{SHARDS_PREFIX}/{run_id}/'.")
+    return deleted
+
+
+def sort_by_plan(df: pd.DataFrame, positions: dict[tuple[str, int], int]) -> pd.DataFrame:
+    """Ordena (de forma estable) las filas según la posición en el plan de su lote (TIPO y año de DATE); sin TIPO, solo por DATE."""
+    if df.empty:
+        return df
+    if 'TIPO' not in df.columns:
+        return df.sort_values('DATE', kind='stable', ignore_index=True)
+    order = [positions.get(key, len(positions)) for key in zip(df['TIPO'].astype(str), df['DATE'] // 100)]
+    return df.assign(_ORDER=order).sort_values('_ORDER', kind='stable', ignore_index=True).drop(columns='_ORDER')
+
+
+def run_shard(manifest: CoverageManifest, ledger: ProbeLedger, raw_cache: RawWorkbookCache, layout_cache: LayoutTemplateCache, gcs_manager: ObjectStorage, bucket_name: str, shard: tuple[int, int], run_id: str, logger, by: str = 'batch', offline: bool = False, workers: int = 1, entity_names: EntityNameCache | None = None, processors=DEFAULT_PROCESSORS, windows: dict[str, tuple[int | None, int | None]] | None = None, refresh: bool = False) -> bool:
+    """
+    Ejecuta una partición de la carga: descarga y procesa su parte del plan y guarda el resultado parcial.
+    
+    Todas las particiones calculan el mismo plan (los lotes de `plan_backfill_batches`) a partir del
+    mismo manifiesto y cada una se queda con su parte (ver `shard_batches`), así pueden ejecutarse en
+    paralelo en máquinas distintas (ej: una matriz de CI). Solo escriben bajo su carpeta de
+    `SHARDS_PREFIX`: los datasets, el manifiesto y el registro de sondeos compartidos no se tocan
+    hasta que `run_merge_shards` fusiona todas las particiones.
+    
+    Args:
+        shard: Partición a ejecutar, como (índice 0-based, número de particiones).
+        run_id: Identificador de la ejecución que agrupa las particiones (ej: el id de la ejecución de CI).
+        by: Unidad de reparto de `shard_batches` ('batch', 'report' o 'year').
+    
+    Returns:
+        True si se guardó el resultado parcial.
+    """
+    index, count = shard
+    planned = plan_backfill_batches(manifest.coverage, processors=processors, windows=windows, refresh=refresh)
+    positions = {(doc_type, year): position for position, (doc_type, year, _) in enumerate(planned)}
+    batches = shard_batches(planned, index, count, by=by)
+    logger.info(
+        f"--- 🧩 Partición {index + 1}/{count} de '{run_id}' (reparto por '{by}'): {len(batches)} de {len(planned)} lotes, "
+        f"{sum(len(urls) for _, _, urls in batches)} URLs ---")
+    eeff_parts, tc_parts, ratios_parts, files_total = [], [], [], 0
+    for number, (doc_type, year, urls) in enumerate(batches, start=1):
+        logger.info(f"--- 🧱 Lote {number}/{len(batches)}: {doc_type} {year} ({len(urls)} URLs) ---")
+        with stage('download'):
+            files_in_memory = download_dataset(None, urls=urls, ledger=ledger, raw_cache=raw_cache, offline=offline)
+        with stage('process'):
+            sbs_eeff_actualyzed, sbs_tc_actualyzed, sbs_ratios_actualyzed, files_count = process_batches(
+                [files_in_memory], ledger, layout_cache, workers, logger, entity_names, processors
+            )
+        eeff_parts.append(sbs_eeff_actualyzed)
+        tc_parts.append(sbs_tc_actualyzed)
+        ratios_parts.append(sbs_ratios_actualyzed)
+        files_total += files_count
+    frames = {
+        'eeff': concat_frames(eeff_parts, EEFF_DTYPES), 'tc': concat_frames(tc_parts, TC_DTYPES),
+        'ratios': concat_frames(ratios_parts, RATIOS_DTYPES)
+    }
+    info = {
+        'run': run_id, 'index': index, 'count': count, 'by': by, 'planned': len(planned),
+        'batches': [[positions[doc_type, year], doc_type, year] for doc_type, year, _ in batches], 'files': files_total
+    }
+    if not save_shard_partial(
+        frames, ledger, gcs_manager, bucket_name, shard_path(run_id, index, count), info, logger,
+        layout_cache=layout_cache, entity_names=entity_names
+    ):
+        logger.error(f"❌ No se pudo guardar el resultado parcial de la partición {index + 1}/{count}.")
+        return False
+    return True
+
+
+def run_merge_shards(manifest: CoverageManifest, ledger: ProbeLedger, stores: dict[str, ParquetDatasetStore] | None, gcs_manager: ObjectStorage, bucket_name: str, paths: dict[str, str], run_id: str, logger, processors=DEFAULT_PROCESSORS, layout_cache: LayoutTemplateCache | None = None, entity_names: EntityNameCache | None = None) -> bool:
+    """
+    Fusiona los resultados parciales de todas las particiones de `run_id` en los datasets canónicos.
+    
+    Los registros de sondeos de las particiones se incorporan al compartido (por archivo, gana la
+    consulta más reciente), igual que sus plantillas (por reporte, gana la más reciente) y los nombres
+    de entidad nuevos; las filas nuevas se fusionan y suben como en una ejecución normal. Si falta
+    alguna partición, no se escribe nada. Tras confirmar, se eliminan los resultados parciales.
+    
+    Returns:
+        True si los datasets se confirmaron.
+    """
+    sbs_eeff_actualyzed, sbs_tc_actualyzed, sbs_ratios_actualyzed, states = load_shard_partials(gcs_manager, bucket_name, run_id, logger)
+    merged = sum(ledger.merge(state['ledger']) for state in states)
+    logger.info(f"  🧾 Registro de sondeos: {merged} entradas nuevas o actualizadas por las particiones.")
+    if layout_cache is not None:
+        merged = sum(layout_cache.merge(state['templates']) for state in states if state['templates'] is not None)
+        logger.info(f"  📐 Plantillas de diseño: {merged} nuevas o actualizadas por las particiones.")
+    if entity_names is not None:
+        merged = sum(entity_names.merge(state['entities']) for state in states if state['entities'] is not None)
+        logger.info(f"  🏷️ Nombres de entidad: {merged} nuevos aportados por las particiones.")
+    if sbs_eeff_actualyzed.empty and sbs_tc_actualyzed.empty and sbs_ratios_actualyzed.empty:
+        save_probe_ledger(ledger, gcs_manager, bucket_name, paths['ledger'])
+        if layout_cache is not None:
+            save_layout_cache(layout_cache, gcs_manager, bucket_name, paths['templates'])
+        if entity_names is not None:
+            save_entity_names(entity_names, gcs_manager, bucket_name, paths['entities'])
+        logger.info("✅ Las particiones no encontraron nuevos archivos. El dataset está actualizado.")
+        delete_shard_partials(gcs_manager, bucket_name, run_id, logger)
+        return True
+    committed = merge_and_commit(
+        sbs_eeff_actualyzed, sbs_tc_actualyzed, sbs_ratios_actualyzed, manifest, ledger, stores,
+        gcs_manager, bucket_name, paths, logger, processors=processors, layout_cache=layout_cache, entity_names=entity_names
+    )
+    if committed:
+        delete_shard_partials(gcs_manager, bucket_name, run_id, logger)
+    return committed
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Lee las opciones de línea de comandos del proceso."""
+    parser = argparse.ArgumentParser(description="Extracción y procesamiento de reportes financieros de la SBS.")
+    parser.add_argument(
+        '--offline', action='store_true',
+        help="No consulta la web de la SBS; reprocesa solo los archivos de la caché local (.cache/sbs_raw)."
+    )
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help="Número de procesos para abrir y procesar los archivos Excel en paralelo (por defecto 1, en serie); "
+             "cada archivo se procesa para todas las etapas en un mismo proceso."
+    )
+    parser.add_argument(
+        '--storage', choices=['csv', 'parquet'], default='csv',
+        help="Formato de almacenamiento en GCS: CSV completo (por defecto) o Parquet particionado por TIPO y DATE."
+    )
+    parser.add_argument(
+        '--storage-backend', choices=STORAGE_BACKENDS, default='gcs',
+        help="Dónde se leen y escriben los datasets: 'gcs' (por defecto), 'local' (carpeta de --storage-root, "
+             "sin credenciales ni red) o 'memory' (se pierde al terminar; para pruebas)."
+    )
+    parser.add_argument(
+        '--storage-root', default='sbs_storage',
+        help="Con --storage-backend local, carpeta raíz del almacén (por defecto 'sbs_storage')."
+    )
+    parser.add_argument(
+        '--no-object-cache', action='store_true',
+        help=f"Con GCS, no usa la caché local de objetos ({OBJECT_CACHE_DIR}), indexada por generación."
+    )
+    parser.add_argument(
+        '--export-csv', action='store_true',
+        help="En modo Parquet, genera además los CSV completos como artefactos derivados."
+    )
+    parser.add_argument(
+        '--stream-window', type=int, default=0,
+        help="Procesa los archivos a medida que se descargan, en lotes de N y con como máximo N descargas en vuelo (por defecto 0: todos a la vez)."
+    )
+    parser.add_argument(
+        '--backfill', action='store_true',
+        help="Carga histórica por lotes (tipo de entidad y año) con un punto de control tras cada lote; al relanzarla, retoma donde se quedó."
+    )
+    parser.add_argument(
+        '--max-batches', type=int, default=0,
+        help="Con --backfill, número máximo de lotes a procesar en esta ejecución (por defecto 0: todos)."
+    )
+    parser.add_argument(
+        '--shard', metavar='I/N',
+        help="Ejecuta solo la partición I (0-based) de N del plan de carga y guarda su resultado parcial en "
+             f"'{SHARDS_PREFIX}/<--shard-run>/', sin tocar los datasets; las particiones se combinan con --merge-shards."
+    )
+    parser.add_argument(
+        '--shard-by', choices=SHARD_STRATEGIES, default='batch',
+        help="Con --shard, unidad de reparto: 'batch' (tipo de entidad y año, por defecto), 'report' (todos los "
+             "años de un tipo de entidad) o 'year' (rangos de años consecutivos)."
+    )
+    parser.add_argument(
+        '--shard-run', default=os.environ.get('GITHUB_RUN_ID', 'local'),
+        help="Identificador que agrupa las particiones de una misma carga (por defecto, GITHUB_RUN_ID o 'local')."
+    )
+    parser.add_argument(
+        '--merge-shards', action='store_true',
+        help="Fusiona en los datasets los resultados parciales de todas las particiones de --shard-run."
+    )
+    parser.add_argument(
+        '--from', dest='date_from', metavar='AAAAMM',
+        help="Primer periodo a planificar ('AAAAMM' o 'AAAA'). Por defecto, el año de inicio de cada reporte."
+    )
+    parser.add_argument(
+        '--to', dest='date_to', metavar='AAAAMM',
+        help="Último periodo a planificar ('AAAAMM' o 'AAAA'). Por defecto, el último mes cerrado."
+    )
+    parser.add_argument(
+        '--report-window', action='append', default=[], metavar='REPORTE=DESDE:HASTA',
+        help="Ventana propia de un reporte, por código o nombre (ej: 'B-2201=202001:202312' o 'C-1101=2020:'); "
+             "reemplaza a --from/--to para ese reporte. Se puede repetir."
+    )
+    parser.add_argument(
+        '--refresh', action='store_true',
+        help="Vuelve a descargar y procesar los periodos que ya existen dentro de las ventanas de --from/--to "
+             "o --report-window (los archivos sin cambios se revalidan con la caché local)."
+    )
+    parser.add_argument(
+        '--processors', default=','.join(DEFAULT_PROCESSORS), metavar='PROCESADORES',
+        help=f"Procesadores a ejecutar, separados por comas ({', '.join(PROCESSORS)}; por defecto "
+             f"'{','.join(DEFAULT_PROCESSORS)}'). Solo se descargan los reportes que usa alguno de ellos: "
+             "los de Ratios, únicamente con 'ratios'."
+    )
+    parser.add_argument(
+        '--excel-backend', choices=sorted(BACKENDS), default=default_backend(),
+        help="Lector de los libros Excel: 'pandas' (por defecto, o el valor de SBS_EXCEL_BACKEND), 'xlrd' "
+             "(lectura directa de celdas de los .xls) o 'calamine' (requiere python-calamine; si no está "
+             "instalado, el proceso no arranca). Si el lector no puede abrir un archivo, se usa el de pandas."
+    )
+    parser.add_argument(
+        '--profile', nargs='?', const='all', default=None, metavar='ETAPAS',
+        help="Perfila con cProfile y tracemalloc las etapas indicadas, separadas por comas "
+             f"({', '.join(PROFILE_STAGES)}), o todas si no se indica ninguna. Con --workers > 1, "
+             "el trabajo de los procesos auxiliares no aparece en el perfil."
+    )
+    parser.add_argument(
+        '--profile-dir', default='sbs_profiles',
+        help="Carpeta donde se guardan los perfiles de --profile (por defecto 'sbs_profiles', junto al log)."
+    )
+    args = parser.parse_args(argv)
+    args.processors = [name.strip() for name in args.processors.split(',') if name.strip()]
+    try:
+        args.windows = build_windows(args.date_from, args.date_to, args.report_window)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.shard is not None:
+        try:
+            index, count = (int(value) for value in args.shard.split('/'))
+            args.shard = (index, count)
+        except ValueError:
+            parser.error(f"--shard debe tener la forma I/N (ej: 0/4): '{args.shard}'.")
+        if count < 1 or not 0 <= index < count:
+            parser.error(f"Partición fuera de rango en --shard: {index}/{count}.")
+        if args.merge_shards or args.backfill:
+            parser.error("--shard no se puede combinar con --merge-shards ni con --backfill.")
+    if args.refresh and not args.windows:
+        parser.error("--refresh requiere una ventana: --from/--to o --report-window.")
+    unknown = set(args.processors) - set(PROCESSORS)
+    if unknown or not args.processors:
+        parser.error(f"Procesadores desconocidos en --processors: {', '.join(sorted(unknown)) or '(ninguno)'}")
+    try:
+        check_backend(args.excel_backend)
+    except ImportError as e:
+        parser.error(str(e))
+    if args.profile not in (None, 'all'):
+        unknown = set(args.profile.split(',')) - set(PROFILE_STAGES)
+        if unknown:
+            parser.error(f"Etapas desconocidas en --profile: {', '.join(sorted(unknown))}")
+    return args
+
+
+def save_run_metrics(metrics: RunMetrics, gcs_manager: ObjectStorage, bucket_name: str, path_metrics: str, logger):
+    """
+    Añade el resumen de métricas de la ejecución al archivo local y al JSONL acumulado en GCS.
+    
+    El archivo de GCS conserva una línea por ejecución, para comparar ejecuciones sucesivas.
+    """
+    try:
+        metrics.write_jsonl(METRICS_FILE)
+        history = gcs_manager.download_bytes(bucket_name, path_metrics) or b''
+        gcs_manager.upload_bytes(history + metrics.to_jsonl(), bucket_name, path_metrics, content_type='application/x-ndjson')
+    except Exception as e:
+        # Las métricas nunca deben ocultar el resultado (o el error) de la ejecución
+        logger.error(f"❌ No se pudieron guardar las métricas de la ejecución: {e}")
+
+
+def main(args: argparse.Namespace | None = None):
     """Función principal que orquesta la descarga, procesamiento y almacenamiento de datos de la SBS."""
+    args = args if args is not None else parse_args([])
     logger = get_logger('sbs')
+    metrics = get_metrics('sbs')
+    metrics.set_info(**vars(args))
     logger.info("--- 🚀 Iniciando el proceso principal de SBS ---")
+    set_default_backend(args.excel_backend)
+    logger.info(f"📖 Lector de libros Excel: '{args.excel_backend}'.")
+    if args.profile is not None:
+        get_profiler('sbs').enable(None if args.profile == 'all' else args.profile.split(','), args.profile_dir)
 
-    # --- 1. Configuración y Conexión a GCS ---
+    # --- 1. Configuración y Conexión a GCS (o al almacén local de --storage-backend) ---
     bucket_name = 'opendataanalyzer_datas'
+    path_file_metrics = 'SBS_METRICS.jsonl'
+    logger.info(f"🗄️ Almacén de datos: '{args.storage_backend}'.")
+    gcs_manager = build_storage(args.storage_backend, args.storage_root, None if args.no_object_cache else OBJECT_CACHE_DIR)
+    try:
+        succeeded = run_sbs(args, gcs_manager, bucket_name, logger)
+        metrics.set_info(status='ok' if succeeded else 'error')
+    except Exception:
+        metrics.set_info(status='error')
+        raise
+    finally:
+        save_run_metrics(metrics, gcs_manager, bucket_name, path_file_metrics, logger)
+    if not succeeded:
+        # Código de salida distinto de cero para que el flujo de CI marque la ejecución como fallida
+        sys.exit(1)
+
+
+def run_sbs(args: argparse.Namespace, gcs_manager: ObjectStorage, bucket_name: str, logger) -> bool:
+    """
+    Ejecuta el proceso de SBS: detección, descarga, procesamiento, fusión y carga en GCS.
+    
+    Returns:
+        False si los datos no se pudieron confirmar en GCS (en ese caso no se exportan los CSV derivados).
+    """
     path_file_eeff = 'SBS_EEFF_PROCESSED.csv'
     path_file_tc = 'SBS_TC_PROCESSED.csv'
-    gcs_manager = GCSManager()
+    path_file_ledger = 'SBS_PROBE_LEDGER.json'
+    path_file_templates = 'SBS_LAYOUT_TEMPLATES.json'
+    path_file_coverage = 'SBS_COVERAGE.json'
+    path_file_coverage_parquet = 'SBS_COVERAGE_PARQUET.json'
+    path_file_entities = 'SBS_ENTITY_NAMES.json'
+    path_file_ratios = 'SBS_RATIOS_PROCESSED.csv'
+    # El dataset de Ratios solo se lee y se escribe si su procesador está habilitado
+    path_ratios = path_file_ratios if 'ratios' in args.processors else None
+    with stage('load_state'):
+        ledger = load_probe_ledger(gcs_manager, bucket_name, path_file_ledger)
+        raw_cache = RawWorkbookCache()
+        layout_cache = load_layout_cache(gcs_manager, bucket_name, path_file_templates)
+        entity_names = load_entity_names(gcs_manager, bucket_name, path_file_entities)
 
-    # --- 2. Descarga de Datasets Base desde GCS ---
-    sbs_eeff_processed, sbs_tc_processed = download_base_datasets(
-        gcs_manager, bucket_name, path_file_eeff, path_file_tc, logger
+    # --- 2. Detección y Descarga de Nuevos Archivos ---
+    # El manifiesto de cobertura basta para planificar: el dataset base solo se descarga si hay novedades
+    stores = build_parquet_stores(gcs_manager, bucket_name) if args.storage == 'parquet' else None
+    if stores is not None:
+        # Cada formato lleva su propio manifiesto, así el primer uso de Parquet migra los CSV
+        path_file_coverage = path_file_coverage_parquet
+    manifest = load_coverage_manifest(gcs_manager, bucket_name, path_file_coverage)
+    if manifest.is_empty():
+        with stage('bootstrap_coverage'):
+            bootstrap_coverage_manifest(manifest, stores, gcs_manager, bucket_name, path_file_eeff, path_file_tc, logger, path_ratios)
+        if not manifest.is_empty() and args.shard is None:
+            save_coverage_manifest(manifest, gcs_manager, bucket_name, path_file_coverage)
+    paths = {
+        'eeff': path_file_eeff, 'tc': path_file_tc, 'ledger': path_file_ledger,
+        'templates': path_file_templates, 'coverage': path_file_coverage, 'entities': path_file_entities,
+        'ratios': path_file_ratios
+    }
+    if args.shard is not None:
+        # Cada partición solo escribe su resultado parcial; el estado compartido lo guarda --merge-shards
+        if not run_shard(
+            manifest, ledger, raw_cache, layout_cache, gcs_manager, bucket_name, args.shard, args.shard_run, logger,
+            by=args.shard_by, offline=args.offline, workers=args.workers, entity_names=entity_names,
+            processors=args.processors, windows=args.windows, refresh=args.refresh
+        ):
+            logger.error("--- ❌ La partición no guardó su resultado parcial. ---")
+            return False
+        logger.info("--- ✅ Proceso principal de SBS finalizado exitosamente. ---")
+        return True
+    if args.merge_shards:
+        if not run_merge_shards(
+            manifest, ledger, stores, gcs_manager, bucket_name, paths, args.shard_run, logger,
+            processors=args.processors, layout_cache=layout_cache, entity_names=entity_names
+        ):
+            logger.error("--- ❌ La fusión de las particiones no confirmó los datos. ---")
+            return False
+        if stores is not None and args.export_csv:
+            export_csv_artifacts(stores, gcs_manager, bucket_name, path_file_eeff, path_file_tc, logger, path_ratios)
+        logger.info("--- ✅ Proceso principal de SBS finalizado exitosamente. ---")
+        return True
+    if args.backfill:
+        if not run_backfill(
+            manifest, ledger, raw_cache, layout_cache, stores, gcs_manager, bucket_name, paths, logger,
+            offline=args.offline, workers=args.workers, max_batches=args.max_batches, entity_names=entity_names,
+            processors=args.processors, windows=args.windows, refresh=args.refresh
+        ):
+            logger.error("--- ❌ La carga histórica no se completó. ---")
+            return False
+        if stores is not None and args.export_csv:
+            export_csv_artifacts(stores, gcs_manager, bucket_name, path_file_eeff, path_file_tc, logger, path_ratios)
+        logger.info("--- ✅ Proceso principal de SBS finalizado exitosamente. ---")
+        return True
+    download_options = dict(
+        df=None, coverage=manifest.coverage, ledger=ledger, raw_cache=raw_cache, offline=args.offline, processors=args.processors,
+        windows=args.windows, refresh=args.refresh
     )
+    if args.stream_window:
+        # Modo streaming: los archivos fluyen de la descarga al procesamiento en lotes de tamaño acotado
+        file_stream = iter_dataset(**download_options, window=args.stream_window)
+        batches = iter(lambda: dict(islice(file_stream, args.stream_window)), {})
+    else:
+        with stage('download'):
+            batches = [download_dataset(**download_options)]
 
-    # Si el archivo base no existe, se asume que es la primera ejecución.
-    if sbs_eeff_processed is None or sbs_eeff_processed.empty:
-        logger.warning(f"⚠️ No se encontró el archivo base '{path_file_eeff}' o está vacío. Se intentará descargar todos los datos históricos.")
-        sbs_eeff_processed = pd.DataFrame() # Se crea un DF vacío para que el flujo continúe
-
-    # Si el archivo de TC no existe, se asume que es la primera ejecución.
-    if sbs_tc_processed is None:
-        logger.warning(f"⚠️ No se encontró el archivo base '{path_file_tc}'. Se creará uno nuevo si se encuentran datos de TC.")
-        sbs_tc_processed = pd.DataFrame() # Se crea un DF vacío para que el flujo continúe
-
-    # --- 3. Detección y Descarga de Nuevos Archivos ---
-    files_in_memory = download_dataset(df=sbs_eeff_processed)
-    if not files_in_memory:
+    # --- 3. Procesamiento de Estados Financieros (EEFF), Tipo de Cambio (TC) y, si se pide, Ratios ---
+    # En modo streaming, este tramo incluye también las descargas
+    with stage('process'):
+        sbs_eeff_actualyzed, sbs_tc_actualyzed, sbs_ratios_actualyzed, files_count = process_batches(
+            batches, ledger, layout_cache, args.workers, logger, entity_names, args.processors
+        )
+    if not files_count:
+        save_probe_ledger(ledger, gcs_manager, bucket_name, path_file_ledger)
         logger.info("✅ No se encontraron nuevos archivos para procesar. El dataset está actualizado. Finalizando.")
-        return
+        return True
 
-    # --- 4. Procesamiento de Estados Financieros (EEFF) ---
-    sbs_eeff_processed = process_and_upload_eeff(
-        files_in_memory, sbs_eeff_processed, gcs_manager, bucket_name, path_file_eeff, logger
-    )
+    # --- 4 y 5. Descarga de Datasets Base, Fusión y Carga de EEFF, TC y Ratios ---
+    if not merge_and_commit(
+        sbs_eeff_actualyzed, sbs_tc_actualyzed, sbs_ratios_actualyzed, manifest, ledger, stores, gcs_manager, bucket_name,
+        paths, logger, processors=args.processors, layout_cache=layout_cache, entity_names=entity_names
+    ):
+        logger.error("--- ❌ Proceso principal de SBS finalizado sin confirmar los datos. ---")
+        return False
 
-    # --- 5. Procesamiento de Tipo de Cambio (TC) ---
-    process_and_upload_tc(
-        files_in_memory, sbs_tc_processed, gcs_manager, bucket_name, path_file_tc, logger
-    )
+    if stores is not None and args.export_csv:
+        export_csv_artifacts(stores, gcs_manager, bucket_name, path_file_eeff, path_file_tc, logger, path_ratios)
 
     logger.info("--- ✅ Proceso principal de SBS finalizado exitosamente. ---")
+    return True
 
 if __name__ == "__main__":
-    main()
+    main(parse_args())
     
\ No newline at end of file
@@ -0,0 +1,70 @@
+# src/modules/compact_schema.py
+
+import numpy as np
+import pandas as pd
+
+
+def apply_schema(df: pd.DataFrame, dtypes: dict[str, str] | None) -> pd.DataFrame:
+    """
+    Convierte las columnas de `df` a los tipos del esquema (ej: EEFF_DTYPES).
+
+    Solo se convierten las columnas presentes cuyo tipo no coincide; las columnas que no
+    están en el esquema se dejan tal cual.
+
+    Args:
+        df: DataFrame a convertir.
+        dtypes: Esquema {columna: tipo}. None devuelve `df` sin cambios.
+
+    Returns:
+        El DataFrame con el esquema aplicado.
+    """
+    if df is None or not dtypes:
+        return df
+    casts = {
+        col: dtype for col, dtype in dtypes.items()
+        if col in df.columns and not (dtype == 'category' and isinstance(df[col].dtype, pd.CategoricalDtype))
+        and str(df[col].dtype) != dtype
+    }
+    return df.astype(casts) if casts else df
+
+
+def concat_frames(frames: list[pd.DataFrame], dtypes: dict[str, str] | None = None) -> pd.DataFrame:
+    """
+    Concatena DataFrames conservando las columnas categóricas.
+
+    `pd.concat` convierte a texto (object) una columna categórica si sus categorías no son
+    idénticas en todas las partes; aquí se unen antes las categorías, de modo que el resultado
+    sigue siendo compacto. Las partes vacías se ignoran.
+
+    Args:
+        frames: DataFrames a concatenar, en orden.
+        dtypes: Esquema {columna: tipo} que se aplica al resultado (y que indica qué columnas
+            son categóricas aunque alguna parte aún no lo sea).
+
+    Returns:
+        El DataFrame concatenado (con índice nuevo), o un DataFrame vacío si no hay partes.
+    """
+    frames = [frame for frame in frames if frame is not None and not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) > 1:
+        categorical = {
+            col for frame in frames for col in frame.columns
+            if isinstance(frame[col].dtype, pd.CategoricalDtype) or (dtypes or {}).get(col) == 'category'
+        }
+        for col in categorical:
+            parts = [
+                frame[col] if isinstance(frame[col].dtype, pd.CategoricalDtype) else frame[col].astype('category')
+                for frame in frames if col in frame.columns
+            ]
+            categories = pd.Index(np.concatenate([part.cat.categories.to_numpy(dtype=object) for part in parts])).unique()
+            dtype = pd.CategoricalDtype(categories)
+            frames = [frame.astype({col: dtype}) if col in frame.columns else frame for frame in frames]
+    return apply_schema(pd.concat(frames, axis=0, ignore_index=True), dtypes)
+
+
+def memory_mb(df: pd.DataFrame | None) -> float:
+    """
+    Devuelve la memoria ocupada por `df` en MB, incluido el contenido de las columnas de texto.
+    """
+    return df.memory_usage(deep=True).sum() / 1e6 if df is not None else 0.0
@@ -0,0 +1,93 @@
+# src/modules/coverage_manifest.py
+
+import sys
+import json
+import time
+import pandas as pd
+from pathlib import Path
+
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+import src.utils as utils
+
+class CoverageManifest:
+    """
+    Manifiesto ligero con los periodos ya presentes en el dataset de EEFF.
+
+    Asocia cada tipo de documento (el valor de la columna TIPO, ej: 'Banca Multiple') con el
+    conjunto de fechas 'AAAAMM' que ya se procesaron y subieron. Con él, el planificador de
+    descargas sabe qué falta sin descargar el dataset completo; en particular, una ejecución
+    sin novedades termina sin leer ningún dato.
+
+    El manifiesto se actualiza después de cada subida correcta. Si se pierde, se reconstruye
+    a partir del dataset (ver `add_frame`).
+    """
+    def __init__(self, path: str | Path = '.cache/sbs_coverage.json', data: bytes | None = None):
+        """
+        Inicializa el manifiesto desde `data` (ej: contenido descargado de GCS) o, si no se
+        proporciona, desde el archivo local `path`.
+        """
+        self.logger = utils.get_logger('sbs')
+        self.path = Path(path)
+        self.coverage = self._load(data)
+
+    def _load(self, data: bytes | None) -> dict[str, set[str]]:
+        """
+        Carga el manifiesto. Un archivo corrupto o inexistente se trata como vacío.
+        """
+        try:
+            if data is None:
+                if not self.path.exists():
+                    return {}
+                data = self.path.read_bytes()
+            coverage = json.loads(data.decode('utf-8')).get('coverage', {})
+            return {doc_type: set(dates) for doc_type, dates in coverage.items()}
+        except (ValueError, AttributeError) as e:
+            self.logger.warning(f"  ⚠️ Manifiesto de cobertura ilegible, se empieza uno nuevo: {e}")
+            return {}
+
+    def is_empty(self) -> bool:
+        return not self.coverage
+
+    def dates(self, doc_type: str) -> set[str]:
+        """
+        Devuelve las fechas 'AAAAMM' presentes para un tipo de documento.
+        """
+        return self.coverage.get(doc_type, set())
+
+    def add_frame(self, df: pd.DataFrame | None, type_col: str = 'TIPO', date_col: str = 'DATE', suffix: str = ''):
+        """
+        Añade al manifiesto los pares (tipo, fecha) presentes en `df`.
+
+        Args:
+            suffix: Sufijo de la clave de cada tipo, para los datasets distintos del de EEFF
+                (ej: ' Ratios', ver `ReportSpec.coverage_suffix`).
+        """
+        if df is None or df.empty:
+            return
+        pairs = df[[type_col, date_col]].drop_duplicates()
+        for doc_type, date in zip(pairs[type_col].astype(str), pairs[date_col].astype(str)):
+            self.coverage.setdefault(doc_type + suffix, set()).add(date)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializa el manifiesto a JSON (para guardarlo en disco o en GCS).
+        """
+        coverage = {doc_type: sorted(dates) for doc_type, dates in self.coverage.items()}
+        return json.dumps(
+            {'coverage': coverage, 'updated_at': time.time()}, ensure_ascii=False, sort_keys=True
+        ).encode('utf-8')
+
+    def save(self):
+        """
+        Guarda el manifiesto en `path` de forma atómica.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        tmp_path.write_bytes(self.to_bytes())
+        tmp_path.replace(self.path)
+        periods = sum(len(dates) for dates in self.coverage.values())
+        self.logger.info(
+            f"  💾 Manifiesto de cobertura guardado en '{self.path}' ({len(self.coverage)} tipos, {periods} periodos).")
@@ -0,0 +1,132 @@
+# src/modules/entity_names.py
+
+import sys
+import json
+import pandas as pd
+from pathlib import Path
+
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+import src.utils as utils
+
+# Notas al pie y marcas que acompañan a los nombres de entidad en los reportes
+FOOTNOTE_PATTERN = r"[\d*/()]"
+SUPERSCRIPT_PATTERN = "[\u00B2\u00B3\u00B9\u2070-\u2079\u207A-\u207F\u1D2C-\u1D7F]"
+
+
+class EntityNameCache:
+    """
+    Diccionario persistente {nombre original: nombre canónico} de las entidades de los reportes.
+
+    Los reportes repiten los mismos pocos cientos de nombres de bancos, cajas y financieras
+    en cada archivo, con notas al pie ('B. BBVA Perú 1/', 'Mibanco ³'). La limpieza con
+    expresiones regulares se hace una sola vez por nombre nuevo; después, normalizar una
+    columna completa es una búsqueda en el diccionario por valor único. Las filas de totales
+    y sucursales se excluyen; esos nombres se guardan con valor nulo.
+    """
+    def __init__(self, path: str | Path = '.cache/sbs_entity_names.json', data: bytes | None = None):
+        """
+        Inicializa el diccionario desde `data` (ej: contenido descargado de GCS) o, si no se
+        proporciona, desde el archivo local `path`.
+        """
+        self.logger = utils.get_logger('sbs')
+        self.path = Path(path)
+        self.names: dict[str, str | None] = self._load(data)
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def _load(self, data: bytes | None) -> dict[str, str | None]:
+        """
+        Carga el diccionario. Un archivo corrupto o inexistente se trata como vacío.
+        """
+        try:
+            if data is None:
+                if not self.path.exists():
+                    return {}
+                data = self.path.read_bytes()
+            return dict(json.loads(data.decode('utf-8')).get('names', {}))
+        except (ValueError, AttributeError, TypeError) as e:
+            self.logger.warning(f"  ⚠️ Diccionario de entidades ilegible, se empieza uno nuevo: {e}")
+            return {}
+
+    @staticmethod
+    def _canonical(raw_names: pd.Series) -> pd.Series:
+        """
+        Limpia un conjunto de nombres: excluye totales y sucursales (None) y elimina las notas
+        al pie, los superíndices y los espacios sobrantes.
+        """
+        lowered = raw_names.str.lower()
+        excluded = lowered.str.startswith('total') | lowered.str.contains('sucursal')
+        canonical = (
+            raw_names
+            .str.replace(FOOTNOTE_PATTERN, "", regex=True)
+            .str.replace(SUPERSCRIPT_PATTERN, "", regex=True)
+            .str.strip()
+            .str.replace(r'\s+', ' ', regex=True)
+        )
+        return canonical.mask(excluded, None)
+
+    def normalize(self, entities: pd.Series) -> pd.Series:
+        """
+        Devuelve los nombres canónicos de `entities`, con None en las filas a excluir.
+
+        Solo los nombres que no están en el diccionario pasan por la limpieza; el resto se
+        resuelve con una búsqueda por valor único.
+        """
+        entities = entities.astype(str)
+        uniques = pd.unique(entities.to_numpy())
+        new_names = [name for name in uniques if name not in self.names]
+        self.stats['misses'] += len(new_names)
+        self.stats['hits'] += len(uniques) - len(new_names)
+        if new_names:
+            raw_names = pd.Series(new_names, dtype=object)
+            self.names.update(zip(new_names, self._canonical(raw_names).tolist()))
+        return entities.map(self.names)
+
+    def normalize_frame(self, df: pd.DataFrame, col: str = 'ENTIDAD') -> pd.DataFrame:
+        """
+        Normaliza la columna de entidades de `df` y descarta las filas de totales y sucursales.
+        """
+        if df.empty:
+            return df
+        entities = self.normalize(df[col])
+        keep = entities.notna().to_numpy()
+        return df.assign(**{col: entities})[keep].reset_index(drop=True)
+
+    def log_stats(self):
+        """
+        Escribe en el log cuántos nombres distintos se resolvieron desde el diccionario.
+        """
+        total = self.stats['hits'] + self.stats['misses']
+        if total:
+            self.logger.info(
+                f"  🏷️ Nombres de entidad: {self.stats['hits']}/{total} resueltos desde el diccionario, "
+                f"{self.stats['misses']} nuevos ({len(self.names)} en total).")
+
+    def merge(self, other: "EntityNameCache") -> int:
+        """
+        Incorpora los nombres de otro diccionario (ej: el de una partición de una carga por partes).
+        El nombre canónico solo depende del original, así que basta con añadir los que faltan.
+
+        Returns:
+            El número de nombres añadidos.
+        """
+        new_names = {name: canonical for name, canonical in other.names.items() if name not in self.names}
+        self.names.update(new_names)
+        return len(new_names)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializa el diccionario a JSON (para guardarlo en disco o en GCS).
+        """
+        return json.dumps({'names': self.names}, ensure_ascii=False, sort_keys=True).encode('utf-8')
+
+    def save(self):
+        """
+        Guarda el diccionario en `path` de forma atómica.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        tmp_path.write_bytes(self.to_bytes())
+        tmp_path.replace(self.path)
@@ -0,0 +1,289 @@
+# src/modules/excel_workbook.py
+
+import io
+import os
+import sys
+import datetime
+import importlib.util
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+# Variable de entorno con el lector por defecto. Se usa una variable de entorno (y no solo
+# una variable del módulo) para que la elección llegue también a los procesos de `--workers`.
+BACKEND_ENV = 'SBS_EXCEL_BACKEND'
+DEFAULT_BACKEND = 'pandas'
+
+# Firma de los contenedores OLE2 (.xls de Excel 97-2003)
+OLE2_SIGNATURE = b'\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1'
+
+# Textos que pandas interpreta como nulos al leer una hoja (valores por defecto de `na_values`)
+NA_STRINGS = frozenset({
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+})
+
+
+class PandasBackend:
+    """
+    Lector de referencia: `pd.ExcelFile` con el motor que pandas elija según el formato
+    (xlrd para .xls, openpyxl para .xlsx) o con el motor indicado.
+    """
+    def __init__(self, name: str = 'pandas', engine: str | None = None, requires: str | None = None):
+        """
+        Args:
+            requires: Módulo opcional que necesita el motor (ej: 'python_calamine'), si no viene con pandas.
+        """
+        self.name = name
+        self.engine = engine
+        self.requires = requires
+
+    def open(self, source: bytes):
+        return pd.ExcelFile(io.BytesIO(source), engine=self.engine)
+
+    def sheet_names(self, book) -> list[str]:
+        return list(book.sheet_names)
+
+    def parse(self, book, index: int) -> pd.DataFrame:
+        return book.parse(sheet_name=index)
+
+    def close(self, book):
+        book.close()
+
+
+class XlrdCellBackend:
+    """
+    Lector directo de celdas con xlrd para los .xls antiguos del portal.
+
+    En lugar de pasar cada celda por el conversor de pandas y por su inferencia de tipos
+    (que solo sirven para devolver columnas tipadas que el procesamiento vuelve a convertir),
+    arma la hoja a partir de los valores y tipos de celda de xlrd con operaciones de numpy.
+    Reproduce lo que el procesamiento usa de `book.parse`: la primera fila queda como
+    encabezado, las celdas vacías, blancas, con error o con textos nulos ('N/A', 'NULL', ...)
+    quedan como NaN y las fechas como datetime. Las columnas quedan como texto (object).
+    Los archivos que no son .xls (ej: .xlsx) no se aceptan y se leen con pandas.
+    """
+    name = 'xlrd'
+    requires = 'xlrd'
+
+    def open(self, source: bytes):
+        if not source.startswith(OLE2_SIGNATURE):
+            raise ValueError("El lector 'xlrd' solo admite archivos .xls")
+        import xlrd
+        return xlrd.open_workbook(file_contents=source, on_demand=True)
+
+    def sheet_names(self, book) -> list[str]:
+        return book.sheet_names()
+
+    def parse(self, book, index: int) -> pd.DataFrame:
+        import xlrd
+        sheet = book.sheet_by_index(index)
+        if sheet.nrows == 0:
+            return pd.DataFrame()
+        values = np.empty((sheet.nrows, sheet.ncols), dtype=object)
+        types = np.empty((sheet.nrows, sheet.ncols), dtype=np.int8)
+        for row in range(sheet.nrows):
+            values[row] = sheet.row_values(row)
+            types[row] = sheet.row_types(row)
+
+        text = types == xlrd.XL_CELL_TEXT
+        null = np.isin(types, (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR))
+        null[text] = [value in NA_STRINGS for value in values[text]]
+        values[null] = np.nan
+        # Los números enteros se devuelven como int, igual que en pandas
+        numbers = np.nonzero(types == xlrd.XL_CELL_NUMBER)
+        floats = values[numbers].astype(float)
+        integral = (floats == np.trunc(floats)) & (np.abs(floats) < 2 ** 63)
+        values[tuple(index[integral] for index in numbers)] = floats[integral].astype(np.int64)
+        booleans = types == xlrd.XL_CELL_BOOLEAN
+        values[booleans] = values[booleans].astype(bool)
+        for row, col in zip(*np.nonzero(types == xlrd.XL_CELL_DATE)):
+            values[row, col] = self._date(values[row, col], book.datemode)
+
+        header = [
+            value if not pd.isna(value) else f"Unnamed: {col}"
+            for col, value in enumerate(values[0])
+        ]
+        return pd.DataFrame(values[1:], columns=self._dedupe(header))
+
+    @staticmethod
+    def _date(value: float, datemode: int):
+        """
+        Convierte una fecha de Excel como lo hace pandas (las horas sin fecha quedan como `time`).
+        """
+        import xlrd
+        try:
+            if value < 1:
+                moment = xlrd.xldate_as_datetime(value, datemode)
+                return datetime.time(moment.hour, moment.minute, moment.second, moment.microsecond)
+            return pd.Timestamp(xlrd.xldate_as_datetime(value, datemode))
+        except (xlrd.xldate.XLDateError, OverflowError):
+            return value
+
+    @staticmethod
+    def _dedupe(header: list) -> list:
+        """
+        Renombra los encabezados repetidos como pandas ('A', 'A.1', 'A.2', ...).
+        """
+        seen: dict = {}
+        result = []
+        for name in header:
+            count = seen.get(name, 0)
+            seen[name] = count + 1
+            result.append(name if count == 0 else f"{name}.{count}")
+        return result
+
+    def close(self, book):
+        book.release_resources()
+
+
+BACKENDS = {
+    'pandas': PandasBackend(),
+    'calamine': PandasBackend('calamine', engine='calamine', requires='python_calamine'),
+    'xlrd': XlrdCellBackend(),
+}
+
+
+def check_backend(name: str):
+    """
+    Comprueba que el lector existe y que su dependencia opcional está instalada.
+
+    Raises:
+        ValueError: Si el lector no existe.
+        ImportError: Si falta el módulo que necesita (ej: python-calamine para 'calamine').
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Lector de Excel desconocido: '{name}'. Opciones: {sorted(BACKENDS)}")
+    requires = BACKENDS[name].requires
+    if requires is not None and importlib.util.find_spec(requires) is None:
+        raise ImportError(
+            f"El lector de Excel '{name}' requiere el módulo '{requires}' "
+            f"(pip install {requires.replace('_', '-')}).")
+
+
+def set_default_backend(name: str):
+    """
+    Fija el lector por defecto del proceso y de los procesos que este lance.
+
+    Un lector elegido explícitamente cuya dependencia no está instalada es un error (ver
+    `check_backend`); el repliegue a pandas queda para los archivos que el lector no puede abrir.
+
+    Args:
+        name: Nombre del lector ('pandas', 'calamine' o 'xlrd').
+    """
+    check_backend(name)
+    os.environ[BACKEND_ENV] = name
+
+
+def default_backend() -> str:
+    """
+    Devuelve el nombre del lector por defecto (variable de entorno `SBS_EXCEL_BACKEND` o 'pandas').
+    """
+    name = os.environ.get(BACKEND_ENV, DEFAULT_BACKEND)
+    return name if name in BACKENDS else DEFAULT_BACKEND
+
+
+class ExcelWorkbook:
+    """
+    Libro Excel en memoria que se decodifica una sola vez y se comparte entre etapas.
+
+    El contenedor (.xls/.xlsx) se abre de forma perezosa la primera vez que se necesita;
+    a partir de ahí, cada hoja se convierte a DataFrame como máximo una vez y se reutiliza
+    para cualquier consumidor que la pida (ej: la etapa de EEFF y la de TC).
+
+    La lectura se delega en un lector intercambiable (ver `BACKENDS`). Si el lector elegido
+    no puede abrir el archivo (ej: 'calamine' sin python-calamine instalado, o 'xlrd' con un
+    .xlsx), se usa el lector de pandas.
+    """
+    def __init__(self, source: bytes | io.BytesIO, backend: str | None = None):
+        """
+        Args:
+            source: Contenido del archivo Excel como bytes u objeto BytesIO.
+            backend: Lector a usar ('pandas', 'calamine' o 'xlrd'). None usa `default_backend()`.
+        """
+        self._source = source.getvalue() if isinstance(source, io.BytesIO) else source
+        self._backend = BACKENDS[backend or default_backend()]
+        self._book = None
+        self._error: Exception | None = None
+        self._sheets: dict[int, pd.DataFrame] = {}
+
+    def _open(self):
+        """
+        Decodifica el contenedor una única vez. Si falla, guarda el error y devuelve None.
+        """
+        if self._book is None and self._error is None:
+            for backend in dict.fromkeys([self._backend, BACKENDS[DEFAULT_BACKEND]]):
+                try:
+                    self._book = backend.open(self._source)
+                    self._backend, self._error = backend, None
+                    break
+                except Exception as e:
+                    self._error = e
+        return self._book
+
+    @property
+    def backend(self) -> str:
+        """
+        Nombre del lector en uso (tras abrir el libro, el que realmente lo abrió).
+        """
+        return self._backend.name
+
+    @property
+    def source(self) -> bytes:
+        """
+        Contenido original del archivo.
+        """
+        return self._source
+
+    @property
+    def error(self) -> Exception | None:
+        """
+        Error producido al abrir el contenedor, si lo hubo.
+        """
+        self._open()
+        return self._error
+
+    @property
+    def sheet_names(self) -> list[str]:
+        """
+        Nombres de las hojas del libro. Devuelve una lista vacía si el archivo no es legible.
+        """
+        book = self._open()
+        return self._backend.sheet_names(book) if book is not None else []
+
+    def sheet(self, index: int) -> pd.DataFrame:
+        """
+        Devuelve la hoja `index` (0-based) como DataFrame, convirtiéndola solo la primera vez.
+        """
+        if index not in self._sheets:
+            book = self._open()
+            if book is None:
+                raise FileNotFoundError(f"No se pudo abrir el libro: {self._error}")
+            self._sheets[index] = self._backend.parse(book, index)
+        return self._sheets[index]
+
+    def first_available_sheet(self, sheet_open_first: int = 2) -> pd.DataFrame:
+        """
+        Devuelve la hoja `sheet_open_first` (1-based) o, si no existe o no se puede leer,
+        la anterior más cercana, retrocediendo hasta la primera hoja.
+        """
+        sheet_count = len(self.sheet_names)
+        for index in range(min(sheet_open_first, sheet_count) - 1, -1, -1):
+            try:
+                return self.sheet(index)
+            except Exception:
+                continue
+        raise FileNotFoundError("No se encontraron hojas válidas")
+
+    def close(self):
+        """
+        Libera el contenedor decodificado y las hojas convertidas.
+        """
+        if self._book is not None:
+            self._backend.close(self._book)
+        self._book = None
+        self._sheets.clear()
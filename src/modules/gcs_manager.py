@@ -1,21 +1,30 @@
 # src/modules/gcs_manager.py
-import os
 import io
+import os
 import sys
+import gzip
+import uuid
 from pathlib import Path
+from typing import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 if __name__ == "__main__":
     project_root = Path(__file__).parent.parent.parent
     sys.path.insert(0, str(project_root))
 from google.cloud import storage
-from google.cloud.exceptions import NotFound
+from google.cloud.exceptions import NotFound, PreconditionFailed
 from dotenv import load_dotenv
 from src.utils import get_logger
+from src.modules.run_metrics import get_metrics
+from src.modules.object_storage import ObjectStorage, CSV_FLOAT_PRECISION, csv_compression
 
-class GCSManager:
+class GCSManager(ObjectStorage):
     """
     Gestiona la conexión y las operaciones con Google Cloud Storage (GCS).
     
+    Es la implementación de `ObjectStorage` sobre GCS; `build_storage` la envuelve en una
+    caché local de lectura (`CachedStorage`).
+    
     Esta clase utiliza las credenciales de la cuenta de servicio de Google Cloud
     especificadas en la variable de entorno `GOOGLE_APPLICATION_CREDENTIALS`.
     
@@ -24,11 +33,17 @@ class GCSManager:
     - GitHub Actions: Usa la variable de entorno GOOGLE_APPLICATION_CREDENTIALS
       configurada por el workflow
     """
+    READ_CHUNK_SIZE = 8 * 1024 * 1024  # Tamaño de cada bloque al leer objetos en streaming
+    WRITE_CHUNK_SIZE = 8 * 1024 * 1024  # Tamaño de cada bloque de la subida reanudable (múltiplo de 256 KiB)
+    CSV_CHUNK_ROWS = 100_000  # Filas que se serializan a CSV de una vez al subir en streaming
+
     def __init__(self):
         """
         Inicializa el cliente de Google Cloud Storage.
         """
+        super().__init__()
         self.logger = get_logger('sbs')
+        self.metrics = get_metrics('sbs')
         try:
             # Solo cargar .env si existe (ejecución local)
             # En GitHub Actions, la variable ya está configurada por el workflow
@@ -50,13 +65,20 @@ class GCSManager:
             self.logger.error(f"❌ Error al conectar con Google Cloud Storage: {e}")
             self.client = None
 
-    def download_csv_as_df(self, bucket_name: str, source_blob_name: str) -> pd.DataFrame | None:
+    def download_csv_as_df(self, bucket_name: str, source_blob_name: str,
+                           dtype: dict[str, str] | None = None) -> pd.DataFrame | None:
         """
         Descarga un archivo CSV de GCS y lo carga en un DataFrame de pandas.
         
+        El CSV se lee en streaming desde el objeto (por bloques), sin copiar antes su
+        contenido completo en memoria.
+        
         Args:
             bucket_name: Nombre del bucket de GCS.
-            source_blob_name: Ruta del archivo dentro del bucket (ej: 'data/input.csv').
+            source_blob_name: Ruta del archivo dentro del bucket (ej: 'data/input.csv'). Los
+                archivos terminados en '.gz' se descomprimen al leer.
+            dtype: Esquema explícito {columna: tipo} (ej: EEFF_DTYPES). Evita que pandas
+                infiera el tipo de cada columna y deja las de texto repetitivo como categóricas.
         
         Returns:
             Un DataFrame de pandas con los datos, o None si el archivo no se encuentra
@@ -72,11 +94,13 @@ class GCSManager:
             
             self.logger.info(f"⬇️ Descargando archivo '{source_blob_name}' del bucket '{bucket_name}'...")
             
-            # Descargar el contenido del archivo como bytes
-            file_bytes = blob.download_as_bytes()
-            
-            # Usar io.BytesIO para leer los bytes como un archivo en memoria
-            df = pd.read_csv(io.BytesIO(file_bytes))
+            # Leer el CSV directamente del lector por bloques del objeto
+            with self.metrics.span('gcs.download_csv'), blob.open('rb', chunk_size=self.READ_CHUNK_SIZE) as reader:
+                df = pd.read_csv(
+                    reader, dtype=dtype, encoding='utf-8-sig', compression=csv_compression(source_blob_name),
+                    float_precision=CSV_FLOAT_PRECISION
+                )
+                self.metrics.add_bytes('gcs.downloaded', reader.tell())
             
             self.logger.info("✅ Archivo descargado y cargado en DataFrame exitosamente.")
             return df
@@ -84,37 +108,439 @@ class GCSManager:
             self.logger.error(f"❌ Error: El archivo '{source_blob_name}' no se encontró en el bucket '{bucket_name}'.")
             return None
         except Exception as e:
+            self.metrics.incr('gcs.download_errors')
             self.logger.error(f"❌ Ocurrió un error inesperado al descargar: {e}", exc_info=True)
             return None
 
-    def upload_df_as_csv(self, df: pd.DataFrame, bucket_name: str, destination_blob_name: str):
+    def iter_csv_chunks(self, bucket_name: str, source_blob_name: str, chunksize: int = 100_000,
+                        dtype: dict[str, str] | None = None, usecols: list[str] | None = None) -> Iterator[pd.DataFrame]:
+        """
+        Lee un archivo CSV de GCS por partes, para consumidores que solo necesitan agregados
+        (ej: los pares TIPO y DATE existentes) y no el dataset completo en memoria.
+        
+        Args:
+            bucket_name: Nombre del bucket de GCS.
+            source_blob_name: Ruta del archivo dentro del bucket.
+            chunksize: Número de filas de cada DataFrame devuelto.
+            dtype: Esquema explícito {columna: tipo}.
+            usecols: Columnas a leer. None lee todas.
+        
+        Yields:
+            DataFrames de hasta `chunksize` filas. Si el archivo no existe o hay un error,
+            no devuelve ninguno.
+        """
+        if not self.client:
+            self.logger.error("❌ Cliente de GCS no inicializado.")
+            return
+
+        if dtype is not None and usecols is not None:
+            dtype = {col: kind for col, kind in dtype.items() if col in usecols}
+        try:
+            blob = self.client.bucket(bucket_name).blob(source_blob_name)
+            self.logger.info(f"⬇️ Leyendo '{source_blob_name}' del bucket '{bucket_name}' por partes de {chunksize} filas...")
+            with blob.open('rb', chunk_size=self.READ_CHUNK_SIZE) as reader:
+                yield from pd.read_csv(
+                    reader, dtype=dtype, usecols=usecols, chunksize=chunksize, encoding='utf-8-sig',
+                    compression=csv_compression(source_blob_name), float_precision=CSV_FLOAT_PRECISION
+                )
+                self.metrics.add_bytes('gcs.downloaded', reader.tell())
+        except NotFound:
+            self.logger.error(f"❌ Error: El archivo '{source_blob_name}' no se encontró en el bucket '{bucket_name}'.")
+        except Exception as e:
+            self.metrics.incr('gcs.download_errors')
+            self.logger.error(f"❌ Ocurrió un error inesperado al leer por partes: {e}", exc_info=True)
+
+    def _write_csv(self, blob: storage.Blob, df: pd.DataFrame, compression: str | None = None) -> int:
+        """
+        Serializa `df` a CSV directamente en una subida reanudable del objeto, por bloques.
+        
+        El CSV nunca está completo en memoria: pandas lo escribe por partes de `CSV_CHUNK_ROWS`
+        filas y el escritor del objeto envía cada bloque de `WRITE_CHUNK_SIZE` bytes en cuanto
+        se completa. Si ocurre un error, la subida se cancela y el objeto no se crea.
+        
+        Returns:
+            El número de bytes subidos.
+        """
+        content_type = 'application/gzip' if compression == 'gzip' else 'text/csv'
+        with blob.open('wb', chunk_size=self.WRITE_CHUNK_SIZE, ignore_flush=True, content_type=content_type) as writer:
+            target = gzip.GzipFile(fileobj=writer, mode='wb', mtime=0) if compression == 'gzip' else writer
+            # utf-8-sig agrega el BOM para compatibilidad con Excel
+            text = io.TextIOWrapper(target, encoding='utf-8-sig', newline='')
+            df.to_csv(text, index=False, chunksize=self.CSV_CHUNK_ROWS)
+            text.flush()
+            text.detach()
+            if target is not writer:
+                target.close()
+            return writer.tell()
+
+    def _upload_file(self, blob: storage.Blob, path: str | Path, content_type: str) -> int:
+        """
+        Sube un archivo local al objeto (la respuesta deja en `blob.generation` la nueva generación).
+
+        Returns:
+            El número de bytes subidos.
+        """
+        blob.upload_from_filename(str(path), content_type=content_type)
+        return Path(path).stat().st_size
+
+    def upload_df_as_csv(self, df: pd.DataFrame, bucket_name: str, destination_blob_name: str,
+                         compression: str | None = None) -> bool:
         """
         Sube un DataFrame de pandas a GCS como un archivo CSV.
         
-        El DataFrame se convierte a formato CSV en memoria y luego se sube al bucket
-        especificado. El índice del DataFrame no se incluye en el archivo CSV.
+        El DataFrame se serializa en streaming sobre una subida reanudable (ver `_write_csv`),
+        sin construir antes el CSV completo en memoria. El índice del DataFrame no se incluye
+        en el archivo CSV.
         
         Args:
             df: El DataFrame de pandas a subir.
             bucket_name: El nombre del bucket de GCS de destino.
             destination_blob_name: La ruta completa donde se guardará el archivo en el bucket.
+            compression: 'gzip' para comprimir el CSV (conviene que la ruta termine en '.csv.gz').
+        
+        Returns:
+            True si el archivo se subió correctamente, False en caso contrario.
         """
         if not self.client:
             self.logger.error("❌ Cliente de GCS no inicializado.")
-            return
+            return False
 
         try:
-            bucket = self.client.bucket(bucket_name)
-            blob = bucket.blob(destination_blob_name)
-
+            blob = self.client.bucket(bucket_name).blob(destination_blob_name)
             self.logger.info(f"⬆️ Subiendo DataFrame a '{destination_blob_name}' en el bucket '{bucket_name}'...")
-
-            # Convertir DataFrame a CSV en formato string, sin incluir el índice
-            csv_data = df.to_csv(index=False, encoding='utf-8-sig') # utf-8-sig agrega el BOM para compatibilidad con Excel
-            
-            # Subir el string como un archivo
-            blob.upload_from_string(csv_data, content_type='text/csv')
-            
+            with self.metrics.span('gcs.upload'):
+                size = self._write_csv(blob, df, compression)
+            self.metrics.add_bytes('gcs.uploaded', size)
             self.logger.info(f"✅ DataFrame subido exitosamente a: gs://{bucket_name}/{destination_blob_name}")
+            return True
         except Exception as e:
+            self.metrics.incr('gcs.upload_errors')
             self.logger.error(f"❌ Ocurrió un error al subir el DataFrame: {e}", exc_info=True)
+            return False
+
+    def upload_dfs_as_csv(self, frames: dict[str, pd.DataFrame], bucket_name: str,
+                          compression: str | None = None, max_workers: int = 4) -> bool:
+        """
+        Sube varios DataFrames como CSV en paralelo y los confirma todos o ninguno.
+        
+        Cada CSV se sube en streaming (ver `_write_csv`) a un nombre temporal
+        ('{ruta}.tmp-{id}'), todos a la vez. Solo si todas las subidas terminan bien se
+        copian dentro de GCS a sus rutas definitivas (una copia en el servidor, sin volver
+        a transferir los datos); si alguna falla, no se toca ningún objeto definitivo. Los
+        temporales se eliminan en ambos casos. La confirmación no es atómica entre objetos, pero
+        solo consiste en copias dentro de GCS, mucho más breves que las subidas.
+        
+        Args:
+            frames: Diccionario {ruta de destino: DataFrame}.
+            bucket_name: El nombre del bucket de GCS de destino.
+            compression: 'gzip' para comprimir los CSV.
+            max_workers: Número máximo de subidas simultáneas.
+        
+        Returns:
+            True si todos los archivos quedaron en sus rutas definitivas, False en caso contrario.
+        """
+        writers = {
+            destination: lambda blob, df=df: self._write_csv(blob, df, compression)
+            for destination, df in frames.items()
+        }
+        return self._upload_batch(writers, bucket_name, 'archivos CSV', max_workers)
+
+    def upload_file(self, path: str | Path, bucket_name: str, destination_blob_name: str,
+                    content_type: str = 'application/octet-stream') -> bool:
+        """
+        Sube un archivo local a GCS.
+
+        Args:
+            path: Archivo local a subir.
+            bucket_name: El nombre del bucket de GCS de destino.
+            destination_blob_name: La ruta completa donde se guardará el objeto en el bucket.
+            content_type: Tipo MIME del objeto.
+
+        Returns:
+            True si el objeto se subió correctamente, False en caso contrario.
+        """
+        if not self.client:
+            self.logger.error("❌ Cliente de GCS no inicializado.")
+            return False
+
+        try:
+            blob = self.client.bucket(bucket_name).blob(destination_blob_name)
+            self.logger.info(f"⬆️ Subiendo archivo a '{destination_blob_name}' en el bucket '{bucket_name}'...")
+            with self.metrics.span('gcs.upload'):
+                size = self._upload_file(blob, path, content_type)
+            self._record_write(bucket_name, destination_blob_name, blob.generation)
+            self.metrics.add_bytes('gcs.uploaded', size)
+            self.logger.info(f"✅ Archivo subido exitosamente a: gs://{bucket_name}/{destination_blob_name}")
+            return True
+        except Exception as e:
+            self.metrics.incr('gcs.upload_errors')
+            self.logger.error(f"❌ Ocurrió un error al subir el archivo: {e}", exc_info=True)
+            return False
+
+    def upload_files(self, files: dict[str, str | Path], bucket_name: str,
+                     content_type: str = 'application/octet-stream', max_workers: int = 4) -> bool:
+        """
+        Sube varios archivos locales en paralelo y los confirma todos o ninguno, igual que
+        `upload_dfs_as_csv`.
+
+        Args:
+            files: Diccionario {ruta de destino: archivo local}.
+            bucket_name: El nombre del bucket de GCS de destino.
+            content_type: Tipo MIME de los objetos.
+            max_workers: Número máximo de subidas simultáneas.
+
+        Returns:
+            True si todos los archivos quedaron en sus rutas definitivas, False en caso contrario.
+        """
+        writers = {
+            destination: lambda blob, path=path: self._upload_file(blob, path, content_type)
+            for destination, path in files.items()
+        }
+        return self._upload_batch(writers, bucket_name, 'archivos', max_workers)
+
+    def _upload_batch(self, writers: dict[str, Callable[[storage.Blob], int]], bucket_name: str,
+                      label: str, max_workers: int) -> bool:
+        """
+        Sube cada objeto con su función de escritura a un nombre temporal y, solo si todas las
+        subidas terminan bien, los copia a sus rutas definitivas (ver `upload_dfs_as_csv`).
+        La generación que devuelve cada copia queda anotada (ver `written_generation`).
+        """
+        if not self.client:
+            self.logger.error("❌ Cliente de GCS no inicializado.")
+            return False
+        if not writers:
+            return True
+
+        bucket = self.client.bucket(bucket_name)
+        run_id = uuid.uuid4().hex[:12]
+        staged = {destination: f"{destination}.tmp-{run_id}" for destination in writers}
+        self.logger.info(f"⬆️ Subiendo {len(writers)} {label} en paralelo al bucket '{bucket_name}': {', '.join(writers)}...")
+
+        def upload(destination: str) -> bool:
+            try:
+                with self.metrics.span('gcs.upload'):
+                    size = writers[destination](bucket.blob(staged[destination]))
+                self.metrics.add_bytes('gcs.uploaded', size)
+                return True
+            except Exception as e:
+                self.metrics.incr('gcs.upload_errors')
+                self.logger.error(f"❌ Ocurrió un error al subir '{destination}': {e}", exc_info=True)
+                return False
+
+        def commit(destination: str):
+            source = bucket.blob(staged[destination])
+            target = bucket.blob(destination)
+            # Las copias grandes pueden requerir varias llamadas a rewrite
+            token, _, _ = target.rewrite(source)
+            while token is not None:
+                token, _, _ = target.rewrite(source, token=token)
+            # Al terminar, rewrite deja en el objeto los metadatos de la copia (incluida su generación)
+            self._record_write(bucket_name, destination, target.generation)
+
+        committed = False
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(writers)))) as executor:
+                if all(list(executor.map(upload, writers))):
+                    with self.metrics.span('gcs.commit'):
+                        list(executor.map(commit, writers))
+                    committed = True
+        except Exception as e:
+            self.metrics.incr('gcs.upload_errors')
+            self.logger.error(f"❌ Ocurrió un error al confirmar los archivos subidos: {e}", exc_info=True)
+        finally:
+            try:
+                bucket.delete_blobs([bucket.blob(name) for name in staged.values()], on_error=lambda blob: None)
+            except Exception as e:
+                self.logger.warning(f"⚠️ No se pudieron eliminar los archivos temporales: {e}")
+
+        if committed:
+            self.logger.info(f"✅ {len(writers)} {label} subidos y confirmados en gs://{bucket_name}/.")
+        else:
+            self.logger.error("❌ La subida en lote no se confirmó: los archivos definitivos no se modificaron.")
+        return committed
+
+    def download_bytes(self, bucket_name: str, source_blob_name: str) -> bytes | None:
+        """
+        Descarga el contenido de un objeto de GCS como bytes.
+        
+        Args:
+            bucket_name: Nombre del bucket de GCS.
+            source_blob_name: Ruta del archivo dentro del bucket.
+        
+        Returns:
+            El contenido del objeto, o None si no existe o si ocurre un error.
+        """
+        if not self.client:
+            self.logger.error("❌ Cliente de GCS no inicializado.")
+            return None
+
+        try:
+            blob = self.client.bucket(bucket_name).blob(source_blob_name)
+            self.logger.info(f"⬇️ Descargando objeto '{source_blob_name}' del bucket '{bucket_name}'...")
+            with self.metrics.span('gcs.download'):
+                data = blob.download_as_bytes()
+            self.metrics.add_bytes('gcs.downloaded', len(data))
+            return data
+        except NotFound:
+            self.logger.warning(f"⚠️ El objeto '{source_blob_name}' no existe en el bucket '{bucket_name}'.")
+            return None
+        except Exception as e:
+            self.metrics.incr('gcs.download_errors')
+            self.logger.error(f"❌ Ocurrió un error inesperado al descargar: {e}", exc_info=True)
+            return None
+
+    def upload_bytes(self, data: bytes, bucket_name: str, destination_blob_name: str,
+                     content_type: str = 'application/octet-stream') -> bool:
+        """
+        Sube un contenido en bytes a GCS.
+        
+        Args:
+            data: Contenido a subir.
+            bucket_name: El nombre del bucket de GCS de destino.
+            destination_blob_name: La ruta completa donde se guardará el objeto en el bucket.
+            content_type: Tipo MIME del objeto.
+        
+        Returns:
+            True si el objeto se subió correctamente, False en caso contrario.
+        """
+        if not self.client:
+            self.logger.error("❌ Cliente de GCS no inicializado.")
+            return False
+
+        try:
+            blob = self.client.bucket(bucket_name).blob(destination_blob_name)
+            self.logger.info(f"⬆️ Subiendo objeto a '{destination_blob_name}' en el bucket '{bucket_name}'...")
+            with self.metrics.span('gcs.upload'):
+                blob.upload_from_string(data, content_type=content_type)
+            self._record_write(bucket_name, destination_blob_name, blob.generation)
+            self.metrics.add_bytes('gcs.uploaded', len(data))
+            self.logger.info(f"✅ Objeto subido exitosamente a: gs://{bucket_name}/{destination_blob_name}")
+            return True
+        except Exception as e:
+            self.metrics.incr('gcs.upload_errors')
+            self.logger.error(f"❌ Ocurrió un error al subir el objeto: {e}", exc_info=True)
+            return False
+
+    def list_blobs(self, bucket_name: str, prefix: str) -> list[str]:
+        """
+        Lista los nombres de los objetos de un bucket que empiezan por `prefix`.
+        
+        Args:
+            bucket_name: Nombre del bucket de GCS.
+            prefix: Prefijo de los objetos a listar (ej: 'SBS_EEFF/').
+        
+        Returns:
+            Una lista con los nombres de los objetos (vacía si no hay o si ocurre un error).
+        """
+        if not self.client:
+            self.logger.error("❌ Cliente de GCS no inicializado.")
+            return []
+
+        try:
+            with self.metrics.span('gcs.list'):
+                return [blob.name for blob in self.client.list_blobs(bucket_name, prefix=prefix)]
+        except Exception as e:
+            self.logger.error(f"❌ Ocurrió un error al listar '{prefix}' en el bucket '{bucket_name}': {e}", exc_info=True)
+            return []
+
+    def list_generations(self, bucket_name: str, prefix: str) -> dict[str, int]:
+        """
+        Lista los objetos de un bucket que empiezan por `prefix` con su generación, en una sola consulta.
+        
+        Args:
+            bucket_name: Nombre del bucket de GCS.
+            prefix: Prefijo de los objetos a listar (ej: 'SBS_EEFF/').
+        
+        Returns:
+            Un diccionario {nombre: generación} (vacío si no hay objetos o si ocurre un error).
+        """
+        if not self.client:
+            self.logger.error("❌ Cliente de GCS no inicializado.")
+            return {}
+
+        try:
+            with self.metrics.span('gcs.list'):
+                return {blob.name: blob.generation for blob in self.client.list_blobs(bucket_name, prefix=prefix)}
+        except Exception as e:
+            self.logger.error(f"❌ Ocurrió un error al listar '{prefix}' en el bucket '{bucket_name}': {e}", exc_info=True)
+            return {}
+
+    def generation(self, bucket_name: str, blob_name: str) -> int | None:
+        """
+        Consulta la generación actual de un objeto (solo metadatos, sin descargar su contenido).
+        
+        Returns:
+            La generación del objeto, o None si no existe o si ocurre un error.
+        """
+        if not self.client:
+            self.logger.error("❌ Cliente de GCS no inicializado.")
+            return None
+
+        try:
+            with self.metrics.span('gcs.metadata'):
+                blob = self.client.bucket(bucket_name).get_blob(blob_name)
+            return blob.generation if blob is not None else None
+        except Exception as e:
+            self.logger.error(f"❌ Ocurrió un error al consultar '{blob_name}' en el bucket '{bucket_name}': {e}", exc_info=True)
+            return None
+
+    def delete_blobs(self, bucket_name: str, blob_names: list[str]) -> bool:
+        """
+        Elimina varios objetos del bucket en una sola petición por lotes.
+
+        Args:
+            bucket_name: Nombre del bucket de GCS.
+            blob_names: Rutas de los objetos a eliminar (los que no existen se ignoran).
+
+        Returns:
+            True si se eliminaron, False si ocurre un error.
+        """
+        if not self.client:
+            self.logger.error("❌ Cliente de GCS no inicializado.")
+            return False
+
+        try:
+            bucket = self.client.bucket(bucket_name)
+            bucket.delete_blobs([bucket.blob(name) for name in blob_names], on_error=lambda blob: None)
+            self.logger.info(f"🗑️ {len(blob_names)} objetos eliminados del bucket '{bucket_name}'.")
+            return True
+        except Exception as e:
+            self.logger.error(f"❌ Ocurrió un error al eliminar objetos del bucket '{bucket_name}': {e}", exc_info=True)
+            return False
+
+    def download_to_file(self, bucket_name: str, source_blob_name: str, path: str | Path,
+                         generation: int | None = None) -> bool:
+        """
+        Descarga un objeto de GCS a un archivo local, en streaming.
+        
+        Args:
+            bucket_name: Nombre del bucket de GCS.
+            source_blob_name: Ruta del archivo dentro del bucket.
+            path: Archivo local de destino.
+            generation: Si se indica, la descarga falla si el objeto ya no está en esa generación,
+                para no guardar un contenido distinto del que se pidió.
+        
+        Returns:
+            True si el archivo se descargó, False si el objeto no existe o hubo un error.
+        """
+        if not self.client:
+            self.logger.error("❌ Cliente de GCS no inicializado.")
+            return False
+
+        try:
+            blob = self.client.bucket(bucket_name).blob(source_blob_name)
+            self.logger.info(f"⬇️ Descargando objeto '{source_blob_name}' del bucket '{bucket_name}' a '{path}'...")
+            with self.metrics.span('gcs.download'):
+                blob.download_to_filename(str(path), if_generation_match=generation)
+            self.metrics.add_bytes('gcs.downloaded', Path(path).stat().st_size)
+            return True
+        except NotFound:
+            self.logger.warning(f"⚠️ El objeto '{source_blob_name}' no existe en el bucket '{bucket_name}'.")
+            return False
+        except PreconditionFailed:
+            self.logger.warning(f"⚠️ El objeto '{source_blob_name}' cambió durante la descarga (ya no está en la generación {generation}).")
+            return False
+        except Exception as e:
+            self.metrics.incr('gcs.download_errors')
+            self.logger.error(f"❌ Ocurrió un error inesperado al descargar: {e}", exc_info=True)
+            return False
@@ -0,0 +1,117 @@
+# src/modules/layout_templates.py
+
+import sys
+import json
+import time
+from pathlib import Path
+
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+import src.utils as utils
+
+class LayoutTemplateCache:
+    """
+    Caché persistente de plantillas de diseño de los reportes de la SBS.
+
+    Para cada código de reporte (ej: 'B-2201') y tipo de extracción ('eeff' o 'tc') guarda
+    las coordenadas (fila, columna) en la hoja limpia de cada grupo de términos encontrado
+    la última vez (ej: 'INGRESOS FINANCIEROS', 'RESULTADO NETO...', la celda del tipo de
+    cambio) y, para EEFF, las filas de cabecera (entidad y moneda).
+
+    La verificación de una plantilla la hace quien la consume; esta clase solo almacena las
+    plantillas y lleva la cuenta de aciertos y fallos para detectar cambios de formato.
+    """
+    def __init__(self, path: str | Path = '.cache/sbs_layout_templates.json', data: bytes | None = None):
+        """
+        Inicializa la caché desde `data` (ej: contenido descargado de GCS) o, si no se
+        proporciona, desde el archivo local `path`.
+        """
+        self.logger = utils.get_logger('sbs')
+        self.path = Path(path)
+        self.templates = self._load(data)
+        self.stats: dict[str, dict[str, int]] = {}
+
+    def _load(self, data: bytes | None) -> dict:
+        """
+        Carga las plantillas. Un archivo corrupto o inexistente se trata como vacío.
+        """
+        try:
+            if data is None:
+                if not self.path.exists():
+                    return {}
+                data = self.path.read_bytes()
+            return json.loads(data.decode('utf-8')).get('templates', {})
+        except (ValueError, AttributeError) as e:
+            self.logger.warning(f"  ⚠️ Caché de plantillas ilegible, se empieza una nueva: {e}")
+            return {}
+
+    def get(self, code: str, kind: str) -> dict | None:
+        """
+        Devuelve la plantilla {'groups': {nombre: [fila, columna]}, ...} de un reporte, o None.
+        """
+        return self.templates.get(code, {}).get(kind)
+
+    def put(self, code: str, kind: str, groups: dict[str, tuple[int, int]], **extra):
+        """
+        Guarda (o reemplaza) la plantilla de un reporte con las coordenadas encontradas.
+        """
+        template = {'groups': {name: [int(row), int(col)] for name, (row, col) in groups.items()}}
+        template.update(extra)
+        template['updated_at'] = time.time()
+        self.templates.setdefault(code, {})[kind] = template
+
+    def record(self, code: str, kind: str, hit: bool):
+        """
+        Registra un acierto o un fallo de la plantilla de un reporte.
+        """
+        stats = self.stats.setdefault(f"{code}:{kind}", {'hits': 0, 'misses': 0})
+        stats['hits' if hit else 'misses'] += 1
+
+    def log_stats(self):
+        """
+        Escribe en el log la tasa de aciertos por reporte, avisando de los reportes con fallos.
+        """
+        if not self.stats:
+            return
+        hits = sum(stats['hits'] for stats in self.stats.values())
+        total = hits + sum(stats['misses'] for stats in self.stats.values())
+        self.logger.info(f"  📐 Plantillas de diseño: {hits}/{total} aciertos ({hits / total:.0%}).")
+        for name, stats in sorted(self.stats.items()):
+            if stats['misses']:
+                self.logger.info(
+                    f"    ↳ '{name}': {stats['hits']} aciertos, {stats['misses']} fallos "
+                    f"(posible cambio de formato o primera vez que se procesa).")
+
+    def merge(self, other: "LayoutTemplateCache") -> int:
+        """
+        Incorpora las plantillas de otra caché (ej: la de una partición de una carga por partes),
+        conservando para cada reporte y tipo la plantilla actualizada más recientemente.
+
+        Returns:
+            El número de plantillas añadidas o reemplazadas.
+        """
+        merged = 0
+        for code, kinds in other.templates.items():
+            for kind, template in kinds.items():
+                current = self.get(code, kind)
+                if current is None or template.get('updated_at', 0) > current.get('updated_at', 0):
+                    self.templates.setdefault(code, {})[kind] = dict(template)
+                    merged += 1
+        return merged
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializa las plantillas a JSON (para guardarlas en disco o en GCS).
+        """
+        return json.dumps({'templates': self.templates}, ensure_ascii=False, sort_keys=True).encode('utf-8')
+
+    def save(self):
+        """
+        Guarda las plantillas en `path` de forma atómica.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        tmp_path.write_bytes(self.to_bytes())
+        tmp_path.replace(self.path)
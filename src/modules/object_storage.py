@@ -0,0 +1,617 @@
+# src/modules/object_storage.py
+
+import io
+import sys
+import gzip
+import glob
+import uuid
+import shutil
+import threading
+import pandas as pd
+from abc import ABC, abstractmethod
+from pathlib import Path
+from itertools import count
+from typing import Callable, Iterator
+
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+import src.utils as utils
+from src.modules.run_metrics import get_metrics
+
+# Almacenes disponibles para `build_storage` (y la opción --storage-backend)
+STORAGE_BACKENDS = ('gcs', 'local', 'memory')
+# Carpeta de la caché local de objetos de GCS
+OBJECT_CACHE_DIR = '.cache/gcs_objects'
+# Conversor de decimales de `read_csv`: el de por defecto no devuelve exactamente el float64 que se
+# escribió, así que cada lectura de un CSV procesado alteraría los importes en los últimos dígitos
+CSV_FLOAT_PRECISION = 'round_trip'
+
+
+def csv_compression(blob_name: str) -> str | None:
+    """
+    Devuelve la compresión de un CSV según su extensión ('gzip' para '.gz').
+    """
+    return 'gzip' if blob_name.endswith('.gz') else None
+
+
+def csv_bytes(df: pd.DataFrame, compression: str | None = None) -> bytes:
+    """
+    Serializa `df` como los CSV del proyecto (UTF-8 con BOM, sin índice), opcionalmente con gzip.
+    """
+    data = df.to_csv(index=False).encode('utf-8-sig')
+    return gzip.compress(data, mtime=0) if compression == 'gzip' else data
+
+
+def csv_content_type(compression: str | None = None) -> str:
+    """
+    Devuelve el tipo MIME de un CSV con la compresión indicada.
+    """
+    return 'application/gzip' if compression == 'gzip' else 'text/csv'
+
+
+def write_csv_file(df: pd.DataFrame, path: str | Path, compression: str | None = None):
+    """
+    Escribe `df` en un archivo local con el mismo formato que `csv_bytes`, por partes.
+    """
+    df.to_csv(
+        path, index=False, encoding='utf-8-sig',
+        compression={'method': 'gzip', 'mtime': 0} if compression == 'gzip' else None
+    )
+
+
+class ObjectStorage(ABC):
+    """
+    Interfaz de los almacenes de objetos del pipeline (GCS, carpeta local o memoria).
+
+    Las rutas se organizan por bucket y nombre de objeto, como en GCS. Cada almacén
+    implementa las operaciones básicas (`download_bytes`, `upload_bytes`, `list_generations`
+    y `generation`); las lecturas y escrituras de CSV tienen aquí una versión genérica que
+    los almacenes pueden reemplazar por una más eficiente (ej: en streaming).
+
+    La generación es un número que cambia cada vez que se reescribe un objeto (en GCS, su
+    `generation`); sirve para saber si una copia local sigue vigente sin descargar el objeto.
+    Como `GCSManager`, los métodos no lanzan excepciones: devuelven None, False o una lista
+    vacía y registran el error.
+
+    Las operaciones básicas son abstractas: un almacén que no las implementa falla al crearse.
+    Cada almacén anota la generación que devuelven sus propias escrituras (ver
+    `written_generation`), así quien las envuelve no necesita volver a consultarla.
+    """
+    def __init__(self):
+        # Generación de cada objeto escrito por este almacén, según la respuesta de la escritura
+        self._written: dict[str, int] = {}
+
+    def _record_write(self, bucket_name: str, blob_name: str, generation: int | None):
+        if generation is not None:
+            self._written[f"{bucket_name}/{blob_name}"] = generation
+
+    def written_generation(self, bucket_name: str, blob_name: str) -> int | None:
+        """
+        Devuelve la generación de la última escritura de este almacén en el objeto, sin consultar
+        al almacén, o None si no la escribió o si su escritura no informa la generación.
+        """
+        return self._written.get(f"{bucket_name}/{blob_name}")
+
+    @abstractmethod
+    def download_bytes(self, bucket_name: str, source_blob_name: str) -> bytes | None:
+        """
+        Devuelve el contenido del objeto, o None si no existe o hubo un error.
+        """
+
+    @abstractmethod
+    def upload_bytes(self, data: bytes, bucket_name: str, destination_blob_name: str,
+                     content_type: str = 'application/octet-stream') -> bool:
+        """
+        Escribe el objeto. Devuelve True si se escribió.
+        """
+
+    @abstractmethod
+    def list_generations(self, bucket_name: str, prefix: str) -> dict[str, int]:
+        """
+        Devuelve {nombre: generación} de los objetos que empiezan por `prefix`.
+        """
+
+    @abstractmethod
+    def generation(self, bucket_name: str, blob_name: str) -> int | None:
+        """
+        Devuelve la generación actual del objeto, o None si no existe.
+        """
+
+    @abstractmethod
+    def delete_blobs(self, bucket_name: str, blob_names: list[str]) -> bool:
+        """
+        Elimina los objetos indicados (los que no existen se ignoran). Devuelve False si alguno no se pudo eliminar.
+        """
+
+    def list_blobs(self, bucket_name: str, prefix: str) -> list[str]:
+        return sorted(self.list_generations(bucket_name, prefix))
+
+    def download_to_file(self, bucket_name: str, source_blob_name: str, path: str | Path,
+                         generation: int | None = None) -> bool:
+        """
+        Copia el objeto en un archivo local.
+
+        Args:
+            generation: Si se indica, solo se copia esa generación del objeto (en los almacenes que lo admiten).
+
+        Returns:
+            True si el archivo se escribió, False si el objeto no existe o hubo un error.
+        """
+        data = self.download_bytes(bucket_name, source_blob_name)
+        if data is None:
+            return False
+        Path(path).write_bytes(data)
+        return True
+
+    def download_csv_as_df(self, bucket_name: str, source_blob_name: str,
+                           dtype: dict[str, str] | None = None) -> pd.DataFrame | None:
+        data = self.download_bytes(bucket_name, source_blob_name)
+        if data is None:
+            return None
+        return pd.read_csv(
+            io.BytesIO(data), dtype=dtype, encoding='utf-8-sig', compression=csv_compression(source_blob_name),
+            float_precision=CSV_FLOAT_PRECISION
+        )
+
+    def iter_csv_chunks(self, bucket_name: str, source_blob_name: str, chunksize: int = 100_000,
+                        dtype: dict[str, str] | None = None, usecols: list[str] | None = None) -> Iterator[pd.DataFrame]:
+        data = self.download_bytes(bucket_name, source_blob_name)
+        if data is None:
+            return
+        if dtype is not None and usecols is not None:
+            dtype = {col: kind for col, kind in dtype.items() if col in usecols}
+        yield from pd.read_csv(
+            io.BytesIO(data), dtype=dtype, usecols=usecols, chunksize=chunksize, encoding='utf-8-sig',
+            compression=csv_compression(source_blob_name), float_precision=CSV_FLOAT_PRECISION
+        )
+
+    def upload_file(self, path: str | Path, bucket_name: str, destination_blob_name: str,
+                    content_type: str = 'application/octet-stream') -> bool:
+        """
+        Sube el contenido de un archivo local como el objeto `destination_blob_name`.
+        """
+        return self.upload_bytes(Path(path).read_bytes(), bucket_name, destination_blob_name, content_type=content_type)
+
+    def upload_files(self, files: dict[str, str | Path], bucket_name: str,
+                     content_type: str = 'application/octet-stream', max_workers: int = 4) -> bool:
+        """
+        Sube varios archivos locales ({ruta de destino: archivo}). Los almacenes que lo admiten
+        los confirman todos o ninguno, como en `upload_dfs_as_csv`.
+        """
+        return all([self.upload_file(path, bucket_name, name, content_type=content_type) for name, path in files.items()])
+
+    def upload_df_as_csv(self, df: pd.DataFrame, bucket_name: str, destination_blob_name: str,
+                         compression: str | None = None) -> bool:
+        return self.upload_bytes(csv_bytes(df, compression), bucket_name, destination_blob_name, content_type=csv_content_type(compression))
+
+    def upload_dfs_as_csv(self, frames: dict[str, pd.DataFrame], bucket_name: str,
+                          compression: str | None = None, max_workers: int = 4) -> bool:
+        """
+        Sube varios DataFrames como CSV. Todos se serializan antes de escribir el primero, de modo
+        que un error al serializar no deja archivos a medias.
+        """
+        payloads = {name: csv_bytes(df, compression) for name, df in frames.items()}
+        return all([
+            self.upload_bytes(data, bucket_name, name, content_type=csv_content_type(compression))
+            for name, data in payloads.items()
+        ])
+
+
+class LocalStorage(ObjectStorage):
+    """
+    Almacén de objetos en una carpeta local ('{root}/{bucket}/{nombre}'), para ejecutar el
+    pipeline sin credenciales ni red (desarrollo, pruebas y benchmarks).
+
+    Las escrituras son atómicas (archivo temporal y reemplazo) y la generación de un objeto es
+    la fecha de modificación de su archivo en nanosegundos.
+    """
+    def __init__(self, root: str | Path = 'sbs_storage'):
+        """
+        Args:
+            root: Carpeta raíz del almacén.
+        """
+        super().__init__()
+        self.logger = utils.get_logger('sbs')
+        self.root = Path(root)
+        self.bytes_written = 0
+
+    def _path(self, bucket_name: str, blob_name: str) -> Path:
+        return self.root / bucket_name / blob_name
+
+    def _staging_path(self, path: Path) -> Path:
+        return path.with_name(f"{path.name}.tmp-{uuid.uuid4().hex[:12]}")
+
+    def download_bytes(self, bucket_name: str, source_blob_name: str) -> bytes | None:
+        path = self._path(bucket_name, source_blob_name)
+        if not path.exists():
+            self.logger.warning(f"⚠️ El objeto '{source_blob_name}' no existe en '{self.root / bucket_name}'.")
+            return None
+        return path.read_bytes()
+
+    def upload_bytes(self, data: bytes, bucket_name: str, destination_blob_name: str,
+                     content_type: str = 'application/octet-stream') -> bool:
+        data = data.encode('utf-8') if isinstance(data, str) else data
+        return self._write(bucket_name, destination_blob_name, lambda path: path.write_bytes(data))
+
+    def _write(self, bucket_name: str, blob_name: str, write: Callable[[Path], object]) -> bool:
+        path = self._path(bucket_name, blob_name)
+        staging = self._staging_path(path)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write(staging)
+            self.bytes_written += staging.stat().st_size
+            staging.replace(path)
+            self._record_write(bucket_name, blob_name, path.stat().st_mtime_ns)
+            return True
+        except Exception as e:
+            staging.unlink(missing_ok=True)
+            self.logger.error(f"❌ Ocurrió un error al escribir '{path}': {e}", exc_info=True)
+            return False
+
+    def list_generations(self, bucket_name: str, prefix: str) -> dict[str, int]:
+        bucket_root = self.root / bucket_name
+        if not bucket_root.exists():
+            return {}
+        generations = {}
+        for path in bucket_root.rglob('*'):
+            name = path.relative_to(bucket_root).as_posix()
+            if path.is_file() and name.startswith(prefix) and '.tmp-' not in path.name:
+                generations[name] = path.stat().st_mtime_ns
+        return generations
+
+    def generation(self, bucket_name: str, blob_name: str) -> int | None:
+        path = self._path(bucket_name, blob_name)
+        return path.stat().st_mtime_ns if path.exists() else None
+
+    def delete_blobs(self, bucket_name: str, blob_names: list[str]) -> bool:
+        try:
+            for name in blob_names:
+                self._path(bucket_name, name).unlink(missing_ok=True)
+            return True
+        except Exception as e:
+            self.logger.error(f"❌ Ocurrió un error al eliminar objetos de '{bucket_name}': {e}", exc_info=True)
+            return False
+
+    def download_to_file(self, bucket_name: str, source_blob_name: str, path: str | Path,
+                         generation: int | None = None) -> bool:
+        source = self._path(bucket_name, source_blob_name)
+        if not source.exists():
+            return False
+        shutil.copyfile(source, path)
+        return True
+
+    def download_csv_as_df(self, bucket_name: str, source_blob_name: str,
+                           dtype: dict[str, str] | None = None) -> pd.DataFrame | None:
+        path = self._path(bucket_name, source_blob_name)
+        if not path.exists():
+            self.logger.warning(f"⚠️ El archivo '{source_blob_name}' no existe en '{self.root / bucket_name}'.")
+            return None
+        return pd.read_csv(
+            path, dtype=dtype, encoding='utf-8-sig', compression=csv_compression(source_blob_name),
+            float_precision=CSV_FLOAT_PRECISION
+        )
+
+    def upload_df_as_csv(self, df: pd.DataFrame, bucket_name: str, destination_blob_name: str,
+                         compression: str | None = None) -> bool:
+        return self._write(bucket_name, destination_blob_name, lambda path: write_csv_file(df, path, compression))
+
+    def upload_file(self, path: str | Path, bucket_name: str, destination_blob_name: str,
+                    content_type: str = 'application/octet-stream') -> bool:
+        return self._write(bucket_name, destination_blob_name, lambda staging: shutil.copyfile(path, staging))
+
+    def upload_dfs_as_csv(self, frames: dict[str, pd.DataFrame], bucket_name: str,
+                          compression: str | None = None, max_workers: int = 4) -> bool:
+        return self._write_all(bucket_name, {
+            name: lambda staging, df=df: write_csv_file(df, staging, compression) for name, df in frames.items()
+        })
+
+    def upload_files(self, files: dict[str, str | Path], bucket_name: str,
+                     content_type: str = 'application/octet-stream', max_workers: int = 4) -> bool:
+        return self._write_all(bucket_name, {
+            name: lambda staging, path=path: shutil.copyfile(path, staging) for name, path in files.items()
+        })
+
+    def _write_all(self, bucket_name: str, writers: dict[str, Callable[[Path], object]]) -> bool:
+        """
+        Escribe todos los objetos en archivos temporales y, solo si todos se escriben, los mueve a sus rutas.
+        """
+        staged: dict[str, tuple[Path, Path]] = {}
+        try:
+            for name, write in writers.items():
+                path = self._path(bucket_name, name)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                staged[name] = path, self._staging_path(path)
+                write(staged[name][1])
+            for name, (path, staging) in staged.items():
+                self.bytes_written += staging.stat().st_size
+                staging.replace(path)
+                self._record_write(bucket_name, name, path.stat().st_mtime_ns)
+            return True
+        except Exception as e:
+            self.logger.error(f"❌ La escritura en lote no se confirmó: {e}", exc_info=True)
+            return False
+        finally:
+            for _, staging in staged.values():
+                staging.unlink(missing_ok=True)
+
+
+class MemoryStorage(ObjectStorage):
+    """
+    Almacén de objetos en memoria, que se pierde al terminar el proceso (pruebas y benchmarks).
+    """
+    def __init__(self):
+        super().__init__()
+        self.objects: dict[str, bytes] = {}
+        self.generations: dict[str, int] = {}
+        self.bytes_written = 0
+        self._counter = count(1)
+        self._lock = threading.Lock()
+
+    def download_bytes(self, bucket_name: str, source_blob_name: str) -> bytes | None:
+        return self.objects.get(f"{bucket_name}/{source_blob_name}")
+
+    def upload_bytes(self, data: bytes, bucket_name: str, destination_blob_name: str,
+                     content_type: str = 'application/octet-stream') -> bool:
+        data = data.encode('utf-8') if isinstance(data, str) else data
+        key = f"{bucket_name}/{destination_blob_name}"
+        with self._lock:
+            self.objects[key] = data
+            self.generations[key] = next(self._counter)
+            self.bytes_written += len(data)
+            self._written[key] = self.generations[key]
+        return True
+
+    def list_generations(self, bucket_name: str, prefix: str) -> dict[str, int]:
+        with self._lock:
+            items = list(self.generations.items())
+        return {
+            key.split('/', 1)[1]: generation for key, generation in items
+            if key.startswith(f"{bucket_name}/{prefix}")
+        }
+
+    def generation(self, bucket_name: str, blob_name: str) -> int | None:
+        return self.generations.get(f"{bucket_name}/{blob_name}")
+
+    def delete_blobs(self, bucket_name: str, blob_names: list[str]) -> bool:
+        with self._lock:
+            for name in blob_names:
+                self.objects.pop(f"{bucket_name}/{name}", None)
+                self.generations.pop(f"{bucket_name}/{name}", None)
+        return True
+
+
+class CachedStorage(ObjectStorage):
+    """
+    Caché local de lectura de otro almacén (normalmente GCS), indexada por generación.
+
+    Cada objeto leído se guarda en '{root}/{bucket}/{nombre}@{generación}'. Antes de leer se
+    consulta la generación actual del objeto (una petición de metadatos, o ninguna si ya se
+    obtuvo al listar su carpeta): si coincide con la copia local, se lee del disco; si no, se
+    descarga una vez y se reemplaza la copia anterior. Las escrituras van al almacén y, si
+    terminan bien, dejan también la copia local de la nueva generación, así la siguiente
+    ejecución lee del disco lo que subió esta mientras nadie más lo modifique.
+
+    Los CSV se serializan una sola vez, en la copia local, y se sube ese archivo: lo que queda
+    en la caché son exactamente los bytes subidos. La generación de la copia es la que devolvió
+    la escritura (ver `written_generation`); solo si el almacén no la informa se consulta.
+    """
+    def __init__(self, storage: ObjectStorage, root: str | Path = OBJECT_CACHE_DIR):
+        """
+        Args:
+            storage: Almacén de origen (ej: `GCSManager`).
+            root: Carpeta de la caché local.
+        """
+        super().__init__()
+        self.logger = utils.get_logger('sbs')
+        self.metrics = get_metrics('sbs')
+        self.storage = storage
+        self.root = Path(root)
+        # Generaciones ya conocidas en esta ejecución (al listar o al escribir), para no volver a consultarlas
+        self._generations: dict[str, int] = {}
+
+    def _cache_path(self, bucket_name: str, blob_name: str, generation: int) -> Path:
+        return self.root / bucket_name / f"{blob_name}@{generation}"
+
+    def _prune(self, path: Path):
+        """
+        Elimina las copias de otras generaciones del mismo objeto.
+        """
+        base = path.name.rsplit('@', 1)[0]
+        for other in glob.glob(glob.escape(str(path.parent / base)) + '@*'):
+            if Path(other) != path and Path(other).name.rsplit('@', 1)[1].isdigit():
+                Path(other).unlink(missing_ok=True)
+
+    def _staging_path(self, bucket_name: str, blob_name: str) -> Path:
+        path = self.root / bucket_name / f"{blob_name}.tmp-{uuid.uuid4().hex[:12]}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def _fetch(self, bucket_name: str, blob_name: str) -> Path | None:
+        """
+        Devuelve la copia local de la generación actual del objeto, descargándola si no está.
+        None si el objeto no existe o no se pudo descargar.
+        """
+        generation = self.generation(bucket_name, blob_name)
+        if generation is None:
+            return None
+        path = self._cache_path(bucket_name, blob_name, generation)
+        if path.exists():
+            self.metrics.incr('storage.cache_hits')
+            self.logger.info(f"⚡ '{blob_name}' sin cambios (generación {generation}): se lee de la caché local.")
+            return path
+        self.metrics.incr('storage.cache_misses')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staging = path.with_name(f"{path.name}.tmp-{uuid.uuid4().hex[:12]}")
+        if not self.storage.download_to_file(bucket_name, blob_name, staging, generation):
+            staging.unlink(missing_ok=True)
+            return None
+        staging.replace(path)
+        self._prune(path)
+        return path
+
+    def _remember(self, bucket_name: str, blob_name: str, staging: Path):
+        """
+        Tras una escritura correcta, convierte el archivo `staging` (con los bytes subidos) en la
+        copia local de la nueva generación del objeto.
+        """
+        try:
+            generation = self.storage.written_generation(bucket_name, blob_name)
+            if generation is None:
+                generation = self.storage.generation(bucket_name, blob_name)
+            if generation is None:
+                return
+            self._generations[f"{bucket_name}/{blob_name}"] = generation
+            self._record_write(bucket_name, blob_name, generation)
+            path = self._cache_path(bucket_name, blob_name, generation)
+            staging.replace(path)
+            self._prune(path)
+        except Exception as e:
+            self.logger.warning(f"⚠️ No se pudo guardar '{blob_name}' en la caché local: {e}")
+        finally:
+            staging.unlink(missing_ok=True)
+
+    def _stage_csv(self, df: pd.DataFrame, bucket_name: str, blob_name: str, compression: str | None) -> Path | None:
+        """
+        Serializa `df` en un archivo temporal de la caché, o devuelve None si no se pudo escribir.
+        """
+        staging = None
+        try:
+            staging = self._staging_path(bucket_name, blob_name)
+            write_csv_file(df, staging, compression)
+            return staging
+        except Exception as e:
+            if staging is not None:
+                staging.unlink(missing_ok=True)
+            self.logger.warning(f"⚠️ No se pudo preparar '{blob_name}' en la caché local; se sube sin caché: {e}")
+            return None
+
+    def generation(self, bucket_name: str, blob_name: str) -> int | None:
+        key = f"{bucket_name}/{blob_name}"
+        if key not in self._generations:
+            generation = self.storage.generation(bucket_name, blob_name)
+            if generation is None:
+                return None
+            self._generations[key] = generation
+        return self._generations[key]
+
+    def delete_blobs(self, bucket_name: str, blob_names: list[str]) -> bool:
+        deleted = self.storage.delete_blobs(bucket_name, blob_names)
+        for name in blob_names:
+            self._generations.pop(f"{bucket_name}/{name}", None)
+            for path in glob.glob(glob.escape(str(self.root / bucket_name / name)) + '@*'):
+                Path(path).unlink(missing_ok=True)
+        return deleted
+
+    def list_generations(self, bucket_name: str, prefix: str) -> dict[str, int]:
+        generations = self.storage.list_generations(bucket_name, prefix)
+        self._generations.update({f"{bucket_name}/{name}": generation for name, generation in generations.items()})
+        return generations
+
+    def download_bytes(self, bucket_name: str, source_blob_name: str) -> bytes | None:
+        path = self._fetch(bucket_name, source_blob_name)
+        if path is None:
+            return self.storage.download_bytes(bucket_name, source_blob_name)
+        return path.read_bytes()
+
+    def download_to_file(self, bucket_name: str, source_blob_name: str, path: str | Path,
+                         generation: int | None = None) -> bool:
+        cached = self._fetch(bucket_name, source_blob_name)
+        if cached is None:
+            return self.storage.download_to_file(bucket_name, source_blob_name, path, generation)
+        shutil.copyfile(cached, path)
+        return True
+
+    def download_csv_as_df(self, bucket_name: str, source_blob_name: str,
+                           dtype: dict[str, str] | None = None) -> pd.DataFrame | None:
+        path = self._fetch(bucket_name, source_blob_name)
+        if path is None:
+            return self.storage.download_csv_as_df(bucket_name, source_blob_name, dtype=dtype)
+        return pd.read_csv(
+            path, dtype=dtype, encoding='utf-8-sig', compression=csv_compression(source_blob_name),
+            float_precision=CSV_FLOAT_PRECISION
+        )
+
+    def iter_csv_chunks(self, bucket_name: str, source_blob_name: str, chunksize: int = 100_000,
+                        dtype: dict[str, str] | None = None, usecols: list[str] | None = None) -> Iterator[pd.DataFrame]:
+        path = self._fetch(bucket_name, source_blob_name)
+        if path is None:
+            yield from self.storage.iter_csv_chunks(bucket_name, source_blob_name, chunksize, dtype, usecols)
+            return
+        if dtype is not None and usecols is not None:
+            dtype = {col: kind for col, kind in dtype.items() if col in usecols}
+        yield from pd.read_csv(
+            path, dtype=dtype, usecols=usecols, chunksize=chunksize, encoding='utf-8-sig',
+            compression=csv_compression(source_blob_name), float_precision=CSV_FLOAT_PRECISION
+        )
+
+    def upload_bytes(self, data: bytes, bucket_name: str, destination_blob_name: str,
+                     content_type: str = 'application/octet-stream') -> bool:
+        uploaded = self.storage.upload_bytes(data, bucket_name, destination_blob_name, content_type=content_type)
+        if uploaded:
+            data = data.encode('utf-8') if isinstance(data, str) else data
+            try:
+                staging = self._staging_path(bucket_name, destination_blob_name)
+                staging.write_bytes(data)
+            except Exception as e:
+                self.logger.warning(f"⚠️ No se pudo guardar '{destination_blob_name}' en la caché local: {e}")
+            else:
+                self._remember(bucket_name, destination_blob_name, staging)
+        return uploaded
+
+    def upload_file(self, path: str | Path, bucket_name: str, destination_blob_name: str,
+                    content_type: str = 'application/octet-stream') -> bool:
+        return self.upload_bytes(Path(path).read_bytes(), bucket_name, destination_blob_name, content_type=content_type)
+
+    def upload_df_as_csv(self, df: pd.DataFrame, bucket_name: str, destination_blob_name: str,
+                         compression: str | None = None) -> bool:
+        staging = self._stage_csv(df, bucket_name, destination_blob_name, compression)
+        if staging is None:
+            return self.storage.upload_df_as_csv(df, bucket_name, destination_blob_name, compression=compression)
+        uploaded = self.storage.upload_file(staging, bucket_name, destination_blob_name, content_type=csv_content_type(compression))
+        if uploaded:
+            self._remember(bucket_name, destination_blob_name, staging)
+        else:
+            staging.unlink(missing_ok=True)
+        return uploaded
+
+    def upload_dfs_as_csv(self, frames: dict[str, pd.DataFrame], bucket_name: str,
+                          compression: str | None = None, max_workers: int = 4) -> bool:
+        staged = {}
+        for name, df in frames.items():
+            staging = self._stage_csv(df, bucket_name, name, compression)
+            if staging is None:
+                for path in staged.values():
+                    path.unlink(missing_ok=True)
+                return self.storage.upload_dfs_as_csv(frames, bucket_name, compression=compression, max_workers=max_workers)
+            staged[name] = staging
+        committed = self.storage.upload_files(staged, bucket_name, content_type=csv_content_type(compression), max_workers=max_workers)
+        for name, staging in staged.items():
+            if committed:
+                self._remember(bucket_name, name, staging)
+            else:
+                staging.unlink(missing_ok=True)
+        return committed
+
+
+def build_storage(backend: str = 'gcs', root: str | Path = 'sbs_storage',
+                  cache_dir: str | Path | None = OBJECT_CACHE_DIR) -> ObjectStorage:
+    """
+    Crea el almacén de objetos del pipeline.
+
+    Args:
+        backend: 'gcs' (Google Cloud Storage), 'local' (carpeta `root`) o 'memory'.
+        root: Carpeta raíz del almacén 'local'.
+        cache_dir: Carpeta de la caché local de lectura de GCS. None la desactiva.
+    """
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Almacén desconocido: '{backend}'. Opciones: {list(STORAGE_BACKENDS)}")
+    if backend == 'local':
+        return LocalStorage(root)
+    if backend == 'memory':
+        return MemoryStorage()
+    # Se importa aquí para que los almacenes local y en memoria no requieran google-cloud-storage
+    from src.modules.gcs_manager import GCSManager
+    storage = GCSManager()
+    return CachedStorage(storage, cache_dir) if cache_dir is not None else storage
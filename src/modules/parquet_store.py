@@ -0,0 +1,146 @@
+# src/modules/parquet_store.py
+
+import io
+import sys
+import pandas as pd
+from pathlib import Path
+from urllib.parse import quote, unquote
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+import src.utils as utils
+from src.modules.object_storage import ObjectStorage
+from src.modules.compact_schema import apply_schema, concat_frames
+
+class ParquetDatasetStore:
+    """
+    Dataset en GCS guardado como archivos Parquet comprimidos y particionados.
+
+    Cada partición es un objeto independiente con rutas al estilo Hive, por ejemplo
+    'SBS_EEFF/TIPO=Banca%20Multiple/DATE=202508/part-0.parquet'. Así, una ejecución solo
+    escribe las particiones nuevas (o reprocesadas) y puede leer únicamente las columnas y
+    particiones que necesita; la lista de particiones existentes se obtiene sin descargar datos.
+    """
+    FILE_NAME = 'part-0.parquet'
+
+    def __init__(self, gcs_manager: ObjectStorage, bucket_name: str, prefix: str,
+                 partition_cols: list[str], column_order: list[str] | None = None,
+                 compression: str = 'zstd', max_workers: int = 16, dtypes: dict[str, str] | None = None):
+        """
+        Args:
+            gcs_manager: Almacén de objetos (GCS, local o en memoria) usado para leer, escribir y listar objetos.
+            bucket_name: Nombre del bucket de GCS.
+            prefix: Carpeta raíz del dataset dentro del bucket (ej: 'SBS_EEFF').
+            partition_cols: Columnas de partición, en orden (ej: ['TIPO', 'DATE']).
+            column_order: Orden canónico de las columnas al leer el dataset completo.
+            compression: Códec de compresión de Parquet.
+            max_workers: Número de hilos para subir o descargar particiones en paralelo.
+            dtypes: Esquema {columna: tipo} que se aplica al leer (ej: EEFF_DTYPES), incluidas
+                las columnas de partición, que se reconstruyen a partir de la ruta.
+        """
+        self.logger = utils.get_logger('sbs')
+        self.gcs_manager = gcs_manager
+        self.bucket_name = bucket_name
+        self.prefix = prefix.rstrip('/')
+        self.partition_cols = partition_cols
+        self.column_order = column_order
+        self.compression = compression
+        self.max_workers = max_workers
+        self.dtypes = dtypes
+
+    def _partition_path(self, values: tuple) -> str:
+        parts = [f"{col}={quote(str(value), safe='')}" for col, value in zip(self.partition_cols, values)]
+        return '/'.join([self.prefix, *parts, self.FILE_NAME])
+
+    def _parse_path(self, blob_name: str) -> dict | None:
+        """
+        Extrae los valores de partición de la ruta de un objeto, o None si no es una partición.
+        """
+        parts = blob_name[len(self.prefix) + 1:].split('/')
+        if len(parts) != len(self.partition_cols) + 1 or parts[-1] != self.FILE_NAME:
+            return None
+        values = {}
+        for col, part in zip(self.partition_cols, parts[:-1]):
+            name, _, value = part.partition('=')
+            if name != col:
+                return None
+            value = unquote(value)
+            values[col] = int(value) if value.lstrip('-').isdigit() else value
+        return values
+
+    def partitions(self) -> pd.DataFrame:
+        """
+        Devuelve un DataFrame con una fila por partición existente y una columna por
+        columna de partición. Solo lista objetos: no descarga datos.
+        """
+        blob_names = self.gcs_manager.list_blobs(self.bucket_name, self.prefix + '/')
+        rows = [values for values in map(self._parse_path, blob_names) if values is not None]
+        return pd.DataFrame(rows, columns=self.partition_cols)
+
+    def write_partitions(self, df: pd.DataFrame) -> int:
+        """
+        Escribe (o reemplaza) las particiones presentes en `df`, sin tocar las demás.
+
+        Returns:
+            El número de particiones escritas correctamente.
+        """
+        if df is None or df.empty:
+            return 0
+
+        def upload(item) -> bool:
+            values, group = item
+            values = values if isinstance(values, tuple) else (values,)
+            buffer = io.BytesIO()
+            group.drop(columns=self.partition_cols).to_parquet(buffer, index=False, compression=self.compression)
+            return self.gcs_manager.upload_bytes(
+                buffer.getvalue(), self.bucket_name, self._partition_path(values),
+                content_type='application/vnd.apache.parquet'
+            )
+
+        groups = list(df.groupby(self.partition_cols, sort=True, observed=True))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            written = sum(executor.map(upload, groups))
+        self.logger.info(f"  🧱 '{self.prefix}': {written}/{len(groups)} particiones escritas.")
+        return written
+
+    def read(self, columns: list[str] | None = None,
+             where: Callable[[dict], bool] | None = None) -> pd.DataFrame:
+        """
+        Lee el dataset, opcionalmente solo algunas columnas y particiones.
+
+        Args:
+            columns: Columnas a leer (pueden incluir las de partición). None lee todas.
+            where: Función que recibe los valores de una partición como diccionario
+                (ej: {'TIPO': 'Banca Multiple', 'DATE': 202508}) y devuelve si se debe leer.
+
+        Returns:
+            Un DataFrame con las filas de las particiones seleccionadas, en orden de partición.
+        """
+        selected = self.partitions()
+        if where is not None and not selected.empty:
+            selected = selected[[where(row) for row in selected.to_dict('records')]]
+        empty_columns = columns or self.column_order or self.partition_cols
+        if selected.empty:
+            return apply_schema(pd.DataFrame(columns=empty_columns), self.dtypes)
+        data_columns = [col for col in columns if col not in self.partition_cols] if columns else None
+
+        def download(values: dict) -> pd.DataFrame | None:
+            path = self._partition_path(tuple(values[col] for col in self.partition_cols))
+            data = self.gcs_manager.download_bytes(self.bucket_name, path)
+            if data is None:
+                return None
+            return pd.read_parquet(io.BytesIO(data), columns=data_columns).assign(**values)
+
+        records = selected.sort_values(self.partition_cols).to_dict('records')
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            frames = [frame for frame in executor.map(download, records) if frame is not None]
+        if not frames:
+            return apply_schema(pd.DataFrame(columns=empty_columns), self.dtypes)
+        df = concat_frames(frames, self.dtypes)
+        if columns:
+            return df[columns]
+        return df[self.column_order] if self.column_order else df
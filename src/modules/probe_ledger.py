@@ -0,0 +1,153 @@
+# src/modules/probe_ledger.py
+
+import sys
+import json
+import time
+from pathlib import Path
+from datetime import datetime
+
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+import src.utils as utils
+
+class ProbeLedger:
+    """
+    Registro persistente del resultado de cada URL consultada en el portal de la SBS.
+
+    Cada entrada se identifica por el nombre del archivo (ej: 'Cajas_Municipales_EEFF_200307')
+    y guarda el último estado observado ('ok', 'not_found' o 'unparseable'), la fecha de la
+    consulta, el número de fallos acumulados y el momento a partir del cual se puede volver
+    a consultar.
+
+    Política de reintentos:
+    - Periodos recientes (dentro de `recent_months` meses) que devuelven 404: se vuelven a
+      consultar tras un TTL corto, porque la SBS puede publicarlos en cualquier momento.
+    - Periodos antiguos con 404 o archivos que no se pueden abrir: se reintentan con espera
+      exponencial (`backoff_base_days` * 2^(fallos-1), hasta `backoff_max_days`).
+    - Las entradas que no se consultan en `max_age_days` días se eliminan al guardar.
+    """
+    STATUS_OK = 'ok'
+    STATUS_NOT_FOUND = 'not_found'
+    STATUS_UNPARSEABLE = 'unparseable'
+
+    def __init__(self, path: str | Path = '.cache/sbs_probe_ledger.json', data: bytes | None = None,
+                 recent_months: int = 3, recent_ttl_hours: float = 20, backoff_base_days: float = 7,
+                 backoff_max_days: float = 180, max_age_days: float = 400):
+        """
+        Inicializa el registro desde `data` (ej: contenido descargado de GCS) o, si no se
+        proporciona, desde el archivo local `path`.
+        """
+        self.logger = utils.get_logger('sbs')
+        self.path = Path(path)
+        self.recent_months = recent_months
+        self.recent_ttl = recent_ttl_hours * 3600
+        self.backoff_base = backoff_base_days * 86400
+        self.backoff_max = backoff_max_days * 86400
+        self.max_age = max_age_days * 86400
+        self.entries = self._load(data)
+
+    def _load(self, data: bytes | None) -> dict:
+        """
+        Carga las entradas del registro. Un registro corrupto o inexistente se trata como vacío.
+        """
+        try:
+            if data is None:
+                if not self.path.exists():
+                    return {}
+                data = self.path.read_bytes()
+            return json.loads(data.decode('utf-8')).get('entries', {})
+        except (ValueError, AttributeError) as e:
+            self.logger.warning(f"  ⚠️ Registro de sondeos ilegible, se empieza uno nuevo: {e}")
+            return {}
+
+    def _is_recent(self, period: str) -> bool:
+        """
+        Indica si un periodo 'AAAAMM' está dentro de los últimos `recent_months` meses.
+        """
+        now = datetime.now()
+        months_ago = (now.year - int(period[:4])) * 12 + (now.month - int(period[4:]))
+        return months_ago <= self.recent_months
+
+    def should_probe(self, key: str) -> bool:
+        """
+        Indica si la URL asociada a `key` debe consultarse en esta ejecución.
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry['status'] == self.STATUS_OK:
+            return True
+        return time.time() >= entry['retry_after']
+
+    def record(self, key: str, status: str, url: str | None = None):
+        """
+        Registra el resultado de consultar (o procesar) el archivo `key`.
+
+        Args:
+            key: Nombre del archivo con el periodo al final (ej: 'Banca_Multiple_EEFF_202508').
+            status: Uno de STATUS_OK, STATUS_NOT_FOUND o STATUS_UNPARSEABLE.
+            url: URL consultada, solo como referencia.
+        """
+        now = time.time()
+        period = key.split('_')[-1]
+        entry = self.entries.get(key, {'attempts': 0})
+        entry.update(status=status, period=period, checked_at=now)
+        if url:
+            entry['url'] = url
+        if status == self.STATUS_OK:
+            entry['retry_after'] = now
+        else:
+            entry['attempts'] += 1
+            if status == self.STATUS_NOT_FOUND and self._is_recent(period):
+                wait = self.recent_ttl
+            else:
+                wait = min(self.backoff_base * 2 ** (entry['attempts'] - 1), self.backoff_max)
+            entry['retry_after'] = now + wait
+        self.entries[key] = entry
+
+    def evict(self) -> int:
+        """
+        Elimina las entradas que no se han consultado en `max_age_days` días.
+
+        Returns:
+            El número de entradas eliminadas.
+        """
+        limit = time.time() - self.max_age
+        stale = [key for key, entry in self.entries.items() if entry['checked_at'] < limit]
+        for key in stale:
+            del self.entries[key]
+        return len(stale)
+
+    def merge(self, other: "ProbeLedger") -> int:
+        """
+        Incorpora las entradas de otro registro (ej: el de una partición de una carga por partes),
+        conservando para cada archivo la consulta más reciente.
+
+        Returns:
+            El número de entradas añadidas o actualizadas.
+        """
+        merged = 0
+        for key, entry in other.entries.items():
+            current = self.entries.get(key)
+            if current is None or entry['checked_at'] > current['checked_at']:
+                self.entries[key] = dict(entry)
+                merged += 1
+        return merged
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializa el registro a JSON (para guardarlo en disco o en GCS).
+        """
+        return json.dumps({'entries': self.entries}, ensure_ascii=False, sort_keys=True).encode('utf-8')
+
+    def save(self):
+        """
+        Elimina las entradas caducadas y guarda el registro en `path` de forma atómica.
+        """
+        evicted = self.evict()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        tmp_path.write_bytes(self.to_bytes())
+        tmp_path.replace(self.path)
+        self.logger.info(
+            f"  💾 Registro de sondeos guardado en '{self.path}' ({len(self.entries)} entradas, {evicted} caducadas).")
@@ -0,0 +1,142 @@
+# src/modules/raw_cache.py
+
+import sys
+import json
+import time
+import hashlib
+from pathlib import Path
+
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+import src.utils as utils
+
+class RawWorkbookCache:
+    """
+    Almacén local, direccionado por contenido, de los libros Excel originales de la SBS.
+
+    Los bytes de cada archivo se guardan una sola vez bajo `objects/` con su hash SHA-256
+    como nombre, y un índice (`index.json`) asocia cada clave de reporte y periodo
+    (ej: 'Banca_Multiple_EEFF_202508') con su hash, la URL de origen y los validadores HTTP
+    (ETag y Last-Modified) necesarios para revalidar con peticiones condicionales.
+
+    El tamaño total se limita a `max_bytes`; al superarlo se eliminan las claves usadas
+    hace más tiempo (LRU) y los objetos que ya no referencia ninguna clave.
+    """
+    def __init__(self, root: str | Path = '.cache/sbs_raw', max_bytes: int = 2 * 1024**3):
+        self.logger = utils.get_logger('sbs')
+        self.root = Path(root)
+        self.objects_dir = self.root / 'objects'
+        self.index_path = self.root / 'index.json'
+        self.max_bytes = max_bytes
+        self.index = self._load_index()
+
+    def _load_index(self) -> dict:
+        """
+        Carga el índice, descartando las entradas cuyo objeto ya no existe en disco.
+        """
+        if not self.index_path.exists():
+            return {}
+        try:
+            index = json.loads(self.index_path.read_text(encoding='utf-8'))
+        except ValueError as e:
+            self.logger.warning(f"  ⚠️ Índice de la caché de archivos ilegible, se empieza uno nuevo: {e}")
+            return {}
+        return {key: entry for key, entry in index.items() if self._object_path(entry['sha256']).exists()}
+
+    def _object_path(self, sha256: str) -> Path:
+        return self.objects_dir / sha256[:2] / sha256
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def keys(self) -> list[str]:
+        """
+        Devuelve las claves almacenadas en la caché.
+        """
+        return list(self.index)
+
+    def get(self, key: str) -> bytes | None:
+        """
+        Devuelve el contenido de `key`, o None si no está en la caché.
+        """
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        try:
+            data = self._object_path(entry['sha256']).read_bytes()
+        except FileNotFoundError:
+            del self.index[key]
+            return None
+        entry['last_access'] = time.time()
+        return data
+
+    def validators(self, key: str) -> dict[str, str]:
+        """
+        Construye las cabeceras de una petición condicional para revalidar `key`.
+        """
+        entry = self.index.get(key)
+        if entry is None:
+            return {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, key: str, data: bytes, url: str | None = None, etag: str | None = None,
+            last_modified: str | None = None):
+        """
+        Guarda el contenido de `key`. Si ya existe un objeto con el mismo hash, se reutiliza.
+        """
+        sha256 = hashlib.sha256(data).hexdigest()
+        object_path = self._object_path(sha256)
+        if not object_path.exists():
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = object_path.with_suffix('.tmp')
+            tmp_path.write_bytes(data)
+            tmp_path.replace(object_path)
+        self.index[key] = {
+            'sha256': sha256, 'size': len(data), 'url': url, 'etag': etag,
+            'last_modified': last_modified, 'last_access': time.time()
+        }
+
+    def size(self) -> int:
+        """
+        Devuelve el tamaño total en bytes de los objetos referenciados por el índice.
+        """
+        return sum({entry['sha256']: entry['size'] for entry in self.index.values()}.values())
+
+    def evict(self) -> int:
+        """
+        Elimina las claves menos usadas recientemente hasta respetar `max_bytes`.
+
+        Returns:
+            El número de claves eliminadas.
+        """
+        total = self.size()
+        evicted = 0
+        for key, entry in sorted(self.index.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            del self.index[key]
+            evicted += 1
+            if not any(other['sha256'] == entry['sha256'] for other in self.index.values()):
+                self._object_path(entry['sha256']).unlink(missing_ok=True)
+                total -= entry['size']
+        return evicted
+
+    def save(self):
+        """
+        Aplica la política de expulsión y guarda el índice en disco de forma atómica.
+        """
+        evicted = self.evict()
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.index, ensure_ascii=False, sort_keys=True), encoding='utf-8')
+        tmp_path.replace(self.index_path)
+        self.logger.info(
+            f"  💾 Caché de archivos guardada en '{self.root}' ({len(self.index)} archivos, "
+            f"{self.size() / 1e6:.1f} MB, {evicted} expulsados).")
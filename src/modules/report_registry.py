@@ -0,0 +1,80 @@
+# src/modules/report_registry.py
+
+from typing import NamedTuple
+
+# Procesadores disponibles: cada uno produce un dataset a partir de ciertos reportes
+PROCESSORS = ('eeff', 'tc', 'ratios')
+# Procesadores que se ejecutan si no se indica otra cosa (los datasets históricos del proyecto)
+DEFAULT_PROCESSORS = ('eeff', 'tc')
+# Sufijo de las claves de cobertura de los reportes de Ratios (ej: 'Banca Multiple Ratios')
+RATIOS_COVERAGE_SUFFIX = ' Ratios'
+
+
+class ReportSpec(NamedTuple):
+    """
+    Declaración de un reporte de la SBS: qué archivo es, cada cuánto se publica, desde cuándo
+    y qué procesadores lo consumen.
+
+    Attributes:
+        name: Prefijo del nombre de archivo (ej: 'Banca_Multiple_EEFF').
+        code: Código del reporte en el portal (ej: 'B-2201').
+        processors: Procesadores que leen el reporte (ej: {'eeff', 'tc'}).
+        period: 'M' (mensual) o 'Q' (trimestral).
+        start_year: Primer año publicado.
+        coverage_suffix: Sufijo de su clave en el manifiesto de cobertura, para los reportes
+            cuyo dataset no es el de EEFF (ej: ' Ratios').
+    """
+    name: str
+    code: str
+    processors: frozenset[str]
+    period: str = 'M'
+    start_year: int = 2002
+    coverage_suffix: str = ''
+
+    @property
+    def doc_type(self) -> str:
+        """
+        Tipo de documento (el valor de la columna TIPO, ej: 'Banca Multiple').
+        """
+        return ' '.join(self.name.split('_')[:-1])
+
+    @property
+    def coverage_key(self) -> str:
+        """
+        Clave del reporte en el manifiesto de cobertura (ej: 'Banca Multiple' o 'Banca Multiple Ratios').
+        """
+        return self.doc_type + self.coverage_suffix
+
+
+_EEFF = frozenset({'eeff'})
+_RATIOS = frozenset({'ratios'})
+
+REPORTS = (
+    ReportSpec('Banca_Multiple_EEFF', 'B-2201', frozenset({'eeff', 'tc'})),
+    ReportSpec('Banca_Multiple_Ratios', 'B-2401', _RATIOS, coverage_suffix=RATIOS_COVERAGE_SUFFIX),
+    ReportSpec('Empresas_Financieras_EEFF', 'B-3101', _EEFF),
+    ReportSpec('Empresas_Financieras_Ratios', 'B-3301', _RATIOS, coverage_suffix=RATIOS_COVERAGE_SUFFIX),
+    ReportSpec('Cajas_Municipales_EEFF', 'C-1101', _EEFF),
+    ReportSpec('Cajas_Municipales_Ratios', 'C-1301', _RATIOS, coverage_suffix=RATIOS_COVERAGE_SUFFIX),
+    ReportSpec('Cajas_Rurales_EEFF', 'C-2101', _EEFF),
+    ReportSpec('Cajas_Rurales_Ratios', 'C-2301', _RATIOS, coverage_suffix=RATIOS_COVERAGE_SUFFIX),
+    ReportSpec('Empresas_Crediticias_EEFF', 'C-4103', _EEFF),
+    ReportSpec('Empresas_Crediticias_Ratios', 'C-4301', _RATIOS, coverage_suffix=RATIOS_COVERAGE_SUFFIX),
+    ReportSpec('Cooperativas_Nivel3_EEFF', 'SC-0002', _EEFF, start_year=2023),
+    ReportSpec('Cooperativas_Nivel2b_EEFF', 'SC-0003', _EEFF, start_year=2023),
+    ReportSpec('Cooperativas_Nivel2a_EEFF', 'SC-0004', _EEFF, period='Q', start_year=2023),
+    ReportSpec('Cooperativas_Nivel1_EEFF', 'SC-0005', _EEFF, period='Q', start_year=2023),
+)
+
+
+def reports_for(processors) -> list[ReportSpec]:
+    """
+    Devuelve los reportes que usa al menos uno de los procesadores indicados, en el orden del registro.
+
+    Args:
+        processors: Procesadores habilitados (ej: ['eeff', 'tc']).
+    """
+    unknown = set(processors) - set(PROCESSORS)
+    if unknown:
+        raise ValueError(f"Procesadores desconocidos: {sorted(unknown)}. Opciones: {list(PROCESSORS)}")
+    return [report for report in REPORTS if report.processors & set(processors)]
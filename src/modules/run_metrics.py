@@ -0,0 +1,154 @@
+# src/modules/run_metrics.py
+
+import sys
+import json
+import time
+import uuid
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+import src.utils as utils
+
+_REGISTRY: dict[str, "RunMetrics"] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+class RunMetrics:
+    """
+    Métricas de una ejecución: tramos con tiempo (spans), contadores y bytes transferidos.
+
+    Cada tramo se acumula por nombre (número de veces, tiempo total, mínimo y máximo), de
+    modo que medir miles de descargas o de búsquedas de términos ocupa lo mismo que medir
+    una. Es seguro usarlo desde varios hilos. Al terminar, `snapshot` devuelve un resumen
+    JSON y `write_jsonl` lo añade como una línea a un archivo que acumula una por ejecución,
+    para poder comparar ejecuciones diarias y detectar regresiones.
+    """
+    def __init__(self, process_name: str):
+        """
+        Args:
+            process_name: Nombre del proceso (ej: "sbs"), como en `utils.get_logger`.
+        """
+        self.logger = utils.get_logger(process_name)
+        self.process_name = process_name
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans: dict[str, dict[str, float]] = {}
+        self.counters: dict[str, int] = {}
+        self.bytes: dict[str, int] = {}
+        self.info: dict[str, object] = {}
+
+    def observe(self, name: str, seconds: float):
+        """
+        Registra la duración de un tramo ya medido (ej: en otro proceso).
+        """
+        with self._lock:
+            span = self.spans.get(name)
+            if span is None:
+                self.spans[name] = {'count': 1, 'total_s': seconds, 'min_s': seconds, 'max_s': seconds}
+            else:
+                span['count'] += 1
+                span['total_s'] += seconds
+                span['min_s'] = min(span['min_s'], seconds)
+                span['max_s'] = max(span['max_s'], seconds)
+
+    @contextmanager
+    def span(self, name: str):
+        """
+        Mide el tiempo del bloque y lo acumula en el tramo `name` (ej: 'gcs.upload').
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def incr(self, name: str, value: int = 1):
+        """
+        Suma `value` al contador `name` (ej: 'fetch.not_found').
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_bytes(self, name: str, size: int):
+        """
+        Suma `size` bytes al total `name` (ej: 'fetch.downloaded').
+        """
+        with self._lock:
+            self.bytes[name] = self.bytes.get(name, 0) + size
+
+    def set_info(self, **info):
+        """
+        Guarda datos descriptivos de la ejecución (ej: opciones de línea de comandos).
+        """
+        with self._lock:
+            self.info.update(info)
+
+    def snapshot(self) -> dict:
+        """
+        Devuelve el resumen de la ejecución hasta el momento.
+        """
+        with self._lock:
+            spans = {
+                name: {**span, 'mean_s': span['total_s'] / span['count']}
+                for name, span in sorted(self.spans.items())
+            }
+            return {
+                'process': self.process_name,
+                'run_id': self.run_id,
+                'started_at': self.started_at,
+                'duration_s': time.perf_counter() - self._start,
+                'info': dict(self.info),
+                'counters': dict(sorted(self.counters.items())),
+                'bytes': dict(sorted(self.bytes.items())),
+                'spans': spans,
+            }
+
+    def to_jsonl(self) -> bytes:
+        """
+        Serializa el resumen como una línea JSON.
+        """
+        return (json.dumps(self.snapshot(), ensure_ascii=False, sort_keys=True) + '\n').encode('utf-8')
+
+    def write_jsonl(self, path: str | Path) -> Path:
+        """
+        Añade el resumen de la ejecución como una línea al archivo JSONL `path`.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open('ab') as f:
+            f.write(self.to_jsonl())
+        self.logger.info(f"  📈 Métricas de la ejecución {self.run_id} guardadas en '{path}'.")
+        return path
+
+
+def get_metrics(process_name: str) -> RunMetrics:
+    """
+    Devuelve las métricas de la ejecución en curso del proceso, creándolas la primera vez.
+
+    Args:
+        process_name: Nombre del proceso (ej: "sbs", "sunat", "bcrp")
+
+    Returns:
+        El objeto `RunMetrics` compartido por todos los módulos del proceso.
+    """
+    with _REGISTRY_LOCK:
+        metrics = _REGISTRY.get(process_name)
+        if metrics is None:
+            metrics = _REGISTRY[process_name] = RunMetrics(process_name)
+        return metrics
+
+
+def reset_metrics(process_name: str) -> RunMetrics:
+    """
+    Empieza unas métricas nuevas para el proceso (ej: entre ejecuciones de un benchmark).
+    """
+    with _REGISTRY_LOCK:
+        metrics = _REGISTRY[process_name] = RunMetrics(process_name)
+        return metrics
@@ -2,165 +2,553 @@
 
 import os
 import sys
+import time
+import threading
 import requests
+import numpy as np
 import pandas as pd
 from io import BytesIO
 from pathlib import Path
 from datetime import datetime
-from itertools import product
+from itertools import islice, groupby
+from operator import itemgetter
+from collections import deque
+from typing import Iterator
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 if __name__ == "__main__":
     project_root = Path(__file__).parent.parent.parent
     sys.path.insert(0, str(project_root))
 
 import src.utils as utils
+from src.modules.probe_ledger import ProbeLedger
+from src.modules.raw_cache import RawWorkbookCache
+from src.modules.run_metrics import get_metrics
+from src.modules.report_registry import REPORTS, DEFAULT_PROCESSORS, reports_for
 
-def _expected_dates(start_year: int = 2002, period: str = 'M') -> set[str]:
+# Raíz de las URLs de los reportes (se puede sustituir, ej: por un servidor local en los benchmarks)
+SBS_BASE_URL = 'https://intranet2.sbs.gob.pe/estadistica/financiera'
+
+# Plantillas de reportes de la SBS: prefijo del nombre de archivo -> código del reporte
+URLS_TEMPLATES = {report.name: report.code for report in REPORTS}
+
+# Nombres de los meses en las rutas del portal (largo, en la carpeta) y en los archivos (corto)
+MONTHS_LONG = [
+    'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+    'Julio', 'Agosto', 'Setiembre', 'Octubre', 'Noviembre', 'Diciembre'
+]
+MONTHS_SHORT = ['en', 'fe', 'ma', 'ab', 'my', 'jn', 'jl', 'ag', 'se', 'oc', 'no', 'di']
+# Clave de `windows` que se aplica a los reportes sin una ventana propia
+ALL_REPORTS = '*'
+# Unidades de reparto de `shard_batches`
+SHARD_STRATEGIES = ('batch', 'report', 'year')
+
+def _parse_period(value: str | int, end: bool = False) -> int:
+    """
+    Convierte un periodo 'AAAAMM' o un año 'AAAA' en un entero AAAAMM. Un año solo se
+    interpreta como enero o, si `end` es True, como diciembre.
+    """
+    text = str(value).strip()
+    if len(text) == 4 and text.isdigit():
+        return int(text) * 100 + (12 if end else 1)
+    if len(text) == 6 and text.isdigit() and 1 <= int(text[4:]) <= 12:
+        return int(text)
+    raise ValueError(f"Periodo inválido: '{value}'. Se espera 'AAAAMM' o 'AAAA'.")
+
+def build_windows(date_from: str | int | None = None, date_to: str | int | None = None,
+                  overrides: list[str] | None = None) -> dict[str, tuple[int | None, int | None]]:
     """
-    Genera un conjunto de fechas esperadas en formato 'AAAAMM'.
+    Construye las ventanas de fechas de la planificación.
     
     Args:
-        start_year: Año de inicio para generar las fechas.
-        period: 'M' para mensual, 'Q' para trimestral.
-        
+        date_from: Primer periodo ('AAAAMM' o 'AAAA') para todos los reportes. None no limita.
+        date_to: Último periodo ('AAAAMM' o 'AAAA') para todos los reportes. None no limita.
+        overrides: Ventanas propias de algunos reportes, como 'REPORTE=DESDE:HASTA', donde
+            REPORTE es el código ('B-2201') o el nombre ('Banca_Multiple_EEFF') y cualquiera de
+            los extremos puede omitirse (ej: 'C-1101=2020:' o 'SC-0002=:202406').
+    
     Returns:
-        Un conjunto de strings con las fechas en formato 'AAAAMM'.
-    """
-    if period not in ['M', 'Q']:
-        raise ValueError("El parámetro 'period' debe ser 'M' (mensual) o 'Q' (trimestral).")
-    if start_year > datetime.now().year:
-        raise ValueError(f"El 'start_year' no debe ser mayor al año actual.")
-    current_year = datetime.now().year
-    range_years = list(range(start_year, current_year + 1))
-    range_months = list(range(1, 13)) if period == 'M' else [3, 6, 9, 12]
-    expected_dates = set(
-        [str(year)+str(month).zfill(2) for year in range_years for month in range_months]
+        Un diccionario {reporte o ALL_REPORTS: (desde, hasta)} con periodos AAAAMM o None.
+    """
+    windows = {}
+    if date_from is not None or date_to is not None:
+        windows[ALL_REPORTS] = (
+            _parse_period(date_from) if date_from is not None else None,
+            _parse_period(date_to, end=True) if date_to is not None else None
         )
-    return expected_dates
+    known = {report.name for report in REPORTS} | {report.code for report in REPORTS}
+    for override in overrides or []:
+        report, separator, window = override.partition('=')
+        report = report.strip()
+        if not separator or ':' not in window:
+            raise ValueError(f"Ventana inválida: '{override}'. Se espera 'REPORTE=DESDE:HASTA'.")
+        if report not in known:
+            raise ValueError(f"Reporte desconocido en la ventana '{override}'.")
+        first, _, last = window.partition(':')
+        windows[report] = (
+            _parse_period(first) if first.strip() else None,
+            _parse_period(last, end=True) if last.strip() else None
+        )
+    for report, (first, last) in windows.items():
+        if first is not None and last is not None and first > last:
+            raise ValueError(f"Ventana vacía para '{report}': {first} es posterior a {last}.")
+    return windows
 
-def _existing_dates(df: pd.DataFrame, doc_type: str, type_col: str = 'TIPO', 
-                    date_col: str = 'DATE') -> set[str]:
+def _month_index(period: int) -> int:
+    """
+    Convierte un periodo AAAAMM en un número de mes consecutivo (año * 12 + mes - 1).
     """
-    Extrae las fechas existentes de un DataFrame para un tipo de documento específico.
+    return (period // 100) * 12 + period % 100 - 1
+
+def _covered_codes(keys: list[str], df: pd.DataFrame | None, type_col: str, date_col: str,
+                   coverage: dict[str, set[str]] | None) -> np.ndarray:
+    """
+    Codifica los pares (clave de cobertura, periodo) ya existentes como enteros
+    `posición de la clave en keys * 1_000_000 + AAAAMM`, para compararlos con `np.isin`.
+    
+    Los pares se toman de `coverage` o, si no se proporciona, de las columnas `type_col` y
+    `date_col` de `df`. Las claves que no están en `keys` se ignoran.
+    """
+    positions = {key: position for position, key in enumerate(keys)}
+    parts = []
+    if coverage is not None:
+        for key, dates in coverage.items():
+            if key in positions and dates:
+                parts.append(positions[key] * 1_000_000 + np.fromiter(map(int, dates), dtype=np.int64, count=len(dates)))
+    elif df is not None and not df.empty:
+        pairs = df[[type_col, date_col]].drop_duplicates()
+        position = pairs[type_col].astype(str).map(positions)
+        dates = pd.to_numeric(pairs[date_col], errors='coerce')
+        valid = position.notna() & dates.notna()
+        parts.append((position[valid].astype(np.int64) * 1_000_000 + dates[valid].astype(np.int64)).to_numpy())
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+def plan_missing(df: pd.DataFrame | None = None, type_col: str = 'TIPO', date_col: str = 'DATE',
+                 coverage: dict[str, set[str]] | None = None, base_url: str = SBS_BASE_URL,
+                 processors=DEFAULT_PROCESSORS, windows: dict[str, tuple[int | None, int | None]] | None = None,
+                 refresh: bool = False) -> pd.DataFrame:
+    """
+    Calcula, de una sola vez para todos los reportes, los pares (reporte, periodo) que faltan.
+    
+    Se arma la grilla de periodos esperados de todos los reportes con operaciones de numpy
+    (respetando la periodicidad, el año de inicio y la ventana de cada reporte, y solo con
+    meses ya cerrados) y se descartan los pares ya existentes con una única comparación por
+    índice. Las fechas existentes fuera del rango esperado se ignoran.
     
     Args:
-        df: DataFrame que contiene los datos.
-        doc_type: Tipo de documento a filtrar (ej: 'Banca Multiple EEFF').
-        type_col: Nombre de la columna que contiene el tipo de documento.
-        date_col: Nombre de la columna que contiene la fecha en formato 'AAAAMM'.
-        
+        df: Dataset del que tomar las fechas existentes si no se proporciona `coverage`.
+        coverage: Fechas ya existentes por clave de cobertura (ej: `CoverageManifest.coverage`).
+        base_url: Raíz de las URLs de los reportes.
+        processors: Procesadores habilitados; solo se planifican los reportes que usan.
+        windows: Ventanas de fechas (ver `build_windows`). Un reporte usa su propia ventana (por
+            código o nombre) o, si no tiene, la de ALL_REPORTS.
+        refresh: Si es True, dentro de las ventanas explícitas se planifican también los
+            periodos ya existentes (para volver a descargarlos).
+    
     Returns:
-        Un conjunto de strings con las fechas existentes en formato 'AAAAMM'.
+        Un DataFrame con una fila por archivo faltante (columnas FILE, URL, REPORT, TIPO, DATE
+        y YEAR), ordenado por reporte (en el orden del registro) y periodo.
     """
-    df = df[df[type_col] == doc_type]
-    df[date_col] = df[date_col].astype(str)
-    existing_dates = set(df[date_col])
-    return existing_dates
+    columns = ['FILE', 'URL', 'REPORT', 'TIPO', 'DATE', 'YEAR']
+    reports = reports_for(processors)
+    windows = windows or {}
+    now = datetime.now()
+    last_closed = now.year * 12 + now.month - 2
+    bounds, explicit = [], []
+    for report in reports:
+        window = windows.get(report.code) or windows.get(report.name) or windows.get(ALL_REPORTS)
+        first, last = window if window is not None else (None, None)
+        bounds.append((
+            max(report.start_year * 12, _month_index(first) if first is not None else 0),
+            min(last_closed, _month_index(last) if last is not None else last_closed)
+        ))
+        explicit.append(window is not None)
+    if not reports or all(first > last for first, last in bounds):
+        return pd.DataFrame(columns=columns)
+
+    starts, ends = np.array(bounds).T
+    quarterly = np.array([report.period == 'Q' for report in reports])
+    months = np.arange(starts.min(), ends.max() + 1)
+    report_idx = np.repeat(np.arange(len(reports)), len(months))
+    month_idx = np.tile(months, len(reports))
+    mask = (month_idx >= starts[report_idx]) & (month_idx <= ends[report_idx])
+    mask &= ~quarterly[report_idx] | (month_idx % 3 == 2)
+    report_idx, month_idx = report_idx[mask], month_idx[mask]
+    years, months_0 = month_idx // 12, month_idx % 12
+    dates = years * 100 + months_0 + 1
 
-def _missing_dates(df: pd.DataFrame|None, doc_type: str, type_col: str = 'TIPO', date_col: str = 'DATE',
-                    period: str = 'M', start_year: int = 2002) -> list[str]:
+    keys = list(dict.fromkeys(report.coverage_key for report in reports))
+    key_positions = np.array([keys.index(report.coverage_key) for report in reports])
+    existing = np.isin(key_positions[report_idx] * 1_000_000 + dates, _covered_codes(keys, df, type_col, date_col, coverage))
+    if refresh:
+        existing &= ~np.array(explicit)[report_idx]
+    report_idx, years, months_0, dates = report_idx[~existing], years[~existing], months_0[~existing], dates[~existing]
+    if not report_idx.size:
+        return pd.DataFrame(columns=columns)
+
+    names = [report.name for report in reports]
+    codes = [report.code for report in reports]
+    return pd.DataFrame({
+        'FILE': [f'{names[report]}_{date}' for report, date in zip(report_idx.tolist(), dates.tolist())],
+        'URL': [
+            f'{base_url}/{year}/{MONTHS_LONG[month]}/{codes[report]}-{MONTHS_SHORT[month]}{year}.XLS'
+            for report, year, month in zip(report_idx.tolist(), years.tolist(), months_0.tolist())
+        ],
+        'REPORT': np.array(names, dtype=object)[report_idx],
+        'TIPO': np.array([report.doc_type for report in reports], dtype=object)[report_idx],
+        'DATE': dates,
+        'YEAR': years,
+    }, columns=columns)
+
+def _build_dic_dataset_urls(df: pd.DataFrame | None, type_col: str = 'TIPO', date_col: str = 'DATE', 
+                            start_year: int = 2002, coverage: dict[str, set[str]] | None = None,
+                            base_url: str = SBS_BASE_URL, processors=DEFAULT_PROCESSORS,
+                            windows: dict[str, tuple[int | None, int | None]] | None = None,
+                            refresh: bool = False) -> dict:
     """
-    Identifica las fechas faltantes comparando las fechas esperadas con las existentes.
-    Si el DataFrame es None o está vacío, devuelve todas las fechas esperadas.
+    Construye un diccionario {nombre de archivo: URL} con los datasets faltantes (ver `plan_missing`).
+    
+    Las fechas existentes se toman de `coverage` ({clave de cobertura: fechas 'AAAAMM'}, ej: el
+    de un CoverageManifest) o, si no se proporciona, se extraen de `df`.
     """
-    expected_dates = _expected_dates(start_year, period)
-    if df is None or df.empty:
-        missing_dates = sorted(list(expected_dates))
-    else:
-        existing_dates = _existing_dates(df, doc_type, type_col, date_col)
-        if not existing_dates.issubset(expected_dates):
-            raise ValueError("El DataFrame contiene fechas fuera del rango esperado.")
-        missing_dates = sorted(list(expected_dates - existing_dates))
-    return missing_dates
+    plan = plan_missing(df, type_col, date_col, coverage, base_url, processors, windows, refresh)
+    return dict(zip(plan['FILE'], plan['URL']))
+
+def plan_backfill_batches(coverage: dict[str, set[str]] | None = None, base_url: str = SBS_BASE_URL,
+                          processors=DEFAULT_PROCESSORS, windows: dict[str, tuple[int | None, int | None]] | None = None,
+                          refresh: bool = False) -> list[tuple[str, int, dict[str, str]]]:
+    """
+    Agrupa las URLs faltantes en lotes por tipo de documento y año, para una carga histórica
+    por etapas.
+    
+    Cada lote reúne los reportes de un tipo de documento en un año que usan los `processors`
+    (EEFF y, si se piden, Ratios), en orden cronológico, de modo que, al confirmarse, sus periodos quedan en la cobertura y una nueva ejecución
+    ya no lo vuelve a planificar.
     
-def _tuples_dates(df: pd.DataFrame, doc_type: str, type_col: str = 'TIPO', date_col: str = 'DATE', period: str = 'M', 
-                   start_year: int = 2002) -> tuple:
+    Args:
+        coverage: Fechas ya existentes por tipo de documento (ej: `CoverageManifest.coverage`).
+        base_url: Raíz de las URLs de los reportes.
+        processors: Procesadores habilitados; solo se planifican los reportes que usan.
+        windows: Ventanas de fechas (ver `build_windows`), para limitar la carga a unos años o reportes.
+        refresh: Vuelve a planificar los periodos existentes dentro de las ventanas (ver `plan_missing`).
+    
+    Returns:
+        Una lista ordenada de tuplas (tipo de documento, año, {nombre: url}).
     """
-    Genera tuplas de (año, (mes_num, mes_largo, mes_corto)) para las fechas faltantes.
-    Estas tuplas son utilizadas para construir las URLs de descarga.
+    plan = plan_missing(coverage=coverage or {}, base_url=base_url, processors=processors, windows=windows, refresh=refresh)
+    if plan.empty:
+        return []
+    # Orden estable: dentro de cada lote se conserva el orden de planificación (reporte y periodo)
+    plan = plan.sort_values(['YEAR', 'TIPO'], kind='stable')
+    batches = []
+    for (year, doc_type), rows in groupby(zip(plan['YEAR'].tolist(), plan['TIPO'], plan['FILE'], plan['URL']), key=itemgetter(0, 1)):
+        batches.append((doc_type, year, {file_name: url for _, _, file_name, url in rows}))
+    return batches
+
+def shard_batches(batches: list[tuple[str, int, dict[str, str]]], index: int, count: int,
+                  by: str = 'batch') -> list[tuple[str, int, dict[str, str]]]:
     """
-    months_map = [
-        'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
-        'Julio', 'Agosto', 'Setiembre', 'Octubre', 'Noviembre', 'Diciembre'
-    ]
-    months_short_map = [
-        'en', 'fe', 'ma', 'ab', 'my', 'jn',
-        'jl', 'ag', 'se', 'oc', 'no', 'di'
-    ]
-    missing_dates = _missing_dates(df, doc_type, type_col, date_col, period, start_year)
-    tuples_dates = tuple()
-    for date in missing_dates:
-        year = date[:4]
-        month = int(date[4:])
-        tuples_dates += (
-            (year, (str(month).zfill(2),months_map[month-1], months_short_map[month-1])),
-            )
-    return tuples_dates
-
-def _build_dic_dataset_urls(df: pd.DataFrame, type_col: str = 'TIPO', date_col: str = 'DATE', 
-                            start_year: int = 2002) -> dict:
-    """
-    Construye un diccionario con las URLs de los datasets faltantes.
-    Itera sobre una plantilla de tipos de reportes y genera las URLs para cada fecha faltante.
-    """
-    urls_templates = {
-        'Banca_Multiple_EEFF': 'B-2201',
-        'Banca_Multiple_Ratios': 'B-2401',
-        'Empresas_Financieras_EEFF': 'B-3101',
-        'Empresas_Financieras_Ratios': 'B-3301',
-        'Cajas_Municipales_EEFF': 'C-1101',
-        'Cajas_Municipales_Ratios': 'C-1301',
-        'Cajas_Rurales_EEFF': 'C-2101',
-        'Cajas_Rurales_Ratios': 'C-2301',
-        'Empresas_Crediticias_EEFF': 'C-4103',
-        'Empresas_Crediticias_Ratios': 'C-4301',
-        'Cooperativas_Nivel3_EEFF': 'SC-0002',
-        'Cooperativas_Nivel2b_EEFF': 'SC-0003',
-        'Cooperativas_Nivel2a_EEFF': 'SC-0004',
-        'Cooperativas_Nivel1_EEFF': 'SC-0005'
+    Reparte los lotes de `plan_backfill_batches` entre `count` particiones y devuelve los de la
+    partición `index` (0-based), en su orden original.
+    
+    El reparto es determinista: cada partición lo calcula por su cuenta a partir del mismo plan
+    (ej: cada trabajo de una matriz de CI) y ningún lote queda en dos particiones.
+    
+    Args:
+        by: Unidad de reparto. 'batch': cada lote (tipo de documento y año) por separado;
+            'report': todos los años de un tipo de documento juntos; 'year': rangos de años
+            consecutivos. Con 'batch' y 'report' las unidades se asignan de mayor a menor a la
+            partición con menos URLs; con 'year' los rangos se cortan por el número de URLs acumulado
+            y, si algún rango quedaría vacío (ej: menos años que particiones), se reparte como 'batch'.
+    
+    Returns:
+        Los lotes de la partición `index`.
+    """
+    if by not in SHARD_STRATEGIES:
+        raise ValueError(f"Reparto desconocido: '{by}'. Opciones: {list(SHARD_STRATEGIES)}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Partición inválida: {index}/{count}.")
+    unit_of = {
+        'year': lambda doc_type, year: year,
+        'report': lambda doc_type, year: doc_type,
+        'batch': lambda doc_type, year: (doc_type, year),
     }
-    dic_datasets_urls = {}
-    for key, value in urls_templates.items():
-        period = 'Q' if key in ['Cooperativas_Nivel2a_EEFF','Cooperativas_Nivel1_EEFF'] else 'M'
-        start_year = 2023 if key.startswith('Cooperativas') else 2002
-        doc_type = ' '.join(key.split('_')[:-1])
-        tuples_dates = _tuples_dates(df, doc_type, type_col, date_col, period, start_year= start_year)
-        for (year, (month, month_long, month_short)), (name_prefix, code) in product(tuples_dates, [(key, value)]):
-            key = f'{name_prefix}_{year}{month}'
-            url = f'https://intranet2.sbs.gob.pe/estadistica/financiera/{year}/{month_long}/{code}-{month_short}{year}.XLS'
-            dic_datasets_urls[key] = url
-    return dic_datasets_urls
+    sizes = {}
+    for doc_type, year, urls in batches:
+        unit = unit_of[by](doc_type, year)
+        sizes[unit] = sizes.get(unit, 0) + len(urls)
+    assignment = {}
+    if by == 'year':
+        total, before = sum(sizes.values()), 0
+        for year in sorted(sizes):
+            assignment[year] = min(count - 1, before * count // total)
+            before += sizes[year]
+        if len(batches) >= count and len(set(assignment.values())) < count:
+            # Con menos años que particiones (o un año que acapara casi todo) algunas quedarían vacías
+            utils.get_logger('sbs').warning(
+                f"⚠️ El reparto por años deja particiones vacías ({len(sizes)} años para {count} particiones); "
+                f"se reparte por lotes.")
+            return shard_batches(batches, index, count, by='batch')
+    else:
+        loads = [0] * count
+        for unit in sorted(sizes, key=lambda unit: (-sizes[unit], unit)):
+            shard = loads.index(min(loads))
+            assignment[unit] = shard
+            loads[shard] += sizes[unit]
+    return [
+        (doc_type, year, urls) for doc_type, year, urls in batches
+        if assignment[unit_of[by](doc_type, year)] == index
+    ]
 
-def download_dataset(df: pd.DataFrame | None, type_col: str = 'TIPO', date_col: str = 'DATE', 
-                     start_year: int = 2002) -> dict[str, BytesIO]:
+def _build_session(pool_size: int, retries: int, backoff_factor: float) -> requests.Session:
     """
-    Descarga los datasets faltantes y los almacena en memoria como objetos BytesIO.
+    Crea una sesión HTTP con conexiones keep-alive reutilizables y reintentos.
     
+    Args:
+        pool_size: Número máximo de conexiones abiertas por host en el pool.
+        retries: Número máximo de reintentos ante errores de red o códigos 429/5xx.
+        backoff_factor: Factor de espera exponencial entre reintentos (en segundos).
+        
     Returns:
-        Un diccionario donde las claves son los nombres de los archivos y los valores
-        son los contenidos de los archivos en objetos BytesIO.
+        Una sesión de `requests` lista para compartirse entre hilos.
+    """
+    retry = Retry(
+        total=retries, connect=retries, read=retries, status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def _fetch_url(session: requests.Session, url: str, host_limits: dict[str, threading.BoundedSemaphore],
+               timeout: tuple[float, float], headers: dict[str, str] | None = None) -> requests.Response:
+    """
+    Descarga una URL respetando el límite de conexiones simultáneas de su host.
+    
+    Las cabeceras `headers` permiten enviar peticiones condicionales (If-None-Match,
+    If-Modified-Since) para revalidar un archivo ya almacenado en caché.
+    """
+    with host_limits[urlparse(url).netloc], get_metrics('sbs').span('fetch.http'):
+        return session.get(url, timeout=timeout, headers=headers)
+
+def _read_response(file_name: str, url: str, response: requests.Response, raw_cache: RawWorkbookCache | None,
+                   ledger: ProbeLedger | None, stats: dict[str, int], logger) -> bytes | None:
+    """
+    Interpreta la respuesta de una URL: devuelve el contenido (descargado o desde la caché
+    si la respuesta es 304), actualiza la caché, el `ledger` y las estadísticas, y registra
+    el resultado en el log. Devuelve None si el archivo no está disponible.
+    """
+    metrics = get_metrics('sbs')
+    cached = raw_cache.get(file_name) if response.status_code == 304 else None
+    if cached is not None:
+        stats['revalidated'] += 1
+        metrics.incr('fetch.not_modified')
+        metrics.add_bytes('fetch.from_cache', len(cached))
+        logger.info(f"  ♻️ Archivo '{file_name}.xls' sin cambios (304), cargado desde la caché local.")
+        if ledger is not None:
+            ledger.record(file_name, ledger.STATUS_OK, url)
+        return cached
+    if response.status_code == 200:
+        stats['bytes'] += len(response.content)
+        metrics.incr('fetch.ok')
+        metrics.add_bytes('fetch.downloaded', len(response.content))
+        logger.info(f"  ✔️ Archivo '{file_name}.xls' cargado en memoria.")
+        if raw_cache is not None:
+            raw_cache.put(
+                file_name, response.content, url,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified')
+            )
+        if ledger is not None:
+            ledger.record(file_name, ledger.STATUS_OK, url)
+        return response.content
+    metrics.incr('fetch.not_found' if response.status_code == 404 else 'fetch.http_error')
+    if ledger is not None and response.status_code == 404:
+        ledger.record(file_name, ledger.STATUS_NOT_FOUND, url)
+    logger.warning(f"  ⚠️ Archivo '{file_name}' no encontrado en {url} (Código: {response.status_code})")
+    return None
+
+def iter_dataset(df: pd.DataFrame | None, type_col: str = 'TIPO', date_col: str = 'DATE', 
+                 start_year: int = 2002, max_workers: int = 8, max_per_host: int = 4,
+                 timeout: tuple[float, float] = (10, 60), retries: int = 3,
+                 backoff_factor: float = 0.5, ledger: ProbeLedger | None = None,
+                 raw_cache: RawWorkbookCache | None = None, offline: bool = False,
+                 coverage: dict[str, set[str]] | None = None,
+                 window: int | None = None, urls: dict[str, str] | None = None,
+                 base_url: str = SBS_BASE_URL, processors=DEFAULT_PROCESSORS,
+                 windows: dict[str, tuple[int | None, int | None]] | None = None,
+                 refresh: bool = False) -> Iterator[tuple[str, BytesIO]]:
+    """
+    Descarga los datasets faltantes y los entrega uno a uno, en el orden de planificación.
+    
+    Como máximo hay `window` descargas en curso o a la espera de ser consumidas: la siguiente
+    URL solo se solicita cuando el consumidor ha tomado un archivo. Así, la memoria ocupada
+    depende del tamaño de la ventana y no del número de periodos faltantes. Los parámetros
+    son los de `download_dataset`.
+    
+    Args:
+        window: Máximo de archivos en vuelo. None solicita todas las URLs desde el inicio.
+        urls: URLs ya planificadas {nombre: url} (ej: un lote de `plan_backfill_batches`).
+            Si se proporcionan, no se vuelven a calcular las fechas faltantes.
+        base_url: Raíz de las URLs de los reportes.
+        processors: Procesadores habilitados; solo se descargan los reportes que usan.
+        windows: Ventanas de fechas de la planificación (ver `build_windows`).
+        refresh: Vuelve a descargar los periodos existentes dentro de las ventanas.
+    
+    Yields:
+        Tuplas (nombre del archivo, contenido en BytesIO).
     """
     logger = utils.get_logger('sbs')
+    metrics = get_metrics('sbs')
     logger.info(">>> 📥 Iniciando descarga de datasets en memoria...")
-    build_dic_dataset_urls = _build_dic_dataset_urls(df, type_col, date_col, start_year)
+    if urls is not None:
+        build_dic_dataset_urls = dict(urls)
+    else:
+        with metrics.span('fetch.plan'):
+            build_dic_dataset_urls = _build_dic_dataset_urls(
+                df, type_col, date_col, start_year, coverage, base_url, processors, windows, refresh
+            )
+    metrics.incr('fetch.planned', len(build_dic_dataset_urls))
+    if offline:
+        if raw_cache is None:
+            raise ValueError("El modo sin conexión requiere una caché de archivos ('raw_cache').")
+        loaded = 0
+        for file_name in build_dic_dataset_urls:
+            data = raw_cache.get(file_name)
+            if data is not None:
+                loaded += 1
+                metrics.add_bytes('fetch.from_cache', len(data))
+                yield file_name, BytesIO(data)
+        metrics.incr('fetch.offline_loaded', loaded)
+        logger.info(
+            f"  📦 Modo sin conexión: {loaded}/{len(build_dic_dataset_urls)} archivos "
+            f"planificados se cargaron desde la caché local.")
+        logger.info(f"<<< 🏁 Proceso de descarga finalizado. ¿Hubo descargas?: {'Sí' if loaded else 'No'}.")
+        return
     
-    files_in_memory = {}
-    for file_name, url in build_dic_dataset_urls.items():
+    if ledger is not None:
+        planned = len(build_dic_dataset_urls)
+        build_dic_dataset_urls = {
+            file_name: url for file_name, url in build_dic_dataset_urls.items()
+            if ledger.should_probe(file_name)
+        }
+        skipped = planned - len(build_dic_dataset_urls)
+        metrics.incr('fetch.skipped_by_ledger', skipped)
+        if skipped:
+            logger.info(f"  ⏭️ Se omiten {skipped}/{planned} URLs según el registro de sondeos.")
+    
+    host_limits = {
+        host: threading.BoundedSemaphore(max_per_host)
+        for host in {urlparse(url).netloc for url in build_dic_dataset_urls.values()}
+    }
+    window = max(window or len(build_dic_dataset_urls), 1)
+    stats = {'files': 0, 'bytes': 0, 'revalidated': 0}
+    pending_urls = iter(build_dic_dataset_urls.items())
+    in_flight = deque()
+    start = time.perf_counter()
+    with _build_session(max_workers, retries, backoff_factor) as session, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        
+        def submit_next():
+            for file_name, url in islice(pending_urls, 1):
+                headers = raw_cache.validators(file_name) if raw_cache is not None else None
+                in_flight.append((file_name, url, executor.submit(_fetch_url, session, url, host_limits, timeout, headers)))
+        
         try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                file_memory = BytesIO(response.content)
-                files_in_memory[file_name] = file_memory
-                logger.info(f"  ✔️ Archivo '{file_name}.xls' cargado en memoria.")
-            else:
-                logger.warning(f"  ⚠️ Archivo '{file_name}' no encontrado en {url} (Código: {response.status_code})")
-        except requests.RequestException as e:
-            logger.error(f"  ❌ Error de red al descargar desde {url}: {e}")
-    
-    if bool(files_in_memory):
-        logger.info(f"Se cargaron {len(files_in_memory)} archivos nuevos en memoria.")
+            for _ in range(window):
+                submit_next()
+            while in_flight:
+                file_name, url, future = in_flight.popleft()
+                try:
+                    data = _read_response(file_name, url, future.result(), raw_cache, ledger, stats, logger)
+                except requests.RequestException as e:
+                    metrics.incr('fetch.network_error')
+                    logger.error(f"  ❌ Error de red al descargar desde {url}: {e}")
+                    data = None
+                submit_next()
+                if data is not None:
+                    stats['files'] += 1
+                    yield file_name, BytesIO(data)
+        finally:
+            # Si el consumidor se detiene antes de tiempo, se cancelan las descargas pendientes
+            for _, _, future in in_flight:
+                future.cancel()
+            if raw_cache is not None:
+                raw_cache.save()
+    elapsed = time.perf_counter() - start
+    metrics.observe('fetch.total', elapsed)
+    metrics.incr('fetch.files', stats['files'])
+    
+    if stats['files']:
+        logger.info(f"Se cargaron {stats['files']} archivos nuevos en memoria.")
     else:
         logger.info("No se encontraron archivos para descargar.")
     
-    logger.info(f"<<< 🏁 Proceso de descarga finalizado. ¿Hubo descargas?: {'Sí' if files_in_memory else 'No'}.")
-    return files_in_memory
+    if build_dic_dataset_urls:
+        rate_files = len(build_dic_dataset_urls) / elapsed if elapsed > 0 else 0.0
+        rate_bytes = stats['bytes'] / elapsed if elapsed > 0 else 0.0
+        logger.info(
+            f"  📊 Rendimiento: {len(build_dic_dataset_urls)} URLs consultadas, {stats['files']} archivos "
+            f"({stats['bytes'] / 1e6:.2f} MB descargados, {stats['revalidated']} revalidados con 304) en {elapsed:.2f} s "
+            f"-> {rate_files:.1f} archivos/s, {rate_bytes / 1e6:.2f} MB/s.")
+    
+    logger.info(f"<<< 🏁 Proceso de descarga finalizado. ¿Hubo descargas?: {'Sí' if stats['files'] else 'No'}.")
+
+def download_dataset(df: pd.DataFrame | None, type_col: str = 'TIPO', date_col: str = 'DATE', 
+                     start_year: int = 2002, max_workers: int = 8, max_per_host: int = 4,
+                     timeout: tuple[float, float] = (10, 60), retries: int = 3,
+                     backoff_factor: float = 0.5, ledger: ProbeLedger | None = None,
+                     raw_cache: RawWorkbookCache | None = None, offline: bool = False,
+                     coverage: dict[str, set[str]] | None = None,
+                     urls: dict[str, str] | None = None, base_url: str = SBS_BASE_URL,
+                     processors=DEFAULT_PROCESSORS, windows: dict[str, tuple[int | None, int | None]] | None = None,
+                     refresh: bool = False) -> dict[str, BytesIO]:
+    """
+    Descarga los datasets faltantes y los almacena en memoria como objetos BytesIO.
+    
+    Las descargas se reparten entre un pool de hilos que comparte una única sesión
+    HTTP (conexiones keep-alive), con un límite de conexiones simultáneas por host,
+    timeouts y reintentos con espera exponencial. Para procesar los archivos sin
+    tenerlos todos en memoria a la vez, ver `iter_dataset`.
+    
+    Args:
+        max_workers: Número de hilos de descarga.
+        max_per_host: Máximo de peticiones simultáneas contra un mismo host.
+        timeout: Tupla (conexión, lectura) en segundos para cada petición.
+        retries: Número máximo de reintentos por URL.
+        backoff_factor: Factor de espera exponencial entre reintentos.
+        ledger: Registro de sondeos opcional. Si se proporciona, se omiten las URLs que
+            el registro desaconseja consultar y se anota el resultado de cada consulta.
+        raw_cache: Caché local opcional de archivos originales. Los archivos ya almacenados
+            se revalidan con peticiones condicionales (una respuesta 304 reutiliza la copia
+            local) y los nuevos se guardan en ella.
+        offline: Si es True, no se hace ninguna petición HTTP y solo se devuelven los
+            archivos planificados que ya están en `raw_cache`.
+        coverage: Fechas ya existentes por tipo de documento (ej: `CoverageManifest.coverage`).
+            Si se proporciona, `df` no se usa para planificar y puede ser None.
+        urls: URLs ya planificadas {nombre: url}. Si se proporcionan, se descargan tal cual.
+        base_url: Raíz de las URLs de los reportes (por defecto, el portal de la SBS).
+        processors: Procesadores habilitados (ver `report_registry`). Solo se planifican los
+            reportes que alguno de ellos usa; por defecto, EEFF y TC (sin los de Ratios).
+        windows: Ventanas de fechas {reporte o ALL_REPORTS: (desde, hasta)} (ver `build_windows`).
+            Sin ventanas se planifica desde el año de inicio de cada reporte hasta el último mes cerrado.
+        refresh: Si es True, dentro de las ventanas se descargan también los periodos ya existentes.
+    
+    Returns:
+        Un diccionario donde las claves son los nombres de los archivos y los valores
+        son los contenidos de los archivos en objetos BytesIO, en el mismo orden en
+        que se planificaron las URLs.
+    """
+    return dict(iter_dataset(
+        df, type_col, date_col, start_year, max_workers, max_per_host, timeout, retries,
+        backoff_factor, ledger=ledger, raw_cache=raw_cache, offline=offline, coverage=coverage, urls=urls, base_url=base_url,
+        processors=processors, windows=windows, refresh=refresh
+    ))
@@ -1,21 +1,68 @@
 # src/modules/data_processing.py
 
 import os
+import re
 import sys
 import pandas as pd
 import numpy as np
 import logging
 import io
+import time
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 
 if __name__ == "__main__":
     project_root = Path(__file__).parent.parent.parent
     sys.path.insert(0, str(project_root))
 
 import src.utils as utils
-from src.modules.sbs_data_fetcher import download_dataset
+from src.modules.sbs_data_fetcher import download_dataset, URLS_TEMPLATES
+from src.modules.probe_ledger import ProbeLedger
+from src.modules.excel_workbook import ExcelWorkbook
+from src.modules.layout_templates import LayoutTemplateCache
+from src.modules.entity_names import EntityNameCache
+from src.modules.compact_schema import apply_schema
+from src.modules.run_metrics import get_metrics
 
-def _open_excel_in_memory_as_df(file_in_memory: io.BytesIO,
+# Columnas de los datasets procesados, en su orden canónico
+EEFF_COLUMNS = ['DATE', 'PERIODO', 'MES', 'TIPO', 'ENTIDAD', 'MONEDA', 'INGRESOS FINANCIEROS',
+                'INGRESOS SERVICIOS FINANCIEROS', 'INGRESO', 'RESULTADO NETO']
+TC_COLUMNS = ['DATE', 'PERIODO', 'MES', 'TC']
+RATIOS_COLUMNS = ['DATE', 'PERIODO', 'MES', 'TIPO', 'ENTIDAD', 'INDICADOR', 'VALOR']
+# Claves únicas de cada dataset: una fila por entidad y moneda en cada reporte, y un TC por mes
+EEFF_KEY = ['TIPO', 'DATE', 'ENTIDAD', 'MONEDA']
+TC_KEY = ['DATE']
+RATIOS_KEY = ['TIPO', 'DATE', 'ENTIDAD', 'INDICADOR']
+# Clave de la vista analizada: la última fila de cada entidad y moneda en cada año
+ANALYZED_KEY = ['PERIODO', 'ENTIDAD', 'MONEDA']
+
+# Esquema compacto de los datasets, el mismo al procesar, al leer de GCS y al concatenar:
+# categóricas para el texto repetitivo, enteros estrechos para las fechas (AAAAMM cabe en
+# int32 y el año en int16) y float64 para los importes (float32 perdería céntimos)
+EEFF_DTYPES = {
+    'DATE': 'int32', 'PERIODO': 'int16', 'MES': 'category', 'TIPO': 'category', 'ENTIDAD': 'category',
+    'MONEDA': 'category', 'INGRESOS FINANCIEROS': 'float64', 'INGRESOS SERVICIOS FINANCIEROS': 'float64',
+    'INGRESO': 'float64', 'RESULTADO NETO': 'float64'
+}
+TC_DTYPES = {'DATE': 'int32', 'PERIODO': 'int16', 'MES': 'category', 'TC': 'float64'}
+RATIOS_DTYPES = {
+    'DATE': 'int32', 'PERIODO': 'int16', 'MES': 'category', 'TIPO': 'category', 'ENTIDAD': 'category',
+    'INDICADOR': 'category', 'VALOR': 'float64'
+}
+
+def open_workbooks(files_in_memory: dict) -> dict[str, ExcelWorkbook]:
+    """
+    Envuelve cada archivo en memoria en un `ExcelWorkbook` compartido.
+    
+    El diccionario resultante puede pasarse a `process_dataset_eeff` y a
+    `process_dataset_tc` para que cada libro se decodifique una sola vez.
+    """
+    return {
+        key: value if isinstance(value, ExcelWorkbook) else ExcelWorkbook(value)
+        for key, value in files_in_memory.items()
+    }
+
+def _open_excel_in_memory_as_df(file_in_memory: io.BytesIO | ExcelWorkbook,
                                 sheet_open_first: int = 2) -> pd.DataFrame:
     """
     Abre un archivo Excel en memoria y lo convierte en un DataFrame de pandas.
@@ -26,45 +73,19 @@ def _open_excel_in_memory_as_df(file_in_memory: io.BytesIO,
     en la misma hoja.
     
     Args:
-        file_in_memory: El archivo Excel como un objeto BytesIO.
+        file_in_memory: El archivo Excel como un objeto BytesIO o un `ExcelWorkbook` ya abierto.
         sheet_open_first: El índice (1-based) de la hoja desde donde empezar a intentar leer.
     """
-    sheets = list(range(sheet_open_first - 1, -1, -1))  
-    for sheet in sheets:
-        try:
-            dataset_eeff = pd.read_excel(file_in_memory, sheet_name=sheet)
-            return dataset_eeff  # Retorna inmediatamente cuando encuentra una hoja válida
-        except Exception:
-            continue  # Intenta la siguiente hoja
-    # Si ninguna hoja funcionó
-    raise FileNotFoundError("No se encontraron hojas válidas")
+    workbook = file_in_memory if isinstance(file_in_memory, ExcelWorkbook) else ExcelWorkbook(file_in_memory)
+    return workbook.first_available_sheet(sheet_open_first)
 
-def _convert_excels_in_dict_to_df(dict_datasets_bytesio: dict, 
-                                   name_files: str = '',
-                                   sheet_open_first: int = 2,
-                                   logger: logging.Logger | None = None) -> dict:
+def _workbook_source(file_in_memory: io.BytesIO | ExcelWorkbook) -> bytes:
     """
-    Convierte un diccionario de archivos Excel en BytesIO a un diccionario de DataFrames.
-    
-    Filtra los archivos por un nombre clave y maneja errores si un archivo no puede ser abierto.
+    Devuelve los bytes originales de un archivo en memoria, para enviarlo a otro proceso.
     """
-    dict_datasets_df = {}
-    errores_count = 0
-    for key, value in dict_datasets_bytesio.items():
-        if name_files in key:
-            try:
-                dict_datasets_df[key] = _open_excel_in_memory_as_df(value,sheet_open_first)
-            except FileNotFoundError as e:
-                errores_count += 1
-                if logger:
-                    logger.warning(f"  ⚠️ No se pudo abrir '{key}': {e}")
-            except Exception as e:
-                errores_count += 1
-                if logger:
-                    logger.warning(f"  ❌ Error inesperado al abrir '{key}': {e}")
-    if logger and (errores_count > 0):
-        logger.info(f"  ℹ️ Total de archivos omitidos en la conversión: {errores_count}")
-    return dict_datasets_df
+    if isinstance(file_in_memory, ExcelWorkbook):
+        return file_in_memory.source
+    return file_in_memory.getvalue()
 
 def _extract_metadata_from_filename(filename: str) -> tuple[int, int, str, str]:
     """
@@ -110,20 +131,149 @@ def _clean_df(df: pd.DataFrame) -> pd.DataFrame:
         )
     return df_str
 
-def _build_mask_to_search(df: pd.DataFrame, terms: list|str, exact: bool = True) -> pd.DataFrame:
+def _match_terms(values: np.ndarray, terms: str | list[str], exact: bool = True) -> np.ndarray:
     """
-    Construye una máscara booleana para buscar términos en un DataFrame.
+    Evalúa qué valores (ya normalizados) coinciden con alguno de los términos.
     
     Args:
-        exact: Si es True, busca coincidencias exactas. Si es False, busca subcadenas.
+        exact: Si es True, busca coincidencias exactas. Si es False, busca subcadenas
+            (los términos se combinan como una expresión regular, igual que `str.contains`).
     """
+    terms = _clean_str_or_liststr(terms)
     if exact:
-        mask = df.isin(terms)
+        return np.isin(values, terms)
+    pattern = re.compile('|'.join(map(str, terms)))
+    return np.fromiter((pattern.search(value) is not None for value in values), dtype=bool, count=len(values))
+
+def _search_term_groups(df_clean: pd.DataFrame, term_groups: dict[str, tuple[str | list[str], bool]]
+                        ) -> dict[str, tuple[int, int] | tuple[None, None]]:
+    """
+    Busca, en una sola pasada, la primera ocurrencia de varios grupos de términos en una hoja limpia.
+    
+    La hoja se normaliza una única vez: se convierte a un arreglo de strings de NumPy y se
+    reduce a sus valores únicos junto con la posición (en orden fila a fila) de su primera
+    aparición. Cada grupo se resuelve después sobre esos valores únicos, por lo que el coste
+    por grupo no depende del tamaño de la hoja.
+    
+    Returns:
+        Un diccionario {nombre: (fila, columna)} con coordenadas de `df_clean`.
+    """
+    positions = {name: (None, None) for name in term_groups}
+    if df_clean.empty:
+        return positions
+    cells = df_clean.to_numpy(dtype=object).astype(str).ravel()
+    uniques, first_index = np.unique(cells, return_index=True)
+    uniques = np.char.lower(np.char.strip(uniques))
+    n_cols = df_clean.shape[1]
+    for name, (terms, exact) in term_groups.items():
+        matches = _match_terms(uniques, terms, exact)
+        if matches.any():
+            positions[name] = divmod(int(first_index[matches].min()), n_cols)
+    return positions
+
+def _check_template(df_clean: pd.DataFrame, template: dict,
+                    term_groups: dict[str, tuple[str | list[str], bool]]) -> bool:
+    """
+    Verifica que una plantilla de diseño siga siendo válida para una hoja limpia.
+    
+    Comprueba solo las celdas guardadas en la plantilla (y que las filas de cabecera, si
+    las hay, tengan contenido), sin normalizar la hoja completa.
+    """
+    groups = template.get('groups', {})
+    n_rows, n_cols = df_clean.shape
+    for name, (terms, exact) in term_groups.items():
+        if name not in groups:
+            return False
+        row, col = groups[name]
+        if row >= n_rows or col >= n_cols:
+            return False
+        cell = np.array([str(df_clean.iat[row, col]).strip().lower()])
+        if not _match_terms(cell, terms, exact)[0]:
+            return False
+    for row in template.get('header_rows', []):
+        if not (0 <= row < n_rows) or df_clean.iloc[row].isna().all():
+            return False
+    return True
+
+def _report_code(key: str) -> str:
+    """
+    Devuelve el código de reporte de la SBS (ej: 'B-2201') a partir del nombre de un archivo.
+    """
+    prefix = key.rsplit('_', 1)[0]
+    return URLS_TEMPLATES.get(prefix, prefix)
+
+def _resolve_term_groups(df: pd.DataFrame, term_groups: dict[str, tuple[str | list[str], bool]],
+                         template: dict | None = None) -> tuple[dict, dict, bool]:
+    """
+    Resuelve las coordenadas de varios grupos de términos, usando una plantilla si es válida.
+    
+    Si la `template` del reporte supera la verificación se usan sus coordenadas; si no, se
+    hace la búsqueda completa en la hoja.
+    
+    Returns:
+        Una tupla (posiciones, posiciones_limpias, acierto): las coordenadas de cada grupo en
+        `df`, las mismas coordenadas en la hoja limpia y si se usó la plantilla.
+    """
+    df_clean = _clean_df(df)
+    hit = template is not None and _check_template(df_clean, template, term_groups)
+    if hit:
+        clean_positions = {name: tuple(template['groups'][name]) for name in term_groups}
     else:
-        mask = df.apply(
-            lambda col: col.str.contains('|'.join(map(str, terms)), na=False)
-            )
-    return mask
+        clean_positions = _search_term_groups(df_clean, term_groups)
+    
+    positions = {}
+    for name, (row, col) in clean_positions.items():
+        if row is None:
+            positions[name] = (None, None)
+        else:
+            rowidx = df.index.get_indexer([row])[0]
+            colidx = df.columns.get_indexer([df_clean.columns[col]])[0]
+            positions[name] = (rowidx, colidx)
+    return positions, clean_positions, hit
+
+def _update_layout_cache(layout_cache: LayoutTemplateCache, code: str, kind: str,
+                         clean_positions: dict, hit: bool):
+    """
+    Registra el acierto o fallo de la plantilla y, si hubo que buscar y se encontraron
+    todos los grupos, guarda las nuevas coordenadas como plantilla del reporte.
+    """
+    layout_cache.record(code, kind, hit=hit)
+    if hit or any(position == (None, None) for position in clean_positions.values()):
+        return
+    extra = {}
+    if 'IF' in clean_positions:
+        row_if = clean_positions['IF'][0]
+        extra['header_rows'] = [row_if - 2, row_if - 1]
+    layout_cache.put(code, kind, clean_positions, **extra)
+
+def _locate_term_groups(df: pd.DataFrame, term_groups: dict[str, tuple[str | list[str], bool]],
+                        code: str | None = None, kind: str = 'eeff',
+                        layout_cache: LayoutTemplateCache | None = None
+                        ) -> dict[str, tuple[int, int] | tuple[None, None]]:
+    """
+    Localiza la primera ocurrencia de varios grupos de términos en un DataFrame.
+    
+    Si se proporciona una `layout_cache`, primero se verifica la plantilla conocida del
+    reporte `code`; solo si falla se hace la búsqueda completa, y la plantilla se actualiza
+    con el resultado cuando se encuentran todos los grupos.
+    
+    Args:
+        df: Hoja de cálculo como DataFrame.
+        term_groups: Diccionario {nombre: (términos, exact)}.
+        code: Código del reporte (ej: 'B-2201'), necesario para usar la caché de plantillas.
+        kind: Tipo de extracción dentro del reporte ('eeff' o 'tc').
+        layout_cache: Caché de plantillas de diseño opcional.
+    
+    Returns:
+        Un diccionario {nombre: (fila, columna)} con las coordenadas de la primera celda que
+        coincide con cada grupo, o (None, None) si no hay coincidencias.
+    """
+    use_cache = layout_cache is not None and bool(code)
+    template = layout_cache.get(code, kind) if use_cache else None
+    positions, clean_positions, hit = _resolve_term_groups(df, term_groups, template)
+    if use_cache:
+        _update_layout_cache(layout_cache, code, kind, clean_positions, hit)
+    return positions
 
 def _localize_terms(df: pd.DataFrame, terms_clean: str | list[str], 
                     exact: bool = True) -> tuple[int, int] | tuple[None, None]:
@@ -133,21 +283,7 @@ def _localize_terms(df: pd.DataFrame, terms_clean: str | list[str],
     Devuelve las coordenadas (fila, columna) de la primera celda que coincide con
     alguno de los términos de búsqueda.
     """
-    terms_clean = _clean_str_or_liststr(terms_clean)
-    df_str_clean = _clean_df(df).astype(str)
-    df_str_clean = df_str_clean.where(df_str_clean.notna(), "")
-    df_str_clean = df_str_clean.map(lambda x: x.strip().lower())
-    mask = _build_mask_to_search(df_str_clean, terms_clean, exact)
-    
-    stacked = mask.stack()
-    assert isinstance(stacked, pd.Series)  # ayuda al type checker
-    matches = stacked[stacked]
-    if matches.empty:
-        return (None, None)
-    row, colname = matches.index[0]
-    rowidx = df.index.get_indexer([row])[0]
-    colidx = df.columns.get_indexer([colname])[0]
-    return rowidx, colidx
+    return _locate_term_groups(df, {'terms': (terms_clean, exact)})['terms']
 
 def _build_eeff_dataframe(dataset_eeff: pd.DataFrame, pos_if: tuple,
                           pos_isf: tuple, pos_rn: tuple) -> pd.DataFrame:
@@ -187,7 +323,9 @@ def _transform_eeff_dataframe(key: str, dataset_eeff: pd.DataFrame) -> pd.DataFr
     Transforma un DataFrame de EEFF intermedio al formato final deseado.
     
     Aplica limpieza, añade columnas de metadatos (fecha, periodo, etc.), calcula
-    campos derivados y selecciona y renombra las columnas finales.
+    campos derivados y selecciona y renombra las columnas finales. Los nombres de
+    entidad se dejan tal cual (solo se completan las celdas combinadas): se normalizan
+    una sola vez para todo el lote en `process_dataset_eeff`.
     """
     if dataset_eeff is None or dataset_eeff.empty:
         return None
@@ -197,71 +335,285 @@ def _transform_eeff_dataframe(key: str, dataset_eeff: pd.DataFrame) -> pd.DataFr
         .apply(pd.to_numeric, errors="coerce").dropna(axis=0, how='all').reset_index()
         .reset_index()
         .assign(
-            ENTIDAD =lambda df: df["ENTIDAD"].astype(str).str.strip().replace('', None).ffill()
-        )
-        .pipe(lambda df: df[~(
-                    df['ENTIDAD'].str.lower().str.startswith('total') 
-                    | df['ENTIDAD'].str.lower().str.contains('sucursal'))])
-        .assign(
-            ENTIDAD=lambda df: (
-                df["ENTIDAD"]
-                .astype(str)
-                .str.replace(r"[\d*/()]", "", regex=True)
-                .str.replace(
-                    r"[\u00B2\u00B3\u00B9\u2070-\u2079\u207A-\u207F\u1D2C-\u1D7F]", 
-                    "", 
-                    regex=True
-                    )
-                .str.strip()
-                .str.replace(r'\s+', ' ', regex=True)
-            ),
+            ENTIDAD =lambda df: df["ENTIDAD"].astype(str).str.strip().replace('', None).ffill(),
             DATE=date, PERIODO=year, MES=month_name, TIPO=kind,
             INGRESO=lambda df: df["INGRESOS FINANCIEROS"] + df["INGRESOS SERVICIOS FINANCIEROS"]
         )
-        [['DATE', 'PERIODO', 'MES', 'TIPO', 'ENTIDAD', 'MONEDA', 'INGRESOS FINANCIEROS',
-          'INGRESOS SERVICIOS FINANCIEROS', 'INGRESO', 'RESULTADO NETO']]
+        [EEFF_COLUMNS]
     )
     return df_processed
 
+def _failed_result(key: str, error: Exception) -> dict:
+    """
+    Resultado de un archivo cuyo proceso del pool falló de forma inesperada.
+    """
+    return {
+        'key': key, 'df': None, 'stage': 'process', 'error': str(error),
+        'clean_positions': None, 'hit': False, 'timings': {}
+    }
+
+def _run_in_process_pool(func, items: list[tuple], workers: int, on_error=_failed_result) -> list:
+    """
+    Ejecuta `func(*item)` para cada elemento en un pool de procesos.
+    
+    El resultado conserva el orden de `items`. Un fallo inesperado del pool (ej: un proceso
+    que termina abruptamente) solo afecta al archivo correspondiente, cuyo resultado es
+    `on_error(clave, error)`.
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(func, *item) for item in items]
+        for item, future in zip(items, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(on_error(item[0], e))
+    return results
+
+def _process_file(key: str, source: bytes | io.BytesIO | ExcelWorkbook, sheet_open_first: int,
+                  term_groups: dict, template: dict | None, build) -> dict:
+    """
+    Procesa un único archivo: apertura, localización de términos y construcción del resultado.
+    
+    No escribe en el log ni modifica cachés, para poder ejecutarse en otro proceso; el
+    diccionario devuelto describe lo ocurrido (incluidos los tiempos de cada fase) para
+    que el proceso principal lo registre.
+    
+    Args:
+        build: Función (key, hoja, posiciones) -> DataFrame | None que construye el resultado.
+    
+    Returns:
+        Un diccionario con 'key', 'df' (DataFrame o None), 'stage' ('open', 'open_unexpected'
+        o 'process' si hubo un error, o None), 'error' (mensaje), 'clean_positions', 'hit' y
+        'timings' (segundos de las fases 'parse', 'term_search' y 'build').
+    """
+    result = {'key': key, 'df': None, 'stage': None, 'error': None, 'clean_positions': None, 'hit': False, 'timings': {}}
+    timings = result['timings']
+    start = time.perf_counter()
+    try:
+        dataset = _open_excel_in_memory_as_df(source, sheet_open_first)
+    except FileNotFoundError as e:
+        result.update(stage='open', error=str(e))
+        return result
+    except Exception as e:
+        result.update(stage='open_unexpected', error=str(e))
+        return result
+    finally:
+        timings['parse'] = time.perf_counter() - start
+    try:
+        start = time.perf_counter()
+        positions, result['clean_positions'], result['hit'] = _resolve_term_groups(dataset, term_groups, template)
+        timings['term_search'] = time.perf_counter() - start
+        start = time.perf_counter()
+        result['df'] = build(key, dataset, positions)
+        timings['build'] = time.perf_counter() - start
+    except Exception as e:
+        result.update(stage='process', error=str(e))
+    return result
+
+def _process_file_stages(key: str, source: bytes, stages: dict[str, tuple]) -> dict[str, dict]:
+    """
+    Procesa un archivo para varias etapas (ej: EEFF y TC) con un único `ExcelWorkbook`, de modo
+    que en un proceso del pool el libro también se decodifica una sola vez.
+    
+    Args:
+        stages: Diccionario {etapa: (sheet_open_first, term_groups, plantilla, build)}.
+    
+    Returns:
+        Un diccionario {etapa: resultado de `_process_file`}.
+    """
+    workbook = ExcelWorkbook(source)
+    try:
+        return {
+            kind: _process_file(key, workbook, sheet_open_first, term_groups, template, build)
+            for kind, (sheet_open_first, term_groups, template, build) in stages.items()
+        }
+    finally:
+        workbook.close()
+
+def process_stages_in_pool(files_in_memory: dict, stages: dict[str, tuple], workers: int,
+                           layout_cache: LayoutTemplateCache | None = None) -> dict[str, dict[str, dict]]:
+    """
+    Procesa en un pool de procesos todas las etapas de cada archivo en una sola tarea.
+    
+    Cada archivo se envía una vez al pool y su libro se decodifica una vez para todas las etapas
+    que lo usan (ej: los de 'Banca_Multiple_EEFF' sirven a EEFF y a TC), igual que en modo serie.
+    Los resultados se pasan después a cada etapa con `precomputed`, que los registra en el proceso
+    principal como si los hubiera calculado ella misma.
+    
+    Args:
+        stages: Diccionario {etapa: (name_files, sheet_open_first, term_groups, build)}, ver `eeff_stage`,
+            `tc_stage` y `RATIOS_STAGE`.
+    
+    Returns:
+        Un diccionario {etapa: {archivo: resultado}}.
+    """
+    items = []
+    for key in files_in_memory:
+        file_stages = {
+            kind: (sheet_open_first, term_groups,
+                   layout_cache.get(_report_code(key), kind) if layout_cache is not None else None, build)
+            for kind, (name_files, sheet_open_first, term_groups, build) in stages.items()
+            if name_files in key
+        }
+        if file_stages:
+            items.append((key, _workbook_source(files_in_memory[key]), file_stages))
+    kinds = {item[0]: list(item[2]) for item in items}
+    results = _run_in_process_pool(
+        _process_file_stages, items, workers,
+        on_error=lambda key, error: {kind: _failed_result(key, error) for kind in kinds[key]}
+    )
+    precomputed = {kind: {} for kind in stages}
+    for (key, _, _), by_stage in zip(items, results):
+        for kind, result in by_stage.items():
+            precomputed[kind][key] = result
+    return precomputed
+
+def eeff_stage(if_terms: str | list[str], isf_terms: str | list[str], rn_terms: str | list[str]) -> tuple:
+    """
+    Definición (name_files, sheet_open_first, term_groups, build) de la etapa de EEFF.
+    """
+    term_groups = {'IF': (if_terms, True), 'ISF': (isf_terms, True), 'RN': (rn_terms, True)}
+    return 'EEFF', 2, term_groups, _build_eeff_result
+
+def tc_stage(tc_terms: str | list[str]) -> tuple:
+    """
+    Definición (name_files, sheet_open_first, term_groups, build) de la etapa de TC.
+    """
+    return 'Banca_Multiple_EEFF', 1, {'TC': (tc_terms, False)}, _build_tc_result
+
+def _build_eeff_result(key: str, dataset_eeff: pd.DataFrame, positions: dict) -> pd.DataFrame | None:
+    """
+    Construye y transforma el DataFrame de EEFF de un archivo a partir de las posiciones encontradas.
+    """
+    df = _build_eeff_dataframe(dataset_eeff, positions['IF'], positions['ISF'], positions['RN'])
+    return _transform_eeff_dataframe(key, df)
+
+def _build_tc_result(key: str, dataset_tc: pd.DataFrame, positions: dict) -> pd.DataFrame | None:
+    """
+    Construye el DataFrame de TC de un archivo a partir de la posición encontrada.
+    """
+    df_tc = _build_tc_dataframe(key, dataset_tc, positions['TC'])
+    return df_tc if df_tc is not None and not df_tc.empty else None
+
+def _process_files(files_in_memory: dict, name_files: str, sheet_open_first: int, term_groups: dict,
+                   kind: str, build, logger: logging.Logger, ledger: ProbeLedger | None = None,
+                   layout_cache: LayoutTemplateCache | None = None, workers: int = 1,
+                   precomputed: dict[str, dict] | None = None) -> tuple[list, int]:
+    """
+    Procesa todos los archivos cuyo nombre contiene `name_files`, registrando los resultados.
+    
+    Con `workers` > 1, el trabajo de cada archivo (apertura, localización, construcción y
+    transformación) se reparte en un pool de procesos; el registro en el log, el `ledger` y
+    la `layout_cache` se hace siempre en el proceso principal y en el orden original. Con
+    `precomputed` ({archivo: resultado}, ver `process_stages_in_pool`) no se procesa nada:
+    solo se registran esos resultados.
+    
+    Returns:
+        Una tupla (resultados_ok, archivos_abiertos) con los resultados de los archivos
+        procesados correctamente (en orden) y el número de archivos que se pudieron abrir.
+    """
+    keys = [key for key in files_in_memory if name_files in key]
+    
+    def template_for(key: str) -> dict | None:
+        return layout_cache.get(_report_code(key), kind) if layout_cache is not None else None
+    
+    def learn(result: dict):
+        if layout_cache is not None and result['clean_positions'] is not None:
+            _update_layout_cache(layout_cache, _report_code(result['key']), kind, result['clean_positions'], result['hit'])
+    
+    if precomputed is not None:
+        results = [precomputed[key] for key in keys]
+        for result in results:
+            learn(result)
+    elif workers > 1 and len(keys) > 1:
+        # Cada proceso recibe los bytes originales y la plantilla conocida al inicio de la etapa
+        items = [
+            (key, _workbook_source(files_in_memory[key]), sheet_open_first, term_groups, template_for(key), build)
+            for key in keys
+        ]
+        results = _run_in_process_pool(_process_file, items, workers)
+        for result in results:
+            learn(result)
+    else:
+        results = []
+        for key in keys:
+            result = _process_file(key, files_in_memory[key], sheet_open_first, term_groups, template_for(key), build)
+            learn(result)
+            results.append(result)
+    
+    # Los tiempos se miden en cada proceso y se acumulan aquí, en el proceso principal
+    metrics = get_metrics('sbs')
+    for result in results:
+        for phase, seconds in result['timings'].items():
+            metrics.observe(f"{kind}.{phase}", seconds)
+    
+    errores_count = 0
+    for result in results:
+        if result['stage'] in ('open', 'open_unexpected'):
+            errores_count += 1
+            if ledger is not None:
+                ledger.record(result['key'], ledger.STATUS_UNPARSEABLE)
+            if result['stage'] == 'open':
+                logger.warning(f"  ⚠️ No se pudo abrir '{result['key']}': {result['error']}")
+            else:
+                logger.warning(f"  ❌ Error inesperado al abrir '{result['key']}': {result['error']}")
+    if errores_count > 0:
+        logger.info(f"  ℹ️ Total de archivos omitidos en la conversión: {errores_count}")
+    
+    ok_results = []
+    for result in results:
+        if result['stage'] in ('open', 'open_unexpected'):
+            continue
+        if result['stage'] == 'process':
+            if ledger is not None:
+                ledger.record(result['key'], ledger.STATUS_UNPARSEABLE)
+            logger.error(f"  ❌ No se pudo procesar {kind.upper()} de '{result['key']}': {result['error']}", exc_info=False)
+        elif result['df'] is not None:
+            ok_results.append(result)
+            logger.info(f"  ✔️ Procesado {kind.upper()} de '{result['key']}'")
+    metrics.incr(f"{kind}.files_ok", len(ok_results))
+    metrics.incr(f"{kind}.open_failed", errores_count)
+    metrics.incr(f"{kind}.parse_failed", sum(result['stage'] == 'process' for result in results))
+    metrics.incr(f"{kind}.rows", sum(len(result['df']) for result in ok_results))
+    return ok_results, len(results) - errores_count
+
 def process_dataset_eeff(files_in_memory: dict, if_terms: str | list[str], 
                           isf_terms: str | list[str], rn_terms: str | list[str], 
-                          logger: logging.Logger) -> pd.DataFrame:
+                          logger: logging.Logger, ledger: ProbeLedger | None = None,
+                          layout_cache: LayoutTemplateCache | None = None,
+                          workers: int = 1, entity_names: EntityNameCache | None = None,
+                          precomputed: dict[str, dict] | None = None) -> pd.DataFrame:
     """
     Procesa un diccionario de archivos Excel de EEFF en memoria y los consolida en un único DataFrame.
     
     Orquesta la apertura, localización de términos, construcción y transformación de cada archivo.
+    Los archivos que no se pueden abrir o procesar se anotan en el `ledger`, si se proporciona.
+    Con una `layout_cache`, la búsqueda de términos empieza por la plantilla conocida de cada reporte.
+    Con `workers` > 1, los archivos se procesan en paralelo en un pool de procesos; con
+    `precomputed`, se usan los resultados ya calculados por `process_stages_in_pool`.
+    Los nombres de entidad se normalizan una vez sobre el lote completo, con el diccionario
+    `entity_names` si se proporciona (los nombres ya conocidos no vuelven a limpiarse).
     """
     logger.info("--- 🛠️ Iniciando sección: Procesamiento de EEFF ---")
-    datasets_eeff = _convert_excels_in_dict_to_df(
-        files_in_memory, name_files='EEFF', logger=logger
-        )
-    if not datasets_eeff:
+    ok_results, opened_count = _process_files(
+        files_in_memory, *eeff_stage(if_terms, isf_terms, rn_terms)[:3], 'eeff', _build_eeff_result,
+        logger, ledger=ledger, layout_cache=layout_cache, workers=workers, precomputed=precomputed
+    )
+    if not opened_count:
         logger.warning("  ⚠️ No se encontraron archivos de EEFF para procesar.")
         return pd.DataFrame()
     
-    processed_dfs = []
-    processed_count = 0
-    for key, dataset_eeff in datasets_eeff.items():
-        try:
-            pos_if = _localize_terms(dataset_eeff, if_terms)
-            pos_isf = _localize_terms(dataset_eeff, isf_terms)
-            pos_rn = _localize_terms(dataset_eeff, rn_terms)
-            df = _build_eeff_dataframe(dataset_eeff, pos_if, pos_isf, pos_rn)
-            df_processed = _transform_eeff_dataframe(key, df)
-            if df_processed is not None:
-                processed_dfs.append(df_processed)
-                processed_count += 1
-                logger.info(f"  ✔️ Procesado EEFF de '{key}'")
-        except Exception as e:
-            logger.error(f"  ❌ No se pudo procesar EEFF de '{key}': {e}", exc_info=False)
-    
-    if not processed_dfs:
+    if not ok_results:
         logger.warning("  ⚠️ No se pudo procesar ningún archivo de EEFF exitosamente.")
         return pd.DataFrame()
         
-    df_eeff = pd.concat(processed_dfs, axis=0, ignore_index=True)
+    df_eeff = pd.concat([result['df'] for result in ok_results], axis=0, ignore_index=True)
+    # Normalización de entidades (notas al pie, totales y sucursales) una sola vez para todo el lote
+    entity_names = entity_names if entity_names is not None else EntityNameCache(data=b'{}')
+    df_eeff = apply_schema(entity_names.normalize_frame(df_eeff), EEFF_DTYPES)
     logger.info(
-        f"--- ✅ Procesamiento de EEFF completado. Se procesaron {processed_count}/{len(datasets_eeff)} archivos. ---")
+        f"--- ✅ Procesamiento de EEFF completado. Se procesaron {len(ok_results)}/{opened_count} archivos. ---")
     return df_eeff
 
 def _build_tc_dataframe(key: str, dataset_tc: pd.DataFrame, pos_tc: tuple) -> pd.DataFrame | None:
@@ -285,37 +637,108 @@ def _build_tc_dataframe(key: str, dataset_tc: pd.DataFrame, pos_tc: tuple) -> pd
     return temp_df
 
 def process_dataset_tc(files_in_memory: dict, tc_terms: str | list[str],
-                       logger: logging.Logger) -> pd.DataFrame:
+                       logger: logging.Logger, layout_cache: LayoutTemplateCache | None = None,
+                       workers: int = 1, precomputed: dict[str, dict] | None = None) -> pd.DataFrame:
     """
     Procesa archivos de 'Banca_Multiple_EEFF' para extraer el Tipo de Cambio (TC).
+    
+    Con una `layout_cache`, la búsqueda del término empieza por la celda conocida del reporte.
+    Con `workers` > 1, los archivos se procesan en paralelo en un pool de procesos; con
+    `precomputed`, se usan los resultados ya calculados por `process_stages_in_pool`.
     """
     logger.info("--- 🛠️ Iniciando sección: Procesamiento de TC ---")
-    datasets_tc = _convert_excels_in_dict_to_df(
-        files_in_memory, name_files='Banca_Multiple_EEFF',
-        sheet_open_first=1, logger=logger
-        )
-    if not datasets_tc:
+    ok_results, opened_count = _process_files(
+        files_in_memory, *tc_stage(tc_terms)[:3], 'tc', _build_tc_result,
+        logger, layout_cache=layout_cache, workers=workers, precomputed=precomputed
+    )
+    if not opened_count:
         logger.warning("  ⚠️ No se encontraron archivos de 'Banca Múltiple' para procesar TC.")
         return pd.DataFrame()
     
-    processed_dfs = []
-    processed_count = 0
-    for key, dataset_tc in datasets_tc.items():
-        try:
-            pos_tc = _localize_terms(dataset_tc, tc_terms, exact=False)
-            df_processed = _build_tc_dataframe(key, dataset_tc, pos_tc)
-            if df_processed is not None and not df_processed.empty:
-                processed_dfs.append(df_processed)
-                processed_count += 1
-                logger.info(f"  ✔️ Procesado TC de '{key}'")
-        except Exception as e:
-            logger.error(f"  ❌ No se pudo procesar TC de '{key}': {e}", exc_info=False)
-            
-    if not processed_dfs:
+    if not ok_results:
         logger.warning("  ⚠️ No se pudo procesar ningún archivo para extraer el TC.")
         return pd.DataFrame()
         
-    df_tc = pd.concat(processed_dfs, axis=0, ignore_index=True)
+    df_tc = apply_schema(pd.concat([result['df'] for result in ok_results], axis=0, ignore_index=True), TC_DTYPES)
     logger.info(
-        f"--- ✅ Procesamiento de TC completado. Se procesaron {processed_count}/{len(datasets_tc)} archivos. ---")
+        f"--- ✅ Procesamiento de TC completado. Se procesaron {len(ok_results)}/{opened_count} archivos. ---")
     return df_tc
+
+def _build_ratios_dataframe(key: str, dataset_ratios: pd.DataFrame) -> pd.DataFrame | None:
+    """
+    Convierte la tabla de indicadores de un reporte de Ratios a formato largo
+    (una fila por entidad e indicador), sin recorrer las celdas una a una.
+    
+    En la hoja limpia, la primera columna tiene el nombre de cada indicador y el resto, un valor
+    por entidad. Las filas de indicadores son las que tienen algún valor numérico (las de
+    sección, como 'SOLVENCIA', solo tienen texto) y la fila de entidades es la última con
+    contenido en las columnas de valores antes del primer indicador.
+    """
+    df_clean = _clean_df(dataset_ratios)
+    if df_clean.shape[1] < 2:
+        return None
+    labels = df_clean.iloc[:, 0]
+    values = df_clean.iloc[:, 1:].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    data_rows = ~np.isnan(values).all(axis=1) & labels.notna().to_numpy()
+    if not data_rows.any():
+        return None
+    first_row = int(np.argmax(data_rows))
+    header_rows = np.flatnonzero(df_clean.iloc[:first_row, 1:].notna().any(axis=1).to_numpy())
+    if not len(header_rows):
+        return None
+    header = df_clean.iloc[header_rows[-1], 1:]
+    entity_cols = header.notna().to_numpy()
+    entities = header[entity_cols].astype(str).str.strip().to_numpy()
+    indicators = labels[data_rows].astype(str).str.strip().to_numpy()
+    matrix = values[data_rows][:, entity_cols]
+    
+    date, year, month_name, kind = _extract_metadata_from_filename(key)
+    df_ratios = pd.DataFrame({
+        'INDICADOR': np.repeat(indicators, len(entities)),
+        'ENTIDAD': np.tile(entities, len(indicators)),
+        'VALOR': matrix.ravel()
+    })
+    df_ratios = df_ratios[df_ratios['VALOR'].notna()]
+    return df_ratios.assign(DATE=date, PERIODO=year, MES=month_name, TIPO=kind)[RATIOS_COLUMNS]
+
+def _build_ratios_result(key: str, dataset_ratios: pd.DataFrame, positions: dict) -> pd.DataFrame | None:
+    """
+    Construye el DataFrame de Ratios de un archivo (no usa posiciones de términos).
+    """
+    df_ratios = _build_ratios_dataframe(key, dataset_ratios)
+    return df_ratios if df_ratios is not None and not df_ratios.empty else None
+
+# Definición (name_files, sheet_open_first, term_groups, build) de la etapa de Ratios
+RATIOS_STAGE = ('Ratios', 1, {}, _build_ratios_result)
+
+def process_dataset_ratios(files_in_memory: dict, logger: logging.Logger, ledger: ProbeLedger | None = None,
+                           workers: int = 1, entity_names: EntityNameCache | None = None,
+                           precomputed: dict[str, dict] | None = None) -> pd.DataFrame:
+    """
+    Procesa los archivos de Ratios (indicadores financieros por entidad) y los consolida en un
+    único DataFrame en formato largo: una fila por tipo, fecha, entidad e indicador.
+    
+    Los nombres de entidad se normalizan con el mismo diccionario que los de EEFF, así que ambos
+    datasets pueden cruzarse por ENTIDAD; las columnas de totales y de sucursales se descartan.
+    Con `workers` > 1, los archivos se procesan en paralelo en un pool de procesos; con
+    `precomputed`, se usan los resultados ya calculados por `process_stages_in_pool`.
+    """
+    logger.info("--- 🛠️ Iniciando sección: Procesamiento de Ratios ---")
+    ok_results, opened_count = _process_files(
+        files_in_memory, *RATIOS_STAGE[:3], 'ratios', _build_ratios_result,
+        logger, ledger=ledger, workers=workers, precomputed=precomputed
+    )
+    if not opened_count:
+        logger.warning("  ⚠️ No se encontraron archivos de Ratios para procesar.")
+        return pd.DataFrame()
+    
+    if not ok_results:
+        logger.warning("  ⚠️ No se pudo procesar ningún archivo de Ratios exitosamente.")
+        return pd.DataFrame()
+    
+    df_ratios = pd.concat([result['df'] for result in ok_results], axis=0, ignore_index=True)
+    entity_names = entity_names if entity_names is not None else EntityNameCache(data=b'{}')
+    df_ratios = apply_schema(entity_names.normalize_frame(df_ratios), RATIOS_DTYPES)
+    logger.info(
+        f"--- ✅ Procesamiento de Ratios completado. Se procesaron {len(ok_results)}/{opened_count} archivos. ---")
+    return df_ratios
@@ -0,0 +1,146 @@
+# src/modules/stage_profiler.py
+
+import io
+import sys
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from pathlib import Path
+from contextlib import contextmanager
+
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+import src.utils as utils
+
+_REGISTRY: dict[str, "StageProfiler"] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+class StageProfiler:
+    """
+    Perfilado opcional (cProfile y tracemalloc) de las etapas elegidas del proceso.
+
+    Desactivado, `stage` se reduce a una comprobación por etapa, así que puede dejarse en
+    el código sin coste apreciable. Activado, cada etapa seleccionada acumula su perfil de
+    CPU entre llamadas (ej: un lote tras otro) y, al salir de ella, se reescriben en
+    `output_dir`:
+
+    - `{etapa}.prof`: estadísticas de cProfile (para `pstats`, snakeviz, etc.).
+    - `{etapa}_cpu.txt`: las funciones con más tiempo acumulado.
+    - `{etapa}_alloc.txt`: las líneas que más memoria reservaron en la última llamada a la etapa.
+
+    Las etapas se pueden anidar (ej: 'process_eeff' dentro de 'process'): cada etapa tiene su
+    propio perfil, que se pausa mientras se ejecuta una etapa interna seleccionada, y el informe
+    de la externa suma los perfiles de sus internas, así que ambas reflejan todo su tiempo. El
+    trabajo que se hace en otros procesos (`--workers`) no aparece en el perfil.
+    """
+    def __init__(self, process_name: str):
+        """
+        Args:
+            process_name: Nombre del proceso (ej: "sbs"), como en `utils.get_logger`.
+        """
+        self.logger = utils.get_logger(process_name)
+        self.enabled = False
+        self.stages: set[str] | None = None
+        self.output_dir = Path(f"{process_name}_profiles")
+        self.top = 30
+        self._profiles: dict[str, cProfile.Profile] = {}
+        # Etapas perfilándose (de la externa a la interna) y etapas anidadas dentro de cada una
+        self._stack: list[str] = []
+        self._nested: dict[str, set[str]] = {}
+
+    def enable(self, stages: list[str] | None = None, output_dir: str | Path | None = None, top: int = 30):
+        """
+        Activa el perfilado.
+
+        Args:
+            stages: Etapas a perfilar (ej: ['process_eeff', 'process_tc']). None perfila todas.
+            output_dir: Carpeta de los informes (por defecto, '{proceso}_profiles' junto al log).
+            top: Número de funciones y de líneas que se listan en los informes de texto.
+        """
+        self.enabled = True
+        self.stages = set(stages) if stages else None
+        self.output_dir = Path(output_dir) if output_dir is not None else self.output_dir
+        self.top = top
+        self.logger.info(
+            f"🔬 Perfilado activado para {'todas las etapas' if self.stages is None else sorted(self.stages)} "
+            f"(informes en '{self.output_dir}').")
+
+    def _selected(self, name: str) -> bool:
+        return self.enabled and name not in self._stack and (self.stages is None or name in self.stages)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Perfila el bloque como la etapa `name`, si está seleccionada.
+        """
+        if not self._selected(name):
+            yield
+            return
+        # Solo puede haber un perfil de cProfile activo: el de la etapa externa se pausa
+        parent = self._stack[-1] if self._stack else None
+        if parent is not None:
+            self._profiles[parent].disable()
+            for outer in self._stack:
+                self._nested.setdefault(outer, set()).add(name)
+        self._stack.append(name)
+        profile = self._profiles.setdefault(name, cProfile.Profile())
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(10)
+        before = tracemalloc.take_snapshot()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+            self._stack.pop()
+            # Se descartan las reservas del propio tracemalloc
+            own_traces = [tracemalloc.Filter(False, tracemalloc.__file__)]
+            allocations = after.filter_traces(own_traces).compare_to(before.filter_traces(own_traces), 'lineno')
+            self._write_reports(name, allocations, peak)
+            if parent is not None:
+                self._profiles[parent].enable()
+
+    def _write_reports(self, name: str, allocations: list, peak: int):
+        """
+        Escribe los informes de CPU (con los perfiles de las etapas anidadas) y de memoria de una etapa.
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        cpu_report = io.StringIO()
+        stats = pstats.Stats(self._profiles[name], stream=cpu_report)
+        for nested in sorted(self._nested.get(name, ())):
+            stats.add(self._profiles[nested])
+        stats.dump_stats(self.output_dir / f"{name}.prof")
+        stats.sort_stats('cumulative').print_stats(self.top)
+        (self.output_dir / f"{name}_cpu.txt").write_text(cpu_report.getvalue(), encoding='utf-8')
+
+        allocations = [stat for stat in allocations if stat.size_diff > 0][:self.top]
+        lines = [f"Pico de memoria trazada: {peak / 1e6:.2f} MB", f"Top {len(allocations)} líneas por memoria reservada:"]
+        lines += [str(stat) for stat in allocations]
+        (self.output_dir / f"{name}_alloc.txt").write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        self.logger.info(f"  🔬 Perfil de la etapa '{name}' guardado en '{self.output_dir}' (pico {peak / 1e6:.2f} MB).")
+
+
+def get_profiler(process_name: str) -> StageProfiler:
+    """
+    Devuelve el perfilador del proceso, creándolo (desactivado) la primera vez.
+
+    Args:
+        process_name: Nombre del proceso (ej: "sbs", "sunat", "bcrp")
+
+    Returns:
+        El objeto `StageProfiler` compartido por todos los módulos del proceso.
+    """
+    with _REGISTRY_LOCK:
+        profiler = _REGISTRY.get(process_name)
+        if profiler is None:
+            profiler = _REGISTRY[process_name] = StageProfiler(process_name)
+        return profiler
@@ -0,0 +1,195 @@
+# src/modules/upsert_table.py
+
+import sys
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+import src.utils as utils
+from src.modules.compact_schema import concat_frames
+
+# Tolerancia relativa al comparar importes: un CSV releído o un cálculo en otro orden pueden diferir
+# en los últimos dígitos del float64 sin que el dato haya cambiado
+FLOAT_RTOL = 1e-9
+
+class UpsertTable:
+    """
+    Tabla con clave única sobre la que se insertan o actualizan filas de forma idempotente.
+
+    Un índice hash {clave: posición} de las filas existentes permite resolver cada fila
+    nueva en O(1): si su clave ya existe se actualizan sus valores en el sitio y, si no,
+    se añade al final. Las filas insertadas se acumulan aparte y solo se concatenan al
+    pedir el resultado (`to_frame`), de modo que fusionar un mes nuevo cuesta un tiempo
+    proporcional a las filas nuevas y no al histórico. Volver a aplicar las mismas filas
+    no cambia nada.
+
+    Con `partition_cols` (un prefijo de la clave, ej: ['TIPO', 'DATE']), el índice no se construye
+    sobre todo el histórico: solo se indexan, bajo demanda, las particiones que tocan las filas
+    entrantes. Localizar sus filas es un filtro vectorizado; el trabajo fila a fila queda acotado
+    a esas particiones.
+    """
+    def __init__(self, df: pd.DataFrame | None, key_cols: list[str], columns: list[str],
+                 partition_cols: list[str] | None = None):
+        """
+        Args:
+            df: Datos existentes (puede ser None o vacío en la primera ejecución).
+            key_cols: Columnas que forman la clave única (ej: ['TIPO', 'DATE', 'ENTIDAD', 'MONEDA']).
+            columns: Columnas del dataset, en orden.
+            partition_cols: Primeras columnas de `key_cols` por las que se indexa bajo demanda.
+                Sin ellas, el índice se construye completo al crear la tabla.
+        """
+        if partition_cols is not None and list(partition_cols) != list(key_cols[:len(partition_cols)]):
+            raise ValueError(f"Las columnas de partición {partition_cols} deben ser un prefijo de la clave {key_cols}.")
+        self.logger = utils.get_logger('sbs')
+        self.key_cols = key_cols
+        self.columns = columns
+        self.value_cols = [col for col in columns if col not in key_cols]
+        if df is None or df.empty:
+            df = pd.DataFrame(columns=columns)
+        self.frame = df.reset_index(drop=True)
+        self.partition_cols = partition_cols
+        self._indexed: set[tuple] = set()
+        if partition_cols is None:
+            self.index: dict[tuple, int] = dict(zip(self._keys(self.frame), range(len(self.frame))))
+        else:
+            self.index = {}
+        self._pending: list[pd.DataFrame] = []
+        self._pending_rows = 0
+
+    def _keys(self, df: pd.DataFrame) -> list[tuple]:
+        return list(zip(*(df[col].tolist() for col in self.key_cols)))
+
+    def _ensure_index(self, df: pd.DataFrame):
+        """
+        Indexa las filas existentes de las particiones de `df` que aún no están en el índice.
+        """
+        if self.partition_cols is None:
+            return
+        size = len(self.partition_cols)
+        partitions = df[self.partition_cols].drop_duplicates()
+        missing = set(zip(*(partitions[col].tolist() for col in self.partition_cols))) - self._indexed
+        if not missing:
+            return
+        # Prefiltro vectorizado por columna y comprobación exacta solo sobre las filas candidatas
+        mask = pd.Series(True, index=self.frame.index)
+        for position, col in enumerate(self.partition_cols):
+            mask &= self.frame[col].isin({partition[position] for partition in missing})
+        rows = mask.to_numpy().nonzero()[0]
+        candidates = self.frame.iloc[rows]
+        self.index.update(
+            (key, row) for key, row in zip(self._keys(candidates), rows.tolist()) if key[:size] in missing
+        )
+        self._indexed |= missing
+
+    @staticmethod
+    def _same_values(current: pd.DataFrame, incoming: pd.DataFrame) -> np.ndarray:
+        """
+        Compara fila a fila los valores existentes con los entrantes (dos nulos cuentan como iguales).
+
+        Las columnas decimales se comparan con `np.isclose` (tolerancia `FLOAT_RTOL`); el resto, de
+        forma exacta.
+
+        Returns:
+            Un array booleano con True en las filas sin cambios.
+        """
+        same = np.ones(len(incoming), dtype=bool)
+        for col in incoming.columns:
+            old, new = current[col], incoming[col]
+            numeric = all(pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s) for s in (old, new))
+            if numeric and (pd.api.types.is_float_dtype(old) or pd.api.types.is_float_dtype(new)):
+                same &= np.isclose(
+                    old.to_numpy(dtype='float64', na_value=np.nan), new.to_numpy(dtype='float64', na_value=np.nan),
+                    rtol=FLOAT_RTOL, atol=0.0, equal_nan=True
+                )
+            else:
+                same &= ((old.astype(object) == new.astype(object)) | (old.isna() & new.isna())).to_numpy()
+        return same
+
+    def _flush(self):
+        """
+        Incorpora al DataFrame principal las filas insertadas pendientes.
+        """
+        if self._pending:
+            # Se unen las categorías de cada parte para que las columnas categóricas sigan siéndolo
+            self.frame = concat_frames([self.frame, *self._pending])[self.columns]
+            self._pending, self._pending_rows = [], 0
+
+    def upsert(self, df: pd.DataFrame) -> dict[str, int]:
+        """
+        Inserta las filas de `df` cuya clave no existe y actualiza las que sí existen.
+
+        Si `df` repite una clave, se conserva su última fila.
+
+        Returns:
+            Un diccionario con el número de filas 'inserted', 'updated' y 'unchanged'.
+        """
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        if df is None or df.empty:
+            return counts
+        df = df.drop_duplicates(self.key_cols, keep='last')[self.columns].reset_index(drop=True)
+        self._ensure_index(df)
+        positions = pd.Series([self.index.get(key) for key in self._keys(df)], dtype='float64')
+        if (positions >= len(self.frame)).any():
+            self._flush()
+
+        is_new = positions.isna().to_numpy()
+        existing = df[~is_new]
+        if not existing.empty:
+            rows = positions[~is_new].astype('int64').to_numpy()
+            current = self.frame.iloc[rows][self.value_cols].reset_index(drop=True)
+            incoming = existing[self.value_cols].reset_index(drop=True)
+            changed = ~self._same_values(current, incoming)
+            counts['unchanged'] = int((~changed).sum())
+            counts['updated'] = int(changed.sum())
+            for col in self.value_cols:
+                values = incoming.loc[changed, col]
+                if isinstance(self.frame[col].dtype, pd.CategoricalDtype):
+                    # Una columna categórica solo admite valores de sus categorías
+                    new_categories = pd.Index(values.dropna().unique()).difference(self.frame[col].cat.categories)
+                    if len(new_categories):
+                        self.frame[col] = self.frame[col].cat.add_categories(new_categories)
+                col_idx = self.frame.columns.get_loc(col)
+                self.frame.iloc[rows[changed], col_idx] = values.to_numpy()
+
+        inserted = df[is_new]
+        if not inserted.empty:
+            start = len(self.frame) + self._pending_rows
+            self.index.update(zip(self._keys(inserted), range(start, start + len(inserted))))
+            self._pending.append(inserted)
+            self._pending_rows += len(inserted)
+            counts['inserted'] = len(inserted)
+
+        self.logger.info(
+            f"  🔀 Upsert por {self.key_cols}: {counts['inserted']} nuevas, "
+            f"{counts['updated']} actualizadas, {counts['unchanged']} sin cambios.")
+        return counts
+
+    def upsert_latest(self, df: pd.DataFrame, order_col: str = 'DATE') -> dict[str, int]:
+        """
+        Variante de `upsert` para vistas de "última fila por clave": una fila existente solo
+        se reemplaza si la entrante es igual o más reciente según `order_col`.
+
+        Returns:
+            Un diccionario con el número de filas 'inserted', 'updated' y 'unchanged'.
+        """
+        if df is None or df.empty:
+            return self.upsert(df)
+        df = df.sort_values(order_col, kind='stable').drop_duplicates(self.key_cols, keep='last')
+        self._ensure_index(df)
+        positions = [self.index.get(key) for key in self._keys(df)]
+        if any(pos is not None and pos >= len(self.frame) for pos in positions):
+            self._flush()
+        current = self.frame[order_col].to_numpy()
+        is_latest = [pos is None or value >= current[pos] for pos, value in zip(positions, df[order_col].tolist())]
+        return self.upsert(df[is_latest])
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Devuelve el dataset completo con las inserciones y actualizaciones aplicadas.
+        """
+        self._flush()
+        return self.frame
@@ -0,0 +1,106 @@
+# tests/test_planning.py
+
+from datetime import datetime
+
+import pytest
+
+from src.modules import sbs_data_fetcher
+from src.modules.sbs_data_fetcher import build_windows, plan_missing, shard_batches
+
+
+class _FixedDatetime(datetime):
+    """`datetime` con `now()` fijo en el 15 de marzo de 2024 (último mes cerrado: febrero)."""
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2024, 3, 15)
+
+
+@pytest.fixture(autouse=True)
+def fixed_now(monkeypatch):
+    monkeypatch.setattr(sbs_data_fetcher, 'datetime', _FixedDatetime)
+
+
+def _dates(plan, report: str) -> list[int]:
+    return plan.loc[plan['REPORT'] == report, 'DATE'].tolist()
+
+
+def test_plan_missing_stops_at_last_closed_month():
+    """El mes en curso y el anterior (aún sin publicar) no se planifican."""
+    plan = plan_missing(coverage={}, windows=build_windows('202311'))
+
+    assert _dates(plan, 'Banca_Multiple_EEFF') == [202311, 202312, 202401, 202402]
+
+
+def test_plan_missing_respects_windows_and_quarterly_reports():
+    """Cada reporte usa su propia ventana o la general; los trimestrales solo planifican cierres de trimestre."""
+    windows = build_windows('2023', '2023', overrides=['B-2201=202306:202308'])
+
+    plan = plan_missing(coverage={}, windows=windows)
+
+    assert _dates(plan, 'Banca_Multiple_EEFF') == [202306, 202307, 202308]
+    assert _dates(plan, 'Cooperativas_Nivel1_EEFF') == [202303, 202306, 202309, 202312]
+    assert plan['DATE'].between(202301, 202312).all()
+
+
+def test_plan_missing_skips_covered_periods_unless_refresh():
+    """Los periodos de la cobertura no se vuelven a planificar, salvo con `refresh` dentro de la ventana."""
+    coverage = {'Banca Multiple': {'202311', '202401'}}
+    windows = build_windows('202311', '202402')
+
+    plan = plan_missing(coverage=coverage, windows=windows)
+    refreshed = plan_missing(coverage=coverage, windows=windows, refresh=True)
+
+    assert _dates(plan, 'Banca_Multiple_EEFF') == [202312, 202402]
+    assert _dates(refreshed, 'Banca_Multiple_EEFF') == [202311, 202312, 202401, 202402]
+
+
+def test_build_windows_rejects_empty_and_unknown_windows():
+    with pytest.raises(ValueError):
+        build_windows('202402', '202301')
+    with pytest.raises(ValueError):
+        build_windows(overrides=['X-9999=2020:'])
+
+
+def _batches(years: list[int], reports: list[str], urls: int = 3) -> list:
+    return [
+        (report, year, {f"{report}_{year}_{i}": 'url' for i in range(urls)})
+        for year in years for report in reports
+    ]
+
+
+@pytest.mark.parametrize('by', ['batch', 'report', 'year'])
+def test_shard_batches_is_a_partition_of_the_plan(by):
+    """Cada lote queda en exactamente una partición, en el orden original."""
+    batches = _batches([2021, 2022, 2023, 2024], ['Banca Multiple', 'Cajas Rurales'])
+
+    shards = [shard_batches(batches, index, 3, by=by) for index in range(3)]
+
+    assigned = [batch for shard in shards for batch in shard]
+    assert sorted(assigned, key=batches.index) == batches
+    assert len(assigned) == len(batches)
+    assert all(shard == sorted(shard, key=batches.index) for shard in shards)
+
+
+def test_shard_batches_by_year_keeps_consecutive_years_together():
+    batches = _batches([2020, 2021, 2022, 2023, 2024, 2025], ['Banca Multiple', 'Cajas Rurales'])
+
+    years = [{year for _, year, _ in shard_batches(batches, index, 3, by='year')} for index in range(3)]
+
+    assert years == [{2020, 2021}, {2022, 2023}, {2024, 2025}]
+
+
+def test_shard_batches_by_year_falls_back_to_batches_with_fewer_years_than_shards():
+    """Con menos años que particiones, el reparto por años se sustituye por el reparto por lotes."""
+    batches = _batches([2022, 2023], ['Banca Multiple', 'Cajas Rurales', 'Cajas Municipales'])
+
+    shards = [shard_batches(batches, index, 3, by='year') for index in range(3)]
+
+    assert all(shards)
+    assert shards == [shard_batches(batches, index, 3, by='batch') for index in range(3)]
+
+
+def test_shard_batches_rejects_invalid_shards():
+    with pytest.raises(ValueError):
+        shard_batches([], 3, 3)
+    with pytest.raises(ValueError):
+        shard_batches([], 0, 2, by='month')
@@ -0,0 +1,93 @@
+# tests/test_probe_ledger.py
+
+from datetime import datetime
+
+import pytest
+
+from src.modules import probe_ledger
+from src.modules.probe_ledger import ProbeLedger
+
+DAY = 86400
+NOW = datetime(2024, 3, 15).timestamp()
+
+
+class _FixedDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2024, 3, 15)
+
+
+class _Clock:
+    """Reloj controlable para `time.time()`."""
+    def __init__(self):
+        self.now = NOW
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(probe_ledger.time, 'time', clock)
+    monkeypatch.setattr(probe_ledger, 'datetime', _FixedDatetime)
+    return clock
+
+
+def test_recent_not_found_is_retried_after_short_ttl(clock):
+    """Un 404 de un periodo reciente se vuelve a consultar tras el TTL corto (20 horas)."""
+    ledger = ProbeLedger(data=b'{}')
+    ledger.record('Banca_Multiple_EEFF_202402', ledger.STATUS_NOT_FOUND)
+
+    clock.now += 19 * 3600
+    assert not ledger.should_probe('Banca_Multiple_EEFF_202402')
+    clock.now += 2 * 3600
+    assert ledger.should_probe('Banca_Multiple_EEFF_202402')
+
+
+def test_old_failures_back_off_exponentially_up_to_the_maximum(clock):
+    """Los fallos de periodos antiguos esperan 7, 14, 28... días, hasta un máximo de 180."""
+    ledger = ProbeLedger(data=b'{}')
+    key = 'Cajas_Rurales_EEFF_200307'
+    waits = []
+    for _ in range(7):
+        ledger.record(key, ledger.STATUS_UNPARSEABLE)
+        waits.append((ledger.entries[key]['retry_after'] - clock.now) / DAY)
+
+    assert waits == [7, 14, 28, 56, 112, 180, 180]
+    clock.now += 179 * DAY
+    assert not ledger.should_probe(key)
+    clock.now += 1 * DAY
+    assert ledger.should_probe(key)
+
+
+def test_success_resets_backoff(clock):
+    ledger = ProbeLedger(data=b'{}')
+    key = 'Cajas_Rurales_EEFF_200307'
+    ledger.record(key, ledger.STATUS_NOT_FOUND)
+    ledger.record(key, ledger.STATUS_OK)
+
+    assert ledger.should_probe(key)
+    assert ledger.should_probe('Cajas_Rurales_EEFF_200308')
+
+
+def test_evict_drops_entries_not_checked_within_max_age(clock):
+    ledger = ProbeLedger(data=b'{}')
+    ledger.record('Banca_Multiple_EEFF_200301', ledger.STATUS_NOT_FOUND)
+    clock.now += 401 * DAY
+    ledger.record('Banca_Multiple_EEFF_200302', ledger.STATUS_NOT_FOUND)
+
+    assert ledger.evict() == 1
+    assert list(ledger.entries) == ['Banca_Multiple_EEFF_200302']
+
+
+def test_merge_keeps_the_most_recent_check(clock):
+    ledger, other = ProbeLedger(data=b'{}'), ProbeLedger(data=b'{}')
+    ledger.record('Banca_Multiple_EEFF_200301', ledger.STATUS_NOT_FOUND)
+    clock.now += DAY
+    other.record('Banca_Multiple_EEFF_200301', other.STATUS_OK)
+    other.record('Banca_Multiple_EEFF_200302', other.STATUS_OK)
+
+    assert ledger.merge(other) == 2
+    assert ledger.entries['Banca_Multiple_EEFF_200301']['status'] == ledger.STATUS_OK
+    assert ledger.merge(other) == 0
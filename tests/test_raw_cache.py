@@ -0,0 +1,26 @@
+# tests/test_raw_cache.py
+
+from src.modules.raw_cache import RawWorkbookCache
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    cache = RawWorkbookCache(tmp_path)
+    cache.put('Banca_Multiple_EEFF_202401', b'same', etag='"a"')
+    cache.put('Banca_Multiple_EEFF_202402', b'same')
+
+    assert cache.size() == 4
+    assert len(list((tmp_path / 'objects').rglob('*'))) == 2  # una carpeta y un objeto
+    assert cache.validators('Banca_Multiple_EEFF_202401') == {'If-None-Match': '"a"'}
+
+
+def test_save_evicts_least_recently_used_and_reloads(tmp_path):
+    cache = RawWorkbookCache(tmp_path, max_bytes=10)
+    cache.put('A_EEFF_202401', b'x' * 6)
+    cache.put('B_EEFF_202401', b'y' * 6)
+    cache.index['A_EEFF_202401']['last_access'] = 0
+    cache.save()
+
+    reloaded = RawWorkbookCache(tmp_path, max_bytes=10)
+    assert reloaded.keys() == ['B_EEFF_202401']
+    assert reloaded.get('B_EEFF_202401') == b'y' * 6
+    assert reloaded.get('A_EEFF_202401') is None
@@ -0,0 +1,56 @@
+# tests/test_upsert_table.py
+
+import io
+import numpy as np
+import pandas as pd
+
+from src.modules.upsert_table import UpsertTable
+
+COLUMNS = ['TIPO', 'DATE', 'ENTIDAD', 'VALOR']
+KEY = ['TIPO', 'DATE', 'ENTIDAD']
+
+
+def _frame(rows: int = 500) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    # Sumas de decimales como las del procesamiento (INGRESO = IF + ISF): no siempre sobreviven a un CSV
+    values = rng.random(rows) * 1e6 + rng.random(rows) * 1e3
+    return pd.DataFrame({
+        'TIPO': 'Banca Multiple', 'DATE': 202312, 'ENTIDAD': [f"E{i}" for i in range(rows)], 'VALOR': values
+    })
+
+
+def _csv_round_trip(df: pd.DataFrame) -> pd.DataFrame:
+    return pd.read_csv(io.StringIO(df.to_csv(index=False)))
+
+
+def test_upsert_is_idempotent_after_csv_round_trip():
+    """Volver a aplicar las mismas filas leídas de un CSV no actualiza nada."""
+    df = _frame()
+    table = UpsertTable(None, KEY, COLUMNS, partition_cols=['TIPO', 'DATE'])
+    assert table.upsert(df)['inserted'] == len(df)
+
+    counts = table.upsert(_csv_round_trip(df))
+
+    assert counts == {'inserted': 0, 'updated': 0, 'unchanged': len(df)}
+
+
+def test_upsert_detects_real_changes():
+    """Un cambio de importe o de texto sí cuenta como actualización."""
+    df = _frame(10)
+    table = UpsertTable(df, KEY, COLUMNS)
+    changed = df.copy()
+    changed.loc[0, 'VALOR'] += 0.01
+    changed.loc[1, 'VALOR'] = np.nan
+
+    counts = table.upsert(changed)
+
+    assert counts == {'inserted': 0, 'updated': 2, 'unchanged': 8}
+    assert np.isnan(table.to_frame().loc[1, 'VALOR'])
+
+
+def test_upsert_treats_missing_values_as_equal():
+    """Dos nulos en la misma columna no cuentan como cambio."""
+    df = _frame(3).assign(VALOR=np.nan)
+    table = UpsertTable(df, KEY, COLUMNS)
+
+    assert table.upsert(df.copy())['unchanged'] == 3